@@ -4,25 +4,132 @@ Paste a Facebook Ad Library URL → scrapes all details + downloads media locall
 Run: python app.py  →  open http://localhost:5000
 """
 
+import io
 import os
+import html
+import base64
 import re
 import json
 import time
 import shutil
+import sqlite3
 import hashlib
+import heapq
+import random
+import difflib
+import asyncio
+import atexit
+import functools
+import itertools
 import threading
+import http.client
+import urllib.error
 import urllib.request
 import urllib.parse
-from datetime import datetime
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager, AsyncExitStack
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
 from pathlib import Path
-from flask import Flask, render_template_string, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template_string, request, jsonify, send_from_directory, redirect
 
 app = Flask(__name__)
 
-SAVE_DIR = Path.home() / "MetaAdArchive"
-SAVE_DIR.mkdir(exist_ok=True)
+SAVE_DIR = Path(os.environ.get('ADVAULT_HOME') or Path.home() / "MetaAdArchive")
+SAVE_DIR.mkdir(parents=True, exist_ok=True)
 
-job_status = {}  # job_id -> status dict
+job_changed = threading.Condition()  # notified whenever any job's status changes
+job_generation = [0]
+FINAL_STATES = ('done', 'error', 'cancelled', 'timed_out')
+
+INDEX_DB = SAVE_DIR / 'index.sqlite3'
+
+# Job store — finished jobs stay in memory for JOB_TTL seconds (within the
+# count and memory limits) and on disk for JOB_KEEP_DAYS
+JOBS_DB = SAVE_DIR / 'jobs.sqlite3'
+PERSIST_JOBS = os.environ.get('ADVAULT_PERSIST_JOBS', '1') != '0'
+JOB_TTL = int(os.environ.get('ADVAULT_JOB_TTL', 3600))
+JOB_MAX_FINISHED = int(os.environ.get('ADVAULT_JOB_MAX', 500))
+JOB_MEMORY_MB = int(os.environ.get('ADVAULT_JOB_MEMORY_MB', 64))
+JOB_KEEP_DAYS = int(os.environ.get('ADVAULT_JOB_KEEP_DAYS', 7))
+MEDIA_SUFFIXES = {'.jpg', '.png', '.webp', '.mp4', '.webm'}
+
+# Thumbnails — longest side in pixels; kept in a thumbs/ folder per ad
+THUMB_SIZE = int(os.environ.get('ADVAULT_THUMB_SIZE', 320))
+
+# Browser pool — number of warm Chromiums, how many ads each hosts at once,
+# and when to recycle one
+BROWSER_POOL_SIZE = int(os.environ.get('ADVAULT_BROWSERS', 2))
+PAGES_PER_BROWSER = int(os.environ.get('ADVAULT_PAGES_PER_BROWSER', 8))
+BROWSER_MAX_JOBS = int(os.environ.get('ADVAULT_BROWSER_MAX_JOBS', 25))
+BROWSER_MAX_RSS_MB = int(os.environ.get('ADVAULT_BROWSER_MAX_RSS_MB', 1500))
+
+# Job scheduler — how many ads are archived at once, and how many may wait
+SCRAPE_WORKERS = int(os.environ.get('ADVAULT_WORKERS', 16))
+SCRAPE_QUEUE_MAX = int(os.environ.get('ADVAULT_QUEUE_MAX', 200))
+
+# Job deadline — seconds a job may run, from leaving the queue to its last
+# file write, before it is stopped and reported as timed_out (0 = no limit)
+JOB_DEADLINE = float(os.environ.get('ADVAULT_JOB_DEADLINE', 300))
+
+# Batches — how many batch ads may sit in the queue at once, the most ads
+# one crawl will collect, and how many crawls may be queued or running
+BATCH_QUEUE_SHARE = int(os.environ.get('ADVAULT_BATCH_QUEUE', 20))
+CRAWL_MAX_ADS = int(os.environ.get('ADVAULT_CRAWL_MAX', 1000))
+CRAWL_MAX_ACTIVE = int(os.environ.get('ADVAULT_CRAWLS', 2))
+
+# Request blocking — 'off', 'safe' or 'aggressive' (see BLOCK_PROFILES), plus
+# any extra URL regexes to block, comma-separated
+BLOCK_PROFILE = os.environ.get('ADVAULT_BLOCK_PROFILE', 'safe')
+BLOCK_EXTRA_PATTERNS = [p for p in os.environ.get('ADVAULT_BLOCK_PATTERNS', '').split(',') if p.strip()]
+
+# Modal readiness — hard cap on the wait, and how long media must be quiet
+MODAL_WAIT_MAX = float(os.environ.get('ADVAULT_MODAL_WAIT_MAX', 12))
+MODAL_QUIET_SECONDS = float(os.environ.get('ADVAULT_MODAL_QUIET', 1.0))
+
+# Media downloads — parallel fetches per job, connections per CDN host,
+# per-request timeout and overall deadline (seconds) for a job's downloads
+DOWNLOAD_WORKERS = int(os.environ.get('ADVAULT_DOWNLOAD_WORKERS', 6))
+DOWNLOAD_PER_HOST = int(os.environ.get('ADVAULT_DOWNLOAD_PER_HOST', 4))
+DOWNLOAD_TIMEOUT = float(os.environ.get('ADVAULT_DOWNLOAD_TIMEOUT', 20))
+DOWNLOAD_DEADLINE = float(os.environ.get('ADVAULT_DOWNLOAD_DEADLINE', 120))
+MAX_MEDIA_PER_AD = 20
+
+# Download retries — extra attempts per file after a network error, and the
+# base (seconds) of their jittered exponential backoff
+DOWNLOAD_RETRIES = int(os.environ.get('ADVAULT_DOWNLOAD_RETRIES', 3))
+DOWNLOAD_BACKOFF = float(os.environ.get('ADVAULT_DOWNLOAD_BACKOFF', 1.0))
+
+# Size caps for downloaded media — per file, and per ad across all its files
+MEDIA_MAX_FILE_MB = int(os.environ.get('ADVAULT_MEDIA_MAX_FILE_MB', 500))
+MEDIA_MAX_JOB_MB = int(os.environ.get('ADVAULT_MEDIA_MAX_JOB_MB', 2000))
+DOWNLOAD_CHUNK = 256 * 1024
+TINY_FILE_BYTES = 2000  # anything this small is a placeholder, not a creative
+
+# Result cache — an ad archived less than this many seconds ago is returned
+# from the archive instead of being scraped again (0 = always scrape)
+RESULT_TTL = int(os.environ.get('ADVAULT_CACHE_TTL', 86400))
+
+# Re-checks — how often archived ads are scraped again to follow their
+# status (hours; 0 = never) for Active/unknown and for Inactive ads, and the
+# most ads queued per pass
+RECHECK_HOURS = float(os.environ.get('ADVAULT_RECHECK_HOURS', 0))
+RECHECK_INACTIVE_HOURS = float(os.environ.get('ADVAULT_RECHECK_INACTIVE_HOURS', 0))
+RECHECK_BATCH = int(os.environ.get('ADVAULT_RECHECK_BATCH', 50))
+
+# Blob store — media are stored once per SHA-256 and hardlinked into each ad
+# folder that uses them (0 = plain copies in every folder)
+BLOB_DIR = SAVE_DIR / '.blobs'
+BLOB_STORE = os.environ.get('ADVAULT_BLOB_STORE', '1') != '0'
+
+# Similar creatives — largest difference (bits, of 64) between two creatives'
+# perceptual hashes for them to count as the same visual
+SIMILAR_DISTANCE = int(os.environ.get('ADVAULT_SIMILAR_DISTANCE', 8))
+
+# Media bodies kept from the browser session per ad (0 = always re-download)
+CAPTURE_BODIES_MB = int(os.environ.get('ADVAULT_CAPTURE_MB', 64))
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
 
 # ─────────────────────────────────────────────
 # HTML TEMPLATE
@@ -173,6 +280,14 @@ header p {
   font-size: 0.78rem; font-weight: 700; letter-spacing: 1.5px;
   text-transform: uppercase; color: var(--muted);
 }
+.cancel-btn {
+  display: none;
+  background: none; border: 1px solid var(--border); border-radius: 6px;
+  color: var(--muted); font-family: 'DM Mono', monospace; font-size: 0.7rem;
+  padding: 3px 10px; margin-right: 10px; cursor: pointer;
+}
+.cancel-btn:hover { border-color: var(--red); color: var(--red); }
+.cancel-btn:disabled { opacity: 0.5; cursor: not-allowed; }
 .progress-bar-wrap {
   background: var(--border);
   border-radius: 99px; height: 4px; margin-bottom: 10px;
@@ -432,6 +547,13 @@ header p {
   font-size: 0.7rem; color: var(--muted);
 }
 .archive-arrow { color: var(--muted); font-size: 0.9rem; }
+.archive-search { width: 100%; margin-bottom: 12px; }
+.archive-snippet {
+  font-family: 'DM Mono', monospace;
+  font-size: 0.7rem; color: var(--muted); margin-top: 4px;
+  white-space: nowrap; overflow: hidden; text-overflow: ellipsis;
+}
+.archive-snippet mark { background: rgba(240,165,0,0.25); color: var(--text); }
 
 /* scrollbar */
 ::-webkit-scrollbar { width: 5px; }
@@ -451,19 +573,23 @@ header p {
   </header>
 
   <section class="input-section">
-    <span class="input-label">Meta Ad Library URL</span>
+    <span class="input-label">Meta Ad Library URL — or several URLs / IDs, or an advertiser page to crawl</span>
     <div class="input-row">
       <input class="url-input" id="urlInput" type="text"
         placeholder="https://www.facebook.com/ads/library/?id=25735814926036478"
-        onkeydown="if(event.key==='Enter') startScrape()">
-      <button class="scrape-btn" id="scrapeBtn" onclick="startScrape()">⬇ Archive Ad</button>
+        onkeydown="if(event.key==='Enter') startScrape(event.shiftKey)">
+      <button class="scrape-btn" id="scrapeBtn" onclick="startScrape(event.shiftKey)"
+        title="Shift-click to scrape again even if the ad was archived recently">⬇ Archive Ad</button>
     </div>
   </section>
 
   <div id="progressBox">
     <div class="progress-header">
-      <span class="progress-title">Archiving</span>
-      <span id="progressPct" style="font-family:'DM Mono',monospace;font-size:0.75rem;color:var(--muted);">0%</span>
+      <span class="progress-title" id="progressTitle">Archiving</span>
+      <span>
+        <button class="cancel-btn" id="cancelBtn" onclick="cancelJob()">Cancel</button>
+        <span id="progressPct" style="font-family:'DM Mono',monospace;font-size:0.75rem;color:var(--muted);">0%</span>
+      </span>
     </div>
     <div class="progress-bar-wrap"><div class="progress-bar" id="progressBar"></div></div>
     <div id="progressLog"></div>
@@ -476,6 +602,8 @@ header p {
       <span class="archive-title">Local Archive</span>
       <span class="archive-count" id="archiveCount">0 ads</span>
     </div>
+    <input class="url-input archive-search" id="searchInput" type="text"
+      placeholder='Search ad copy and notes — "exact phrase", prefix*' oninput="onSearchInput()">
     <div id="archiveList"><div class="archive-empty">No ads archived yet — paste a URL above to get started.</div></div>
   </div>
 
@@ -485,10 +613,14 @@ header p {
 let currentJobId = null;
 let pollTimer = null;
 
-async function startScrape() {
+async function startScrape(force) {
   const url = document.getElementById('urlInput').value.trim();
   if (!url) { alert('Please paste a Meta Ad Library URL'); return; }
+  const entries = url.split(/[\s,]+/).filter(Boolean);
+  if (entries.length > 1) return startBatch('/api/batch', {items: entries});
+  if (/^\d+$/.test(url)) return startBatch('/api/batch', {items: [url]});
   if (!url.includes('facebook.com/ads/library')) { alert('Please use a Facebook Ad Library URL (facebook.com/ads/library)'); return; }
+  if (!/[?&]id=\d/.test(url)) return startBatch('/api/crawl', {url});
 
   document.getElementById('scrapeBtn').disabled = true;
   document.getElementById('progressBox').style.display = 'block';
@@ -500,40 +632,147 @@ async function startScrape() {
     const resp = await fetch('/api/scrape', {
       method: 'POST',
       headers: {'Content-Type':'application/json'},
-      body: JSON.stringify({url})
+      body: JSON.stringify({url, force: !!force})
     });
     const data = await resp.json();
-    if (data.error) { setError(data.error); return; }
+    if (data.error) {
+      setError(data.error);
+      document.getElementById('scrapeBtn').disabled = false;
+      return;
+    }
     currentJobId = data.job_id;
-    pollTimer = setInterval(pollJob, 800);
+    lastLogCount = 0;
+    document.getElementById('cancelBtn').style.display = 'inline-block';
+    if (window.EventSource) {
+      followJob(currentJobId);
+    } else {
+      pollTimer = setInterval(pollJob, 800);
+    }
   } catch(e) {
     setError('Failed to connect to local server: ' + e.message);
   }
 }
 
-async function pollJob() {
-  if (!currentJobId) return;
+let currentBatchId = null;
+
+async function startBatch(endpoint, body) {
+  document.getElementById('scrapeBtn').disabled = true;
+  document.getElementById('progressBox').style.display = 'block';
+  document.getElementById('resultBox').style.display = 'none';
+  clearLog();
+  setProgress(0, endpoint === '/api/crawl' ? 'Crawling advertiser page for ads...' : 'Queueing ' + body.items.length + ' ads...');
   try {
-    const resp = await fetch('/api/status/' + currentJobId);
+    const resp = await fetch(endpoint, {
+      method: 'POST',
+      headers: {'Content-Type':'application/json'},
+      body: JSON.stringify(body)
+    });
     const data = await resp.json();
-    
-    if (data.log && data.log.length) {
-      renderLog(data.log);
+    if (data.error) {
+      setError(data.error);
+      document.getElementById('scrapeBtn').disabled = false;
+      return;
     }
-    if (data.progress !== undefined) {
-      setProgress(data.progress, '');
+    if (data.invalid && data.invalid.length) addLog('Ignored ' + data.invalid.length + ' entry(s) without an ad ID', 'err');
+    currentBatchId = data.batch_id;
+    pollTimer = setInterval(pollBatch, 2000);
+  } catch(e) {
+    setError('Failed to connect to local server: ' + e.message);
+  }
+}
+
+let lastBatchDone = 0;
+async function pollBatch() {
+  if (!currentBatchId) return;
+  try {
+    const resp = await fetch('/api/batch/' + currentBatchId);
+    const b = await resp.json();
+    const finished = b.counts.done + b.counts.error + b.counts.cancelled + b.counts.timed_out;
+    setProgress(b.progress, '');
+    document.getElementById('progressTitle').textContent = b.status === 'crawling'
+      ? `Crawling — ${b.total} ads found, ${finished} archived`
+      : `Archiving ${finished}/${b.total} · ${b.ads_per_hour === null ? '—' : b.ads_per_hour} ads/h`;
+    if (b.counts.done > lastBatchDone) {
+      lastBatchDone = b.counts.done;
+      refreshArchive();
     }
-    if (data.status === 'done') {
+    if (b.status === 'done') {
       clearInterval(pollTimer);
-      setProgress(100, 'Complete!');
-      renderResult(data.result);
-      loadNotes(data.result.folder);
-      loadArchive();
+      lastBatchDone = 0;
+      if (b.crawl_error) addLog('Crawl: ' + b.crawl_error, 'err');
+      addLog(`Batch finished — ${b.counts.done} archived, ${b.counts.error + b.counts.timed_out} failed` +
+             (b.counts.cancelled ? `, ${b.counts.cancelled} cancelled` : '') +
+             (b.skipped_existing ? `, ${b.skipped_existing} already in archive` : ''), b.counts.error ? 'err' : 'ok');
       document.getElementById('scrapeBtn').disabled = false;
-    } else if (data.status === 'error') {
+    }
+  } catch(e) { console.error(e); }
+}
+
+function showJobState(data) {
+  if (data.progress !== undefined) {
+    setProgress(data.progress, '');
+  }
+  document.getElementById('progressTitle').textContent =
+    data.status === 'queued' ? `Queued, position ${data.queue_position} of ${data.queue_depth}` : 'Archiving';
+}
+
+async function cancelJob() {
+  if (!currentJobId) return;
+  document.getElementById('cancelBtn').disabled = true;
+  try {
+    const resp = await fetch('/api/cancel/' + currentJobId, {method: 'POST'});
+    const data = await resp.json();
+    if (data.error) addLog(data.error, 'err');
+    else addLog('Cancelling...', 'info');
+  } catch(e) { console.error(e); }
+}
+
+function jobFinished(result, error) {
+  const cancelBtn = document.getElementById('cancelBtn');
+  cancelBtn.style.display = 'none';
+  cancelBtn.disabled = false;
+  if (result) {
+    setProgress(100, 'Complete!');
+    renderResult(result);
+    loadNotes(result.folder);
+    loadSimilar(result.folder);
+    refreshArchive();
+  } else {
+    setError(error || 'Unknown error');
+  }
+  document.getElementById('scrapeBtn').disabled = false;
+}
+
+// Live progress pushed by the server; falls back to polling if the stream breaks
+function followJob(jobId) {
+  const es = new EventSource('/api/events/' + jobId);
+  es.addEventListener('log', e => {
+    const l = JSON.parse(e.data);
+    addLog(l.msg, l.type || 'info');
+    lastLogCount = parseInt(e.lastEventId, 10) || lastLogCount + 1;
+  });
+  es.addEventListener('progress', e => showJobState(JSON.parse(e.data)));
+  es.addEventListener('done', e => { es.close(); jobFinished(JSON.parse(e.data)); });
+  es.addEventListener('error', e => {
+    es.close();
+    if (e.data) {
+      jobFinished(null, JSON.parse(e.data).error);
+    } else if (currentJobId === jobId) {
+      pollTimer = setInterval(pollJob, 800);
+    }
+  });
+}
+
+async function pollJob() {
+  if (!currentJobId) return;
+  try {
+    const resp = await fetch('/api/status/' + currentJobId + '?log_offset=' + lastLogCount);
+    const data = await resp.json();
+    renderLog(data.log || []);
+    showJobState(data);
+    if (['done', 'error', 'cancelled', 'timed_out'].includes(data.status)) {
       clearInterval(pollTimer);
-      setError(data.error || 'Unknown error');
-      document.getElementById('scrapeBtn').disabled = false;
+      jobFinished(data.status === 'done' ? data.result : null, data.error);
     }
   } catch(e) { console.error(e); }
 }
@@ -557,11 +796,9 @@ function addLog(msg, type='info') {
 }
 
 let lastLogCount = 0;
-function renderLog(logs) {
-  if (logs.length <= lastLogCount) return;
-  const newLogs = logs.slice(lastLogCount);
+function renderLog(newLogs) {
   newLogs.forEach(l => addLog(l.msg, l.type || 'info'));
-  lastLogCount = logs.length;
+  lastLogCount += newLogs.length;
 }
 
 function setError(msg) {
@@ -576,16 +813,17 @@ function renderResult(r) {
 
   const mediaHtml = (r.media || []).map(m => {
     const src = '/archive/' + encodeURIComponent(r.folder) + '/' + encodeURIComponent(m.filename);
+    const thumb = m.thumb_url || '/thumb/' + encodeURIComponent(r.folder) + '/' + encodeURIComponent(m.filename);
     if (m.type === 'video') {
       return `<div class="media-item">
         <div class="media-badge">VIDEO</div>
-        <video src="${src}" controls muted playsinline style="max-height:200px;width:100%;"></video>
+        <video src="${src}" poster="${thumb}" preload="none" controls muted playsinline style="max-height:200px;width:100%;"></video>
         <div class="media-filename">${m.filename}</div>
       </div>`;
     } else {
       return `<div class="media-item">
         <div class="media-badge">IMAGE</div>
-        <img src="${src}" alt="ad media" loading="lazy">
+        <a href="${src}" target="_blank"><img src="${thumb}" alt="ad media" loading="lazy"></a>
         <div class="media-filename">${m.filename}</div>
       </div>`;
     }
@@ -598,7 +836,8 @@ function renderResult(r) {
     {k:'Started Running', v: r.started || '—'},
     {k:'Platforms', v: (r.platforms||[]).join(', ') || '—'},
     {k:'Ad ID', v: r.ad_id || '—'},
-    {k:'Media Files', v: (r.media||[]).length + ' file(s) saved'},
+    {k:'Media Files', v: (r.media||[]).length + ' file(s) saved' +
+                         (r.incomplete ? ' — incomplete, job ' + r.incomplete.replace('_', ' ') : '')},
     {k:'Archived', v: new Date().toLocaleDateString('en-AU')},
   ].map(i => `<div class="meta-item"><div class="meta-key">${i.k}</div><div class="meta-val">${i.v}</div></div>`).join('');
 
@@ -623,6 +862,7 @@ function renderResult(r) {
           </div>
         </div>
         ${mediaHtml ? `<span class="section-label">Media</span><div class="media-grid">${mediaHtml}</div>` : ''}
+        <div id="similarAds"></div>
         <div class="save-path">
           <div class="save-path-icon">💾</div>
           <div class="save-path-info">
@@ -638,30 +878,107 @@ function escHtml(s) {
   return String(s).replace(/&/g,'&amp;').replace(/</g,'&lt;').replace(/>/g,'&gt;');
 }
 
-async function loadArchive() {
+let archiveSeq = null;
+let archiveCursor = null;
+
+let searchTimer = null;
+function onSearchInput() {
+  clearTimeout(searchTimer);
+  searchTimer = setTimeout(runSearch, 200);
+}
+
+async function runSearch() {
+  const q = document.getElementById('searchInput').value.trim();
+  if (!q) return loadArchive();
+  try {
+    const resp = await fetch('/api/search?limit=50&q=' + encodeURIComponent(q));
+    const data = await resp.json();
+    const list = document.getElementById('archiveList');
+    archiveCursor = null;
+    if (data.error || !data.results.length) {
+      list.innerHTML = '<div class="archive-empty">No matching ads.</div>';
+      return;
+    }
+    list.innerHTML = data.results.map(archiveItemHtml).join('');
+  } catch(e) { console.error(e); }
+}
+
+function archiveItemHtml(ad) {
+  let thumbHtml = '<div class="archive-thumb">📦</div>';
+  if (ad.thumb) {
+    const src = ad.thumb_url || `/thumb/${encodeURIComponent(ad.folder)}/${encodeURIComponent(ad.thumb)}`;
+    thumbHtml = `<div class="archive-thumb"><img src="${src}" alt="" loading="lazy"></div>`;
+  }
+  return `<div class="archive-item" data-folder="${escHtml(ad.folder)}" onclick="loadArchivedAd('${ad.folder}')">
+    ${thumbHtml}
+    <div class="archive-info">
+      <div class="archive-name">${escHtml(ad.page_name || ad.folder)}</div>
+      <div class="archive-meta">${ad.ad_id || ''} · ${ad.saved || ''}${ad.media_count !== undefined ? ' · ' + ad.media_count + ' file(s)' : ''}</div>
+      ${ad.snippet ? `<div class="archive-snippet">${ad.snippet}</div>` : ''}
+    </div>
+    <span class="archive-arrow">›</span>
+  </div>`;
+}
+
+function setArchiveCount(total) {
+  document.getElementById('archiveCount').textContent = total + ' ad' + (total !== 1 ? 's' : '');
+}
+
+function renderMoreButton() {
+  const list = document.getElementById('archiveList');
+  const old = document.getElementById('archiveMore');
+  if (old) old.remove();
+  if (archiveCursor) {
+    list.insertAdjacentHTML('beforeend',
+      '<div class="archive-empty" id="archiveMore" style="cursor:pointer" onclick="loadArchive(true)">Load more</div>');
+  }
+}
+
+async function loadArchive(more = false) {
   try {
-    const resp = await fetch('/api/archive');
+    const url = '/api/archive?limit=100' + (more && archiveCursor ? '&cursor=' + encodeURIComponent(archiveCursor) : '');
+    const resp = await fetch(url);
     const data = await resp.json();
     const list = document.getElementById('archiveList');
-    document.getElementById('archiveCount').textContent = data.ads.length + ' ad' + (data.ads.length !== 1 ? 's' : '');
-    if (!data.ads.length) {
+    setArchiveCount(data.total);
+    if (!more) archiveSeq = data.seq;
+    archiveCursor = data.next_cursor;
+    if (!data.total) {
       list.innerHTML = '<div class="archive-empty">No ads archived yet.</div>';
       return;
     }
-    list.innerHTML = data.ads.map(ad => {
-      let thumbHtml = '<div class="archive-thumb">📦</div>';
-      if (ad.thumb) {
-        thumbHtml = `<div class="archive-thumb"><img src="/archive/${encodeURIComponent(ad.folder)}/${encodeURIComponent(ad.thumb)}" alt=""></div>`;
+    const html = data.ads.map(archiveItemHtml).join('');
+    if (more) {
+      list.insertAdjacentHTML('beforeend', html);
+    } else {
+      list.innerHTML = html;
+    }
+    renderMoreButton();
+  } catch(e) { console.error(e); }
+}
+
+// Apply only what changed since the list was loaded, instead of reloading it
+async function refreshArchive() {
+  if (document.getElementById('searchInput').value.trim()) return runSearch();
+  if (archiveSeq === null) return loadArchive();
+  try {
+    const resp = await fetch('/api/archive?since=' + archiveSeq);
+    const data = await resp.json();
+    if (data.reset) return loadArchive();
+    const list = document.getElementById('archiveList');
+    if (data.changed.length && list.querySelector('.archive-empty:not(#archiveMore)')) list.innerHTML = '';
+    const find = f => Array.from(list.querySelectorAll('.archive-item')).find(el => el.dataset.folder === f);
+    data.removed.forEach(f => { const el = find(f); if (el) el.remove(); });
+    data.changed.forEach(ad => {
+      const el = find(ad.folder);
+      if (el) {
+        el.outerHTML = archiveItemHtml(ad);
+      } else {
+        list.insertAdjacentHTML('afterbegin', archiveItemHtml(ad));
       }
-      return `<div class="archive-item" onclick="loadArchivedAd('${ad.folder}')">
-        ${thumbHtml}
-        <div class="archive-info">
-          <div class="archive-name">${escHtml(ad.page_name || ad.folder)}</div>
-          <div class="archive-meta">${ad.ad_id || ''} · ${ad.saved || ''} · ${ad.media_count || 0} file(s)</div>
-        </div>
-        <span class="archive-arrow">›</span>
-      </div>`;
-    }).join('');
+    });
+    archiveSeq = data.seq;
+    setArchiveCount(data.total);
   } catch(e) { console.error(e); }
 }
 
@@ -688,6 +1005,17 @@ async function loadNotes(folder) {
   } catch(e) {}
 }
 
+async function loadSimilar(folder) {
+  try {
+    const resp = await fetch('/api/archive/' + encodeURIComponent(folder) + '/similar?limit=12');
+    const data = await resp.json();
+    const box = document.getElementById('similarAds');
+    if (!box || !data.results || !data.results.length) return;
+    box.innerHTML = '<span class="section-label">Ads Using Similar Creatives</span>' +
+      data.results.map(archiveItemHtml).join('');
+  } catch(e) {}
+}
+
 async function openFolder(folder) {
   await fetch('/api/open_folder', {
     method: 'POST',
@@ -703,6 +1031,7 @@ async function loadArchivedAd(folder) {
     if (r.error) { alert(r.error); return; }
     renderResult(r);
     loadNotes(folder);
+    loadSimilar(folder);
     // Add open folder button to result card
     const topbar = document.querySelector('#resultBox .result-topbar');
     if (topbar && !topbar.querySelector('.open-btn')) {
@@ -722,26 +1051,806 @@ loadArchive();
 </body>
 </html>"""
 
+# ─────────────────────────────────────────────
+# BROWSER POOL
+# ─────────────────────────────────────────────
+# Launching Chromium costs 1-3s and a few hundred MB, so we keep a few warm
+# and hand every job a fresh context on one of them. Everything that talks
+# to a browser runs as a coroutine on the pool's event loop.
+
+def _chromium_rss_mb():
+    """Total RSS of Chromium processes spawned by this server, in MB (Linux only)."""
+    proc = Path('/proc')
+    if not proc.exists():
+        return None
+    page_kb = os.sysconf('SC_PAGE_SIZE') // 1024
+    parents, rss, names = {}, {}, {}
+    for d in proc.iterdir():
+        if not d.name.isdigit():
+            continue
+        try:
+            stat = (d / 'stat').read_text()
+        except OSError:
+            continue
+        pid = int(d.name)
+        rparen = stat.rindex(')')
+        fields = stat[rparen + 2:].split()
+        names[pid] = stat[stat.index('(') + 1:rparen]
+        parents[pid] = int(fields[1])
+        rss[pid] = int(fields[21]) * page_kb
+
+    me = os.getpid()
+    total_kb = 0
+    for pid, name in names.items():
+        if 'chrom' not in name and 'headless' not in name:
+            continue
+        p = parents.get(pid)
+        while p and p != me:
+            p = parents.get(p)
+        if p == me:
+            total_kb += rss[pid]
+    return total_kb // 1024
+
+
+class BrowserPool:
+    """A few warm Chromiums driven from one asyncio event loop.
+
+    The loop runs on its own thread with a single Playwright driver. Every
+    job is a coroutine on that loop and gets its own context on whichever
+    browser has the fewest open pages, so one browser hosts many ads at
+    once and a job that is waiting (on navigation, the modal, downloads)
+    costs no thread.
+    """
+
+    def __init__(self, size, max_jobs, max_rss_mb, pages_per_browser):
+        self.size = max(1, size)
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.pages_per_browser = max(1, pages_per_browser)
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._playwright = None
+        self._free = None       # asyncio.Condition, signalled when a page closes
+        self._starting = None   # asyncio.Lock around starting the Playwright driver
+        self._launch_locks = {}
+        self._waiting = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread:
+                return
+            self.loop = asyncio.new_event_loop()
+            # Every running job holds a thread for its downloads, so the
+            # default executor (min(32, CPUs + 4) threads) would cap them
+            self.loop.set_default_executor(ThreadPoolExecutor(max_workers=SCRAPE_WORKERS + 4,
+                                                              thread_name_prefix='scrape-io'))
+            for i in range(self.size):
+                self._slots[i] = {'slot': i, 'connected': False, 'busy': False, 'pages': 0, 'retiring': False,
+                                  'jobs': 0, 'jobs_total': 0, 'launches': 0, 'launched_at': None}
+            self._thread = threading.Thread(target=self._run_loop, name='scrape-engine', daemon=True)
+            self._thread.start()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the engine loop from any thread; returns a concurrent Future."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def run(self, fn, timings=None):
+        """Await fn(context) on a free browser and return its result.
+
+        Waits for a browser page to be free. The context is always closed
+        afterwards, whatever fn does. If a timings dict is given, browser
+        launch and context setup are timed into it.
+        """
+        timings = timings if timings is not None else {}
+        slot = await self._acquire(timings)
+        browser = slot['browser']
+        try:
+            with timed(timings, 'context'):
+                context = await browser.new_context(user_agent=USER_AGENT, viewport={'width': 1280, 'height': 900})
+        except asyncio.CancelledError:
+            await self._release(slot)
+            raise
+        except Exception:
+            await self._release(slot, failed=True)
+            raise
+        try:
+            return await fn(context)
+        finally:
+            try:
+                await context.close()
+            except Exception:
+                pass
+            slot['jobs'] += 1
+            slot['jobs_total'] += 1
+            await self._release(slot)
+
+    def queued(self):
+        return self._waiting
+
+    def stats(self):
+        with self._lock:
+            return [{k: v for k, v in s.items() if k != 'browser'} for s in self._slots.values()]
+
+    def shutdown(self, timeout=10):
+        if not self._thread or not self.loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result(timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+    # ── engine loop ──
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self._free = asyncio.Condition()
+        self._starting = asyncio.Lock()
+        self.loop.run_forever()
+
+    async def _acquire(self, timings):
+        async with self._starting:
+            if self._playwright is None:
+                # Starts on first use; a failure surfaces in the job and is retried by the next one
+                from playwright.async_api import async_playwright
+                self._playwright = await async_playwright().start()
+        self._waiting += 1
+        try:
+            async with self._free:
+                while True:
+                    open_slots = [s for s in self._slots.values()
+                                  if not s['retiring'] and s['pages'] < self.pages_per_browser]
+                    if open_slots:
+                        slot = min(open_slots, key=lambda s: (not s['connected'], s['pages']))
+                        break
+                    await self._free.wait()
+                slot['pages'] += 1
+                slot['busy'] = True
+        finally:
+            self._waiting -= 1
+        try:
+            if not self._healthy(slot.get('browser')):
+                with timed(timings, 'launch'):
+                    await self._launch(slot)
+        except BaseException:
+            # A cancelled launch may have left a half-started browser; retire it too
+            await self._release(slot, failed=True)
+            raise
+        return slot
+
+    async def _release(self, slot, failed=False):
+        # Reading /proc touches every process on the host; keep it off the loop
+        rss = await in_thread(_chromium_rss_mb) if self.max_rss_mb and not failed else None
+        async with self._free:
+            slot['pages'] -= 1
+            slot['busy'] = slot['pages'] > 0
+            if failed:
+                slot['retiring'] = True
+            elif not slot['retiring'] and self._should_recycle(slot, rss):
+                slot['retiring'] = True
+            if slot['retiring'] and slot['pages'] == 0:
+                await self._close(slot)
+                slot['retiring'] = False
+            self._free.notify_all()
+
+    def _healthy(self, browser):
+        if browser is None:
+            return False
+        try:
+            return browser.is_connected()
+        except Exception:
+            return False
+
+    async def _launch(self, slot):
+        lock = self._launch_locks.setdefault(slot['slot'], asyncio.Lock())
+        async with lock:
+            if self._healthy(slot.get('browser')):
+                return  # another job on this slot launched it meanwhile
+            await self._close(slot)
+            slot['browser'] = await self._playwright.chromium.launch(headless=True, args=[
+                '--no-sandbox', '--disable-dev-shm-usage',
+                '--disable-blink-features=AutomationControlled'
+            ])
+            slot.update(connected=True, jobs=0, launched_at=datetime.now().isoformat())
+            slot['launches'] += 1
+
+    async def _close(self, slot):
+        browser = slot.pop('browser', None)
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+        slot['connected'] = False
+
+    async def _stop(self):
+        for slot in self._slots.values():
+            await self._close(slot)
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+    def _should_recycle(self, slot, rss):
+        if self.max_jobs and slot['jobs'] >= self.max_jobs:
+            return True
+        if self.max_rss_mb:
+            live = sum(1 for s in self._slots.values() if s['connected']) or 1
+            if rss is not None and rss / live > self.max_rss_mb:
+                return True
+        return False
+
+
+browser_pool = BrowserPool(BROWSER_POOL_SIZE, BROWSER_MAX_JOBS, BROWSER_MAX_RSS_MB, PAGES_PER_BROWSER)
+atexit.register(browser_pool.shutdown)
+
+
+# ─────────────────────────────────────────────
+# JOB STORE
+# ─────────────────────────────────────────────
+# job_status behaves like the plain dict it used to be, but finished jobs
+# are written to SQLite and dropped from memory once they are old, not
+# recently looked at, or over the memory budget. Looking up an evicted or
+# pre-restart job loads it back from disk.
+
+class JobStore:
+    def __init__(self, db_path=None, ttl=JOB_TTL, max_finished=JOB_MAX_FINISHED,
+                 max_bytes=JOB_MEMORY_MB * 1024 * 1024, keep_days=JOB_KEEP_DAYS):
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.max_bytes = max_bytes
+        self._jobs = {}                 # job_id -> status dict (live and recent)
+        self._finished = OrderedDict()  # job_id -> approx size, least recently used first
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id       TEXT PRIMARY KEY,
+                    status       TEXT,
+                    created_at   REAL,
+                    finished_at  REAL,
+                    data         TEXT
+                )""")
+            # Jobs that were queued or running when the server stopped never will finish
+            for job_id, data in self._db.execute(
+                    "SELECT job_id, data FROM jobs WHERE status IN ('queued', 'running')").fetchall():
+                s = json.loads(data)
+                s.update(status='error', error='Server restarted before the job finished', finished_at=time.time())
+                self._persist(job_id, s)
+            self._db.execute('DELETE FROM jobs WHERE created_at < ?', (time.time() - keep_days * 86400,))
+            self._db.commit()
+
+    def _persist(self, job_id, s):
+        if self._db is None:
+            return 0
+        data = json.dumps(s, default=str)
+        self._db.execute('INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)',
+                         (job_id, s.get('status'), s.get('queued_at') or time.time(), s.get('finished_at'), data))
+        self._db.commit()
+        return len(data)
+
+    def __setitem__(self, job_id, s):
+        with self._lock:
+            self._jobs[job_id] = s
+            self._persist(job_id, s)
+
+    def __getitem__(self, job_id):
+        s = self.get(job_id)
+        if s is None:
+            raise KeyError(job_id)
+        return s
+
+    def __delitem__(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._bytes -= self._finished.pop(job_id, 0)
+            if self._db is not None:
+                self._db.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+                self._db.commit()
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+    def get(self, job_id, default=None):
+        with self._lock:
+            s = self._jobs.get(job_id)
+            if s is not None:
+                if job_id in self._finished:
+                    self._finished.move_to_end(job_id)
+                return s
+            if self._db is None:
+                return default
+            row = self._db.execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is None:
+                return default
+            s = json.loads(row[0])
+            if s.get('finished_at'):
+                self._jobs[job_id] = s
+                self._finished[job_id] = len(row[0])
+                self._bytes += len(row[0])
+                self._evict()
+            return s
+
+    def peek(self, job_id, default=None):
+        """job_id's status if it is in memory, without counting as a use or loading it from disk."""
+        with self._lock:
+            return self._jobs.get(job_id, default)
+
+    def values(self):
+        """Jobs currently held in memory (every live job, plus recent finished ones)."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def finish(self, job_id):
+        """Call once a job is done or failed: persist it and make it evictable."""
+        with self._lock:
+            s = self._jobs.get(job_id)
+            if s is None:
+                return
+            size = self._persist(job_id, s) or len(json.dumps(s, default=str))
+            self._bytes += size - self._finished.pop(job_id, 0)
+            self._finished[job_id] = size
+            self._evict()
+
+    def _evict(self):
+        now = time.time()
+        expired = [j for j in self._finished if now - (self._jobs[j].get('finished_at') or now) > self.ttl]
+        for job_id in expired:
+            self._drop(job_id)
+        while self._finished and (len(self._finished) > self.max_finished or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._finished)))
+
+    def _drop(self, job_id):
+        self._bytes -= self._finished.pop(job_id)
+        self._jobs.pop(job_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'in_memory': len(self._jobs), 'finished_in_memory': len(self._finished),
+                    'finished_bytes': self._bytes, 'persistent': self._db is not None}
+
+
+job_status = JobStore(JOBS_DB if PERSIST_JOBS else None)
+
+
+# ─────────────────────────────────────────────
+# JOB SCHEDULER
+# ─────────────────────────────────────────────
+# Jobs wait in a bounded priority queue (higher priority first, FIFO within
+# a priority) and up to `workers` of them run at once as coroutines on the
+# browser pool's event loop.
+
+class JobScheduler:
+    def __init__(self, workers, max_queued):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self._heap = []            # (-priority, seq, job_id, fn, args)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = set()
+        self._tasks = {}           # job_id -> asyncio.Task of a running job
+        self._stopping = False
+
+    def submit(self, job_id, fn, *args, priority=0):
+        """Queue the coroutine fn(job_id, *args). Returns False if the queue is full."""
+        with self._cond:
+            if len(self._heap) >= self.max_queued:
+                return False
+            heapq.heappush(self._heap, (-priority, next(self._seq), job_id, fn, args))
+        self._dispatch()
+        return True
+
+    def position(self, job_id):
+        """1-based place in the queue, or None if the job is not waiting."""
+        with self._cond:
+            for i, entry in enumerate(sorted(self._heap)):
+                if entry[2] == job_id:
+                    return i + 1
+        return None
+
+    def depth(self):
+        with self._cond:
+            return len(self._heap)
+
+    def running(self):
+        with self._cond:
+            return len(self._running)
+
+    def cancel(self, job_id):
+        """Take a waiting job off the queue, or cancel a running one's task.
+
+        Returns 'queued' or 'running' for where the job was found, or None
+        if it is neither (finished, or between the queue and its first step).
+        """
+        with self._cond:
+            for i, entry in enumerate(self._heap):
+                if entry[2] == job_id:
+                    self._heap[i] = self._heap[-1]
+                    self._heap.pop()
+                    heapq.heapify(self._heap)
+                    return 'queued'
+            task = self._tasks.get(job_id)
+        if task is None:
+            return None
+        browser_pool.loop.call_soon_threadsafe(task.cancel)
+        return 'running'
+
+    def shutdown(self):
+        with self._cond:
+            self._stopping = True
+
+    def _dispatch(self):
+        # Start queued jobs on the engine loop while there are free workers
+        while True:
+            with self._cond:
+                if self._stopping or not self._heap or len(self._running) >= self.workers:
+                    return
+                _, _, job_id, fn, args = heapq.heappop(self._heap)
+                self._running.add(job_id)
+            fut = browser_pool.submit(self._run(job_id, fn, args))
+            fut.add_done_callback(lambda _, job_id=job_id: self._finished(job_id))
+
+    async def _run(self, job_id, fn, args):
+        with self._cond:
+            self._tasks[job_id] = asyncio.current_task()
+        try:
+            await fn(job_id, *args)
+        except Exception:
+            import traceback
+            print(traceback.format_exc())
+        finally:
+            with self._cond:
+                self._tasks.pop(job_id, None)
+
+    def _finished(self, job_id):
+        with self._cond:
+            self._running.discard(job_id)
+        self._dispatch()
+
+
+scheduler = JobScheduler(SCRAPE_WORKERS, SCRAPE_QUEUE_MAX)
+atexit.register(scheduler.shutdown)
+
+
+# ─────────────────────────────────────────────
+# METRICS
+# ─────────────────────────────────────────────
+# In-process counters and histograms, served in the Prometheus text format
+# on /metrics. They start from zero on every restart; gauges (queue depth,
+# browsers) are read live when the endpoint is scraped.
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}      # name -> (kind, help, buckets)
+        self._values = {}    # (name, labels) -> float for counters, [buckets..., sum, count] for histograms
+
+    def describe(self, name, kind, help_text, buckets=None):
+        self._meta[name] = (kind, help_text, tuple(buckets or ()))
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = self._meta[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._values.setdefault(key, [0] * (len(buckets) + 2))
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def render(self, gauges=()):
+        """Prometheus text exposition. gauges is [(name, help, [(labels, value)])]."""
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+        with self._lock:
+            values = {k: (list(v) if isinstance(v, list) else v) for k, v in self._values.items()}
+        lines = []
+        for name, (kind, help_text, buckets) in self._meta.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for (vname, labels), v in sorted(values.items(), key=lambda kv: kv[0]):
+                if vname != name:
+                    continue
+                if kind == 'counter':
+                    lines.append(f'{name}{fmt_labels(labels)} {v:g}')
+                    continue
+                for bound, count in zip(buckets, v):
+                    lines.append(f'{name}_bucket{fmt_labels(labels, [("le", f"{bound:g}")])} {count}')
+                lines.append(f'{name}_bucket{fmt_labels(labels, [("le", "+Inf")])} {v[-1]}')
+                lines.append(f'{name}_sum{fmt_labels(labels)} {v[-2]:g}')
+                lines.append(f'{name}_count{fmt_labels(labels)} {v[-1]}')
+        for name, help_text, samples in gauges:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            lines += [f'{name}{fmt_labels(labels)} {value:g}' for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+metrics.describe('advault_stage_seconds', 'histogram', 'Time spent in each stage of an archive job.',
+                 (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120))
+metrics.describe('advault_download_bytes', 'histogram', 'Size of each saved media file.',
+                 (1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8))
+metrics.describe('advault_download_bytes_per_second', 'histogram', 'Network throughput of each media download.',
+                 (1e4, 1e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7))
+metrics.describe('advault_jobs_total', 'counter', 'Finished archive jobs by outcome and failure type.')
+metrics.describe('advault_jobs_rejected_total', 'counter', 'Archive requests turned away because the queue was full.')
+
+
+@contextmanager
+def timed(timings, stage):
+    """Add the time spent in the block to timings[stage] and the stage histogram."""
+    started = time.time()
+    try:
+        yield
+    finally:
+        elapsed = time.time() - started
+        timings[stage] = round(timings.get(stage, 0) + elapsed, 3)
+        metrics.observe('advault_stage_seconds', elapsed, stage=stage)
+
+
+def failure_type(exc):
+    """Coarse failure label for metrics and job status."""
+    if 'Timeout' in type(exc).__name__:
+        return 'timeout'
+    if type(exc).__module__.startswith('playwright'):
+        return 'browser'
+    if isinstance(exc, ValueError):
+        return 'bad_input'
+    if isinstance(exc, OSError):
+        return 'io'
+    return type(exc).__name__
+
+
+# ─────────────────────────────────────────────
+# REQUEST BLOCKING
+# ─────────────────────────────────────────────
+# Most of what the Ad Library page loads (fonts, analytics, logging
+# beacons, the background search results' thumbnails) is never archived.
+# A blocking profile aborts those requests in the browser; the counters
+# show what each job blocked and let through.
+
+TRACKING_PATTERNS = [
+    r'facebook\.com/tr[/?]',
+    r'connect\.facebook\.net/.*/fbevents',
+    r'/ajax/bz\b',
+    r'/ajax/bnzai\b',
+    r'/ajax/webstorage/',
+    r'/ajax/qm/',
+    r'google-analytics\.com',
+    r'googletagmanager\.com',
+    r'doubleclick\.net',
+]
+
+BLOCK_PROFILES = {
+    'off': {'types': set(), 'patterns': [], 'media_during_load': True},
+    # Nothing here is ever part of an archived ad
+    'safe': {'types': {'font', 'manifest', 'texttrack', 'ping'}, 'patterns': TRACKING_PATTERNS,
+             'media_during_load': True},
+    # Also drops images/videos requested while the page itself is loading:
+    # those are the background search results, the modal's media come after
+    'aggressive': {'types': {'font', 'manifest', 'texttrack', 'ping', 'websocket', 'eventsource'},
+                   'patterns': TRACKING_PATTERNS + [r'static\.xx\.fbcdn\.net/rsrc\.php/.*\.(png|gif)'],
+                   'media_during_load': False},
+}
+
+
+class RequestBlocker:
+    """Routes one page's requests through a blocking profile and counts them."""
+
+    def __init__(self, profile=BLOCK_PROFILE, extra_patterns=BLOCK_EXTRA_PATTERNS, extra_types=()):
+        if profile not in BLOCK_PROFILES:
+            raise ValueError(f'Unknown block profile {profile!r} (use {", ".join(BLOCK_PROFILES)})')
+        self.profile = profile
+        p = BLOCK_PROFILES[profile]
+        self.types = p['types'] | set(extra_types)
+        self.media_during_load = p['media_during_load']
+        self.pattern = re.compile('|'.join(p['patterns'] + list(extra_patterns))) if p['patterns'] or extra_patterns else None
+        self.page_loaded = False
+        self.allowed = 0
+        self.blocked = 0
+        self.allowed_bytes = 0
+        self.blocked_by_reason = {}
+
+    async def attach(self, page):
+        if self.profile != 'off' or self.pattern or self.types:
+            await page.route('**/*', self._route)
+        page.on('response', self._count_bytes)
+
+    def block_reason(self, resource_type, url):
+        if resource_type in self.types:
+            return resource_type
+        if self.pattern and self.pattern.search(url):
+            return 'pattern'
+        if not self.media_during_load and not self.page_loaded and resource_type in ('image', 'media'):
+            return f'{resource_type}_during_load'
+        return None
+
+    async def _route(self, route):
+        req = route.request
+        reason = self.block_reason(req.resource_type, req.url)
+        if reason:
+            self.blocked += 1
+            self.blocked_by_reason[reason] = self.blocked_by_reason.get(reason, 0) + 1
+            await route.abort('blockedbyclient')
+        else:
+            self.allowed += 1
+            await route.continue_()
+
+    def _count_bytes(self, response):
+        length = response.headers.get('content-length')
+        if length and length.isdigit():
+            self.allowed_bytes += int(length)
+
+    def stats(self):
+        return {
+            'profile': self.profile,
+            'allowed_requests': self.allowed,
+            'blocked_requests': self.blocked,
+            'blocked_by_reason': dict(self.blocked_by_reason),
+            'allowed_bytes': self.allowed_bytes,
+        }
+
+
 # ─────────────────────────────────────────────
 # SCRAPER
 # ─────────────────────────────────────────────
 
+def notify_job_change():
+    """Wake up anything streaming job progress (see /api/events)."""
+    with job_changed:
+        job_generation[0] += 1
+        job_changed.notify_all()
+
+
+def in_thread(fn, *args, **kwargs):
+    """Run blocking fn on the event loop's executor and return an awaitable for its result."""
+    return asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+_ad_locks = {}  # ad_id -> [asyncio.Lock, jobs holding or waiting for it]; engine loop only
+
+
+@asynccontextmanager
+async def ad_lock(ad_id):
+    """Hold ad_id's lock, so only one job at a time writes the ad's archive folder.
+
+    Scrapes take it before they touch the folder and repairs for their
+    whole run. An entry goes away once no job holds or waits for it.
+    """
+    entry = _ad_locks.setdefault(ad_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _ad_locks[ad_id]
+
+
+def send_webhook(url, payload, attempts=3):
+    """POST payload as JSON to url in the background, retrying a couple of times."""
+    def post():
+        body = json.dumps(payload).encode()
+        for attempt in range(attempts):
+            try:
+                req = urllib.request.Request(url, data=body, method='POST',
+                                             headers={'Content-Type': 'application/json', 'User-Agent': 'AdVault'})
+                with urllib.request.urlopen(req, timeout=10) as resp:
+                    resp.read()
+                return
+            except Exception as e:
+                print(f'[webhook] {url[:80]} attempt {attempt + 1} failed: {e}')
+                if attempt + 1 < attempts:
+                    time.sleep(2 ** attempt)
+    threading.Thread(target=post, daemon=True).start()
+
+
+def valid_webhook(url):
+    """True if url is empty or an http(s) URL a webhook can be POSTed to."""
+    if not url:
+        return True
+    if not isinstance(url, str):
+        return False
+    parts = urllib.parse.urlsplit(url)
+    return parts.scheme in ('http', 'https') and bool(parts.netloc)
+
+
 def extract_ad_id(url: str):
     m = re.search(r'[?&]id=(\d+)', url)
     return m.group(1) if m else None
 
 
-def run_scrape_job(job_id: str, url: str):
+MODAL_READY_JS = """() => {
+    const dialogs = document.querySelectorAll('[role="dialog"], [aria-modal="true"]');
+    if (!dialogs.length) return false;
+    const modal = dialogs[dialogs.length - 1];
+    return (modal.innerText || '').includes('Started running on');
+}"""
+
+
+async def _wait_for_modal(page, last_media_ts, cap=MODAL_WAIT_MAX, quiet=MODAL_QUIET_SECONDS):
+    """Wait until the ad modal is rendered and its media have stopped arriving.
+
+    last_media_ts() returns the time of the most recent media response.
+    Returns (seconds waited, outcome) where outcome is 'ready', 'no_modal'
+    (the dialog never showed its start date) or 'media_cap' (media kept
+    arriving until the cap).
+    """
+    t0 = time.time()
+    deadline = t0 + cap
+    try:
+        await page.wait_for_function(MODAL_READY_JS, timeout=cap * 1000, polling=200)
+    except Exception:
+        return round(time.time() - t0, 2), 'no_modal'
+
+    modal_seen = time.time()
+    while time.time() < deadline:
+        if time.time() - max(last_media_ts(), modal_seen) >= quiet:
+            return round(time.time() - t0, 2), 'ready'
+        await asyncio.sleep(0.1)
+    return round(time.time() - t0, 2), 'media_cap'
+
+
+async def run_scrape_job(job_id: str, url: str):
     status = job_status[job_id]
     logs = status['log']
 
     def log(msg, t='info'):
         logs.append({'msg': msg, 'type': t})
+        notify_job_change()
 
     def progress(p):
         status['progress'] = p
+        notify_job_change()
+
+    status['status'] = 'running'
+    status['started_at'] = time.time()
+    status['wait_seconds'] = round(status['started_at'] - status.get('queued_at', status['started_at']), 2)
+    # Seconds per stage, for the status API, ad_meta.json and /metrics
+    timings = status['timings'] = {'queue': status['wait_seconds']}
+    metrics.observe('advault_stage_seconds', status['wait_seconds'], stage='queue')
+    notify_job_change()
+    if status['wait_seconds'] >= 1:
+        log(f'Started after {status["wait_seconds"]:.0f}s in queue')
+
+    # Cancelling the task interrupts whatever the job is awaiting; the browser
+    # pool closes its context on the way out and `stop` ends its downloads
+    task = asyncio.current_task()
+    stop = threading.Event()
+    save_path = meta = downloads = None
+    created = writing_meta = False
+    guard = AsyncExitStack()  # holds the ad's lock from choosing its folder to the end
+
+    def expire():
+        if not status.get('stop_reason'):
+            status['stop_reason'] = 'timed_out'
+            task.cancel()
+
+    deadline = asyncio.get_running_loop().call_later(JOB_DEADLINE, expire) if JOB_DEADLINE > 0 else None
 
     try:
+        if status.get('stop_reason'):
+            raise asyncio.CancelledError()  # cancelled on its way out of the queue
         ad_id = extract_ad_id(url)
         if not ad_id:
             raise ValueError("Could not extract ad ID from URL")
@@ -749,19 +1858,15 @@ def run_scrape_job(job_id: str, url: str):
         log(f'Ad ID detected: {ad_id}')
         progress(10)
 
-        from playwright.sync_api import sync_playwright
-
-        with sync_playwright() as p:
-            log('Launching browser...')
-            browser = p.chromium.launch(headless=True, args=[
-                '--no-sandbox', '--disable-dev-shm-usage',
-                '--disable-blink-features=AutomationControlled'
-            ])
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                viewport={'width': 1280, 'height': 900}
-            )
-            page = context.new_page()
+        # ── BROWSER PHASE ──
+        # Runs on a pooled, already-warm Chromium. Everything that needs the
+        # live page happens in here; downloads and file writes happen after the
+        # context has been handed back so the browser can serve the next job.
+        async def capture(context):
+            timings['browser_wait'] = round(time.time() - browser_requested, 3)
+            metrics.observe('advault_stage_seconds', timings['browser_wait'], stage='browser_wait')
+            log('Browser ready, opening page...')
+            page = await context.new_page()
 
             # ── NETWORK INTERCEPTION ──
             # Track ALL responses. We'll correlate to the ad modal AFTER page load
@@ -770,258 +1875,100 @@ def run_scrape_job(job_id: str, url: str):
             # We use a two-phase approach: ignore early responses, capture late ones.
             
             all_responses = []   # (timestamp, type, url, content_type)
+            media_responses = {}  # media key -> Response, to reuse its body later
+            json_responses = []   # page document + GraphQL responses that may carry the ad's JSON
             page_load_time = [0]
 
             def handle_response(response):
                 ts = time.time()
                 ctype = response.headers.get('content-type', '')
                 rurl = response.url
+                if len(json_responses) < 200 and ('/api/graphql' in rurl or (
+                        response.request.resource_type == 'document' and response.status == 200)):
+                    json_responses.append(response)
                 # Only track substantial media
                 if any(x in ctype for x in ['video/', 'mp4', 'webm']):
                     all_responses.append((ts, 'video', rurl, ctype))
+                    media_responses.setdefault(_media_key(rurl), response)
                 elif any(x in ctype for x in ['image/jpeg', 'image/png', 'image/webp', 'image/gif']):
                     if len(rurl) > 50 and 'favicon' not in rurl and 'emoji' not in rurl:
                         all_responses.append((ts, 'image', rurl, ctype))
+                        media_responses.setdefault(_media_key(rurl), response)
 
             page.on('response', handle_response)
+            blocker = RequestBlocker()
+            await blocker.attach(page)
 
             log('Loading Ad Library page...')
+            goto_started = time.time()
             try:
-                page.goto(url, wait_until='networkidle', timeout=35000)
+                with timed(timings, 'goto'):
+                    await page.goto(url, wait_until='networkidle', timeout=35000)
             except Exception:
-                page.goto(url, wait_until='domcontentloaded', timeout=35000)
+                log('Page never went network-idle — retrying until DOM content loaded')
+                with timed(timings, 'goto_retry'):
+                    await page.goto(url, wait_until='domcontentloaded', timeout=35000)
 
             page_load_time[0] = time.time()
+            blocker.page_loaded = True
+            goto_seconds = round(page_load_time[0] - goto_started, 2)
+            log(f'Page loaded in {goto_seconds:.1f}s — {blocker.blocked} request(s) blocked '
+                f'[{blocker.profile}]')
             progress(25)
             
+            # ── STRUCTURED DATA ──
+            # If the page JSON already describes the ad, its media URLs are
+            # known and we only need the modal on screen for the screenshot.
+            with timed(timings, 'json_extract'):
+                ad_data = await extract_structured(json_responses, ad_id)
+            checked = len(json_responses)
+
             # Wait for the modal to appear — Facebook loads background results first,
             # then the specific ad modal renders on top ~1-2s later
             log('Waiting for ad modal to load...')
-            time.sleep(9)
-
-            # ── FIND THE AD MODAL CONTAINER ──
-            # Facebook renders the specific ad in a modal/dialog overlay.
-            # We need to find that container and ONLY extract data from it.
-            log('Isolating ad modal container...')
-
-            ad_data = page.evaluate(f"""() => {{
-                const adId = '{ad_id}';
-                
-                // ── STRATEGY 1: Find element containing the ad ID ──
-                // Facebook often embeds the ad ID in data attributes or nearby text
-                let adContainer = null;
-                
-                // Look for any element with the ad ID in its subtree text
-                const allEls = Array.from(document.querySelectorAll('div'));
-                
-                // Try: find the modal/dialog overlay (usually highest z-index or role=dialog)
-                const dialogs = Array.from(document.querySelectorAll('[role="dialog"], [aria-modal="true"]'));
-                if (dialogs.length > 0) {{
-                    // Use the last/deepest dialog (most specific overlay)
-                    adContainer = dialogs[dialogs.length - 1];
-                }}
-                
-                // If no dialog, look for a div that contains the ad ID text 
-                // AND has limited siblings (not the main results list)
-                if (!adContainer) {{
-                    for (const el of allEls) {{
-                        if (el.innerText && el.innerText.includes(adId) && 
-                            el.children.length < 20 &&
-                            el.getBoundingClientRect().width > 300) {{
-                            adContainer = el;
-                            break;
-                        }}
-                    }}
-                }}
-                
-                // Fallback: look for a fixed/absolute positioned overlay div
-                if (!adContainer) {{
-                    for (const el of allEls) {{
-                        const style = window.getComputedStyle(el);
-                        if ((style.position === 'fixed' || style.position === 'absolute') &&
-                            style.zIndex > 10 &&
-                            el.getBoundingClientRect().height > 400) {{
-                            adContainer = el;
-                            break;
-                        }}
-                    }}
-                }}
-                
-                // If still nothing, use the element with "Started running" text
-                // as anchor - that's always inside the specific ad card
-                if (!adContainer) {{
-                    for (const el of allEls) {{
-                        if (el.innerText && el.innerText.includes('Started running on') &&
-                            el.children.length < 50) {{
-                            adContainer = el;
-                            break;
-                        }}
-                    }}
-                }}
-
-                const scope = adContainer || document.body;
-                const scopeText = scope.innerText || '';
-                const isFullPage = scope === document.body;
-                
-                // ── EXTRACT DATA FROM SCOPED CONTAINER ──
-                
-                // Page/advertiser name
-                let pageName = null;
-                const nameEls = Array.from(scope.querySelectorAll(
-                    'a[href*="/"], h1, h2, h3, [role="heading"], strong'
-                ));
-                for (const el of nameEls) {{
-                    const t = el.innerText.trim();
-                    // Skip generic UI text
-                    if (t.length > 1 && t.length < 80 && 
-                        !['Ad Library', 'Facebook', 'Search', 'Filter', 'Log in', 
-                          'Sign up', 'See ad details', 'Active', 'Inactive',
-                          'About this ad', 'Learn more'].some(s => t.includes(s))) {{
-                        pageName = t;
-                        break;
-                    }}
-                }}
-                
-                // Started running date
-                let startedRunning = null;
-                const dateMatch = scopeText.match(/Started running on ([A-Za-z]+ \\d{{1,2}}, \\d{{4}})/);
-                if (dateMatch) startedRunning = dateMatch[1];
-                
-                // Also try alternative date formats
-                if (!startedRunning) {{
-                    const dateMatch2 = scopeText.match(/Started running[:\\s]+([A-Za-z]+ \\d{{1,2}}, \\d{{4}})/);
-                    if (dateMatch2) startedRunning = dateMatch2[1];
-                }}
-                
-                // Ad status
-                let adStatus = 'Unknown';
-                if (scopeText.match(/\\bActive\\b/)) adStatus = 'Active';
-                else if (scopeText.match(/\\bInactive\\b/)) adStatus = 'Inactive';
-                
-                // Platforms
-                const platforms = [];
-                if (scopeText.includes('Facebook')) platforms.push('Facebook');
-                if (scopeText.includes('Instagram')) platforms.push('Instagram');
-                if (scopeText.includes('Messenger')) platforms.push('Messenger');
-                if (scopeText.includes('Audience Network')) platforms.push('Audience Network');
-                
-                // ── MEDIA: ONLY from the scoped container ──
-                const images = Array.from(scope.querySelectorAll('img[src]'))
-                    .map(img => ({{
-                        src: img.src,
-                        w: img.naturalWidth || img.width,
-                        h: img.naturalHeight || img.height
-                    }}))
-                    .filter(img => 
-                        img.src.startsWith('http') && 
-                        img.w > 200 && img.h > 200 &&   // skip small UI icons/avatars
-                        !img.src.includes('favicon') && 
-                        !img.src.includes('emoji') &&
-                        !img.src.includes('static.xx.fbcdn') &&  // FB UI chrome
-                        !img.src.includes('rsrc.php') &&          // FB static resources
-                        !img.src.includes('safe_image') &&        // FB proxy thumbs
-                        !(img.w === img.h && img.w < 300)         // skip square avatars/icons
-                    )
-                    .map(img => img.src);
-                
-                const videos = Array.from(scope.querySelectorAll('video'))
-                    .flatMap(v => {{
-                        const srcs = [];
-                        if (v.src) srcs.push(v.src);
-                        if (v.poster) srcs.push(('POSTER:' + v.poster));
-                        Array.from(v.querySelectorAll('source')).forEach(s => {{
-                            if (s.src) srcs.push(s.src);
-                        }});
-                        return srcs;
-                    }})
-                    .filter(Boolean);
-                
-                // ── ADDITIONAL ASSETS / CONTENT ITEMS ──
-                // Find the heading span, walk up to its container, grab text + links
-                const extraImages = [];
-                const extraVideos = [];
-                let extraText = '';
-                const allSpans = Array.from(document.querySelectorAll('span'));
-                for (const span of allSpans) {{
-                    const t = span.innerText.trim();
-                    if (t === 'Additional assets from this ad' || t === 'Additional content items from this ad') {{
-                        // Walk up to a meaningful container (has siblings/children with content)
-                        let container = span.parentElement;
-                        while (container && container.children.length < 2 && container !== document.body)
-                            container = container.parentElement;
-                        if (!container) continue;
-                        const ct = container.innerText.trim();
-                        if (ct.length > extraText.length) extraText = ct;
-                        Array.from(container.querySelectorAll('img[src]')).forEach(img => {{
-                            if (img.src.startsWith('http') && !img.src.includes('rsrc.php') && !img.src.includes('emoji'))
-                                extraImages.push(img.src);
-                        }});
-                        Array.from(container.querySelectorAll('video')).forEach(v => {{
-                            if (v.src) extraVideos.push(v.src);
-                            if (v.poster) extraImages.push(v.poster);
-                            Array.from(v.querySelectorAll('source')).forEach(s => {{ if (s.src) extraVideos.push(s.src); }});
-                        }});
-                    }}
-                }}
-                
-                // Ad copy text - the actual ad body text
-                // Look for the longest meaningful text block in the container
-                // that isn't navigation/metadata
-                let adText = '';
-                const textCandidates = Array.from(scope.querySelectorAll('div, p, span'))
-                    .filter(el => {{
-                        const t = el.innerText.trim();
-                        const rect = el.getBoundingClientRect();
-                        return t.length > 30 && 
-                               t.length < 5000 && 
-                               el.children.length < 8 &&
-                               rect.width > 100;
-                    }});
-                
-                for (const el of textCandidates) {{
-                    const t = el.innerText.trim();
-                    // Skip metadata lines
-                    if (t.includes('Started running') || 
-                        t.includes('Ad Library') ||
-                        t.length < adText.length) continue;
-                    adText = t;
-                }}
-                
-                // Page name = first non-empty line of ad copy
-                const adTextFirstLine = adText.split('\\n').map(l => l.trim()).find(l => l.length > 0) || null;
-                pageName = adTextFirstLine || pageName;
-                
-                // Screenshot of just the modal
-                const containerRect = scope !== document.body ? 
-                    JSON.stringify(scope.getBoundingClientRect()) : null;
-                
-                return {{
-                    pageName,
-                    startedRunning,
-                    adStatus,
-                    platforms,
-                    images: [...new Set(images)],
-                    videos: [...new Set(videos)],
-                    extraImages: [...new Set(extraImages)],
-                    extraVideos: [...new Set(extraVideos)],
-                    extraText: extraText.slice(0, 5000),
-                    adText: adText.slice(0, 3000),
-                    scopeText: scopeText.slice(0, 5000),
-                    containerRect,
-                    usedFallback: isFullPage,
-                    modalFound: adContainer !== null && adContainer !== document.body
-                }};
-            }}""")
+            last_media = lambda: all_responses[-1][0] if all_responses else 0
+            with timed(timings, 'modal_wait'):
+                waited, outcome = await _wait_for_modal(page, last_media, quiet=0 if ad_data else MODAL_QUIET_SECONDS)
+            if ad_data is None:
+                with timed(timings, 'json_extract'):
+                    ad_data = await extract_structured(json_responses[checked:], ad_id)
+
+            # Structured data without creatives is still good for dates etc.
+            fallback = None
+            if ad_data and not (ad_data['images'] or ad_data['videos']):
+                fallback, ad_data = ad_data, None
+            if outcome == 'ready':
+                log(f'Ad modal ready after {waited:.1f}s')
+            elif outcome == 'no_modal':
+                log(f'Ad modal not detected after {waited:.1f}s — continuing anyway')
+            else:
+                log(f'Modal media still loading after {waited:.1f}s — continuing anyway')
+
+            with timed(timings, 'dom_extract'):
+                if ad_data is None:
+                    # ── FIND THE AD MODAL CONTAINER ──
+                    # Facebook renders the specific ad in a modal/dialog overlay.
+                    # We need to find that container and ONLY extract data from it.
+                    log('Isolating ad modal container...')
+                    ad_data = _merge_ad_data(dict(await _extract_dom(page, ad_id), source='dom'), fallback)
+                else:
+                    rect = await page.evaluate(MODAL_RECT_JS)
+                    ad_data.update(containerRect=rect, modalFound=bool(rect))
 
             progress(50)
-            modal_status = "modal isolated ✓" if ad_data.get('modalFound') else "used full page (no modal found)"
-            log(f'DOM scraped — {modal_status}')
+            if ad_data.get('source') == 'json':
+                log('Ad data read from page JSON ✓', 'ok')
+            else:
+                modal_status = "modal isolated ✓" if ad_data.get('modalFound') else "used full page (no modal found)"
+                log(f'DOM scraped — {modal_status} via {ad_data.get("strategy")} '
+                    f'in {ad_data.get("timings", {}).get("total", 0):.0f}ms')
             log(f'Found {len(ad_data.get("images", []))} images, {len(ad_data.get("videos", []))} video sources, {len(ad_data.get("extraImages", []))} extra images, {len(ad_data.get("extraVideos", []))} extra videos')
 
             # ── SCREENSHOT: crop to modal if possible ──
             screenshot_bytes = None
             try:
                 clip = None
+                shot_started = time.time()
                 if ad_data.get('containerRect'):
                     r = json.loads(ad_data['containerRect'])
                     if r.get('width', 0) > 200 and r.get('height', 0) > 200:
@@ -1031,185 +1978,792 @@ def run_scrape_job(job_id: str, url: str):
                             'width': min(r['width'], 1280),
                             'height': min(r['height'], 900)
                         }
-                screenshot_bytes = page.screenshot(clip=clip) if clip else page.screenshot()
+                screenshot_bytes = await (page.screenshot(clip=clip) if clip else page.screenshot())
             except Exception as e:
                 log(f'Screenshot warning: {e}')
+            finally:
+                timings['screenshot'] = round(time.time() - shot_started, 3)
+                metrics.observe('advault_stage_seconds', timings['screenshot'], stage='screenshot')
 
-            # ── PARSE PAGE NAME ──
-            page_name = ad_data.get('pageName') or _parse_page_name(ad_data.get('scopeText', ''), ad_id)
-            
-            # Clean up
-            safe_name = re.sub(r'[^\w\s-]', '', page_name or 'Unknown')[:40].strip()
-            today = datetime.now().strftime('%Y-%m-%d')
-            folder_name = f"{safe_name}_{ad_id}_{today}"
-            save_path = SAVE_DIR / folder_name
-            save_path.mkdir(exist_ok=True)
-            log(f'Saving to folder: {folder_name}')
-            progress(55)
-
-            if screenshot_bytes:
-                with open(save_path / 'screenshot.png', 'wb') as f:
-                    f.write(screenshot_bytes)
-                log('Screenshot saved ✓', 'ok')
-
-            # ── BUILD MEDIA LIST ──
-            # page_load_time[0] is stamped right after goto() completes.
-            # Background search results load DURING goto().
-            # The specific ad modal loads AFTER goto() — during our 9s wait.
-            # So: responses timestamped AFTER page_load_time = modal media only.
-
-            after_load_cutoff = page_load_time[0]
-
-            modal_network = [
-                (t, mtype, rurl) for (t, mtype, rurl, _) in all_responses
-                if t > after_load_cutoff
-            ]
-
-            log(f'Network: {len(all_responses)} total, {len(modal_network)} after page load (modal)')
-
-            all_media_urls = []
-
-            # Priority 1: DOM from isolated modal container (most precise)
-            for img_url in ad_data.get('images', []):
-                all_media_urls.append(('image', img_url, 'dom_modal'))
-
-            for vid_entry in ad_data.get('videos', []):
-                if vid_entry.startswith('POSTER:'):
-                    all_media_urls.append(('image', vid_entry[7:], 'dom_poster'))
-                else:
-                    all_media_urls.append(('video', vid_entry, 'dom_video'))
-
-            # Priority 1b: Additional assets / content items sections
-            for img_url in ad_data.get('extraImages', []):
-                all_media_urls.append(('image', img_url, 'extra_assets'))
-            for vid_url in ad_data.get('extraVideos', []):
-                all_media_urls.append(('video', vid_url, 'extra_assets'))
-
-            # Priority 2: Network responses that fired AFTER background page loaded
-            for _, mtype, rurl in modal_network:
-                all_media_urls.append((mtype, rurl, 'network_modal'))
-
-            # NO fallback to all_responses — that pulls in background ad images
-
-            # Deduplicate
-            seen_urls = set()
-            unique_media = []
-            for mtype, murl, source in all_media_urls:
-                key = murl.split('?')[0][:120]
-                if key not in seen_urls and murl.startswith('http'):
-                    seen_urls.add(key)
-                    unique_media.append((mtype, murl, source))
-
-            # Edge case: nothing found — fall back to video-only from full session
-            # (videos are rarely present in background ad cards, so safer to include)
-            if not unique_media:
-                log('No modal media found — falling back to video-only from full session')
-                for (_, mtype, rurl, _) in all_responses:
-                    if mtype == 'video':
-                        key = rurl.split('?')[0][:120]
-                        if key not in seen_urls:
-                            seen_urls.add(key)
-                            unique_media.append((mtype, rurl, 'fallback_video'))
-
-            log(f'Unique media URLs to download: {len(unique_media)}')
-            progress(60)
-
-            # ── DOWNLOAD MEDIA ──
-            saved_media = []
-            cookies = context.cookies()
-            cookie_str = '; '.join([f"{c['name']}={c['value']}" for c in cookies])
-
-            for i, (mtype, murl, source) in enumerate(unique_media[:20]):
-                try:
-                    ext = _get_ext(murl, mtype)
-                    h = hashlib.md5(murl.encode()).hexdigest()[:8]
-                    filename = f"{mtype}_{i+1:02d}_{h}{ext}"
-                    filepath = save_path / filename
-
-                    req = urllib.request.Request(murl, headers={
-                        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36',
-                        'Referer': 'https://www.facebook.com/',
-                        'Cookie': cookie_str[:500] if cookie_str else '',
-                        'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8' if mtype == 'image' else 'video/mp4,video/*,*/*'
-                    })
-                    with urllib.request.urlopen(req, timeout=20) as resp:
-                        data_bytes = resp.read()
-                    
-                    if len(data_bytes) > 2000:  # skip tiny placeholder images
-                        with open(filepath, 'wb') as f:
-                            f.write(data_bytes)
-                        size_kb = len(data_bytes) // 1024
-                        saved_media.append({'type': mtype, 'filename': filename, 'size': len(data_bytes), 'source': source})
-                        log(f'Saved {filename} ({size_kb}KB) [{source}]', 'ok')
-                    else:
-                        log(f'Skip tiny file {mtype} #{i+1} ({len(data_bytes)}B)')
-                        
-                except Exception as e:
-                    log(f'Skip {mtype} #{i+1}: {str(e)[:60]}')
-                
-                progress(60 + int(35 * (i + 1) / max(len(unique_media[:20]), 1)))
-
-            # ── SAVE METADATA ──
-            meta = {
-                'ad_id': ad_id,
-                'url': url,
-                'page_name': page_name,
-                'status': ad_data.get('adStatus'),
-                'started': ad_data.get('startedRunning'),
-                'platforms': ad_data.get('platforms', []),
-                'ad_text': ad_data.get('adText', ''),
-                'extra_text': ad_data.get('extraText', ''),
-                'media': saved_media,
-                'archived_at': datetime.now().isoformat(),
-                'save_path': str(save_path),
-                'scrape_notes': {
-                    'modal_found': ad_data.get('modalFound'),
-                    'used_fallback': ad_data.get('usedFallback'),
-                    'total_responses_intercepted': len(all_responses),
-                    'modal_network_responses': len(modal_network)
-                }
+            # ── KEEP MEDIA BODIES ──
+            # Chromium has already downloaded most creatives; keep those bytes
+            # (within a budget) so we don't fetch them a second time later.
+            # DOM media go first since they are the ones most likely saved.
+            candidates = list(ad_data.get('images', []))
+            candidates += [v[7:] if v.startswith('POSTER:') else v for v in ad_data.get('videos', [])]
+            candidates += ad_data.get('extraImages', []) + ad_data.get('extraVideos', [])
+            candidates += [rurl for (t, _, rurl, _) in all_responses if t > page_load_time[0]]
+            candidates += [rurl for (_, mtype, rurl, _) in all_responses if mtype == 'video']
+            with timed(timings, 'capture_bodies'):
+                bodies = await _capture_bodies(media_responses, candidates, CAPTURE_BODIES_MB * 1024 * 1024)
+            if bodies:
+                log(f'Kept {len(bodies)} media file(s) from the browser session '
+                    f'({sum(len(b) for b in bodies.values()) // 1024}KB)')
+
+            cookies = await context.cookies()
+            return {
+                'ad_data': ad_data,
+                'screenshot_bytes': screenshot_bytes,
+                'all_responses': all_responses,
+                'page_load_time': page_load_time[0],
+                'cookies': cookies,
+                'bodies': bodies,
+                'goto_seconds': goto_seconds,
+                'requests': blocker.stats(),
+                'modal_wait': {'seconds': waited, 'outcome': outcome},
             }
-            with open(save_path / 'ad_meta.json', 'w') as f:
-                json.dump(meta, f, indent=2)
-            log('Metadata JSON saved ✓', 'ok')
 
-            browser.close()
-            progress(100)
+        log('Waiting for a browser...')
+        browser_requested = time.time()
+        with timed(timings, 'browser'):
+            captured = await browser_pool.run(capture, timings)
+        ad_data = captured['ad_data']
+        screenshot_bytes = captured['screenshot_bytes']
+        all_responses = captured['all_responses']
+        req_stats = status['requests'] = captured['requests']
+        log(f"Requests: {req_stats['allowed_requests']} allowed ({req_stats['allowed_bytes'] // 1024}KB), "
+            f"{req_stats['blocked_requests']} blocked")
 
-            # Find best thumb for UI
-            thumb = None
-            for m in saved_media:
-                if m['type'] == 'image' and m.get('size', 0) > 10000:
-                    thumb = m['filename']
-                    break
-            if not thumb and (save_path / 'screenshot.png').exists():
-                thumb = 'screenshot.png'
-                if not any(m['filename'] == 'screenshot.png' for m in saved_media):
-                    saved_media.insert(0, {'type': 'image', 'filename': 'screenshot.png', 'size': 0})
-
-            status['status'] = 'done'
-            status['result'] = {
-                'ad_id': ad_id,
-                'page_name': page_name or 'Unknown Page',
-                'page_id': '',
-                'status': ad_data.get('adStatus', ''),
-                'started': ad_data.get('startedRunning', ''),
-                'platforms': ad_data.get('platforms', []),
-                'ad_text': ad_data.get('adText', ''),
-                'extra_text': ad_data.get('extraText', ''),
-                'media': saved_media,
-                'folder': folder_name,
-                'save_path': str(save_path),
-                'thumb': thumb,
+        # ── PARSE PAGE NAME ──
+        page_name = ad_data.get('pageName') or _parse_page_name(ad_data.get('scopeText', ''), ad_id)
+        
+        # From here on the work is disk and network I/O; it runs on executor
+        # threads so the event loop stays free for other jobs' pages
+        await guard.enter_async_context(ad_lock(ad_id))
+        folder_name, previous, created = await in_thread(_prepare_folder, ad_id, page_name)
+        save_path = SAVE_DIR / folder_name
+        log(f'Updating existing archive: {folder_name}' if previous else f'Saving to folder: {folder_name}')
+        progress(55)
+        # A folder that only holds a stopped job's partial archive has no
+        # snapshot to compare against yet
+        baseline = {} if previous.get('incomplete') else previous
+
+        # ── METADATA ──
+        # Filled in as the job goes, so a stopped job can still record what it had
+        meta = {
+            'ad_id': ad_id,
+            'url': url,
+            'page_name': page_name,
+            'page_id': ad_data.get('pageId', ''),
+            'status': ad_data.get('adStatus'),
+            'started': ad_data.get('startedRunning'),
+            'ended': ad_data.get('endedRunning'),
+            'platforms': ad_data.get('platforms', []),
+            'links': ad_data.get('links', []),
+            'ad_text': ad_data.get('adText', ''),
+            'extra_text': ad_data.get('extraText', ''),
+            'media': [],
+            'archived_at': None,
+            'first_archived_at': baseline.get('first_archived_at') or baseline.get('archived_at'),
+            'save_path': str(save_path),
+            'scrape_notes': {
+                'extraction': ad_data.get('source'),
+                'modal_found': ad_data.get('modalFound'),
+                'used_fallback': ad_data.get('usedFallback'),
+                'dom_strategy': ad_data.get('strategy'),
+                'dom_timings_ms': ad_data.get('timings'),
+                'total_responses_intercepted': len(all_responses),
+                'modal_network_responses': 0,
+                'modal_wait_seconds': captured['modal_wait']['seconds'],
+                'modal_wait_outcome': captured['modal_wait']['outcome'],
+                'media_from_browser': 0,
+                'page_load_seconds': captured['goto_seconds'],
+                'requests': captured['requests'],
+                'timings': timings,
             }
-            log(f'Done! {len(saved_media)} files archived to {folder_name}', 'ok')
+        }
+
+        if screenshot_bytes:
+            with timed(timings, 'write_screenshot'):
+                await in_thread((save_path / 'screenshot.png').write_bytes, screenshot_bytes)
+            log('Screenshot saved ✓', 'ok')
+
+        # ── BUILD MEDIA LIST ──
+        # page_load_time is stamped right after goto() completes.
+        # Background search results load DURING goto().
+        # The specific ad modal loads AFTER goto() — during the modal wait.
+        # So: responses timestamped AFTER page_load_time = modal media only.
+
+        after_load_cutoff = captured['page_load_time']
+
+        modal_network = [
+            (t, mtype, rurl) for (t, mtype, rurl, _) in all_responses
+            if t > after_load_cutoff
+        ]
+
+        log(f'Network: {len(all_responses)} total, {len(modal_network)} after page load (modal)')
+        meta['scrape_notes']['modal_network_responses'] = len(modal_network)
+
+        all_media_urls = []
+
+        # Priority 1: DOM from isolated modal container (most precise)
+        for img_url in ad_data.get('images', []):
+            all_media_urls.append(('image', img_url, 'dom_modal'))
+
+        for vid_entry in ad_data.get('videos', []):
+            if vid_entry.startswith('POSTER:'):
+                all_media_urls.append(('image', vid_entry[7:], 'dom_poster'))
+            else:
+                all_media_urls.append(('video', vid_entry, 'dom_video'))
+
+        # Priority 1b: Additional assets / content items sections
+        for img_url in ad_data.get('extraImages', []):
+            all_media_urls.append(('image', img_url, 'extra_assets'))
+        for vid_url in ad_data.get('extraVideos', []):
+            all_media_urls.append(('video', vid_url, 'extra_assets'))
+
+        # Priority 2: Network responses that fired AFTER background page loaded
+        for _, mtype, rurl in modal_network:
+            all_media_urls.append((mtype, rurl, 'network_modal'))
+
+        # NO fallback to all_responses — that pulls in background ad images
+
+        # Deduplicate
+        seen_urls = set()
+        unique_media = []
+        for mtype, murl, source in all_media_urls:
+            key = _media_key(murl)
+            if key not in seen_urls and murl.startswith('http'):
+                seen_urls.add(key)
+                unique_media.append((mtype, murl, source))
+
+        # Edge case: nothing found — fall back to video-only from full session
+        # (videos are rarely present in background ad cards, so safer to include)
+        if not unique_media:
+            log('No modal media found — falling back to video-only from full session')
+            for (_, mtype, rurl, _) in all_responses:
+                if mtype == 'video':
+                    key = _media_key(rurl)
+                    if key not in seen_urls:
+                        seen_urls.add(key)
+                        unique_media.append((mtype, rurl, 'fallback_video'))
+
+        log(f'Unique media URLs to download: {len(unique_media)}')
+        progress(60)
+
+        # ── DOWNLOAD MEDIA ──
+        cookies = captured['cookies']
+        cookie_str = '; '.join([f"{c['name']}={c['value']}" for c in cookies])
+        to_fetch = unique_media[:MAX_MEDIA_PER_AD]
+
+        def download_progress(done):
+            progress(60 + int(35 * done / max(len(to_fetch), 1)))
+
+        existing = {m['key']: m for m in previous.get('media', []) if m.get('key')}
+        download_deadline = time.time() + DOWNLOAD_DEADLINE
+        if JOB_DEADLINE > 0:
+            download_deadline = min(download_deadline, status['started_at'] + JOB_DEADLINE)
+        with timed(timings, 'downloads'):
+            downloads = in_thread(download_media, to_fetch, save_path, cookie_str, log, download_progress,
+                                  deadline=download_deadline, bodies=captured['bodies'], existing=existing, stop=stop)
+            saved_media = await asyncio.shield(downloads)  # a cancel must not orphan the threads
+
+        with timed(timings, 'thumbnails'):
+            made = await in_thread(make_thumbnails, save_path)
+        if made:
+            log(f'{made} thumbnail(s) created ✓', 'ok')
+        with timed(timings, 'phash'):
+            await in_thread(hash_media, save_path, saved_media)
+
+        # ── SAVE METADATA ──
+        meta['media'] = saved_media
+        meta['archived_at'] = datetime.now().isoformat()
+        meta['scrape_notes']['media_from_browser'] = sum(1 for m in saved_media if m.get('via') == 'browser')
+
+        def write_meta():
+            with open(save_path / 'ad_meta.json', 'w') as f:
+                json.dump(meta, f, indent=2)
+            if previous:
+                retired = _retire_superseded(save_path, saved_media, {_media_key(u) for _, u, _ in to_fetch})
+                if retired:
+                    log(f'{len(retired)} creative(s) the ad no longer uses moved to superseded/')
+            archive_index.upsert_folder(save_path)
+            # The first snapshot only records the status the ad started with
+            changes = snapshot_diff(baseline, meta) if baseline else None
+            record_history(save_path, changes if baseline else {'status': [None, meta['status']]})
+            return changes
+
+        writing_meta = True
+        with timed(timings, 'metadata'):
+            changes = await in_thread(write_meta)
+        log('Metadata JSON saved ✓', 'ok')
+        if changes:
+            log(f"Changed since last check: {', '.join(changes)}", 'ok')
+        elif baseline:
+            log('No changes since last check')
+
+        progress(100)
+
+        # Find best thumb for UI
+        thumb = None
+        for m in saved_media:
+            if m['type'] == 'image' and m.get('size', 0) > 10000:
+                thumb = m['filename']
+                break
+        if not thumb and (save_path / 'screenshot.png').exists():
+            thumb = 'screenshot.png'
+            if not any(m['filename'] == 'screenshot.png' for m in saved_media):
+                saved_media.insert(0, {'type': 'image', 'filename': 'screenshot.png', 'size': 0})
+
+        status['status'] = 'done'
+        status['result'] = {
+            'ad_id': ad_id,
+            'page_name': page_name or 'Unknown Page',
+            'page_id': ad_data.get('pageId', ''),
+            'status': ad_data.get('adStatus', ''),
+            'started': ad_data.get('startedRunning', ''),
+            'platforms': ad_data.get('platforms', []),
+            'ad_text': ad_data.get('adText', ''),
+            'extra_text': ad_data.get('extraText', ''),
+            'media': [dict(m, thumb_url=thumb_url(folder_name, m['filename'])) for m in saved_media],
+            'folder': folder_name,
+            'save_path': str(save_path),
+            'thumb': thumb,
+            'thumb_url': thumb_url(folder_name, thumb) if thumb else None,
+            'changes': changes,
+        }
+        slowest = sorted((k for k in timings if k not in ('browser', 'queue')), key=timings.get, reverse=True)[:3]
+        log('Slowest stages: ' + ', '.join(f'{k} {timings[k]:.1f}s' for k in slowest))
+        log(f'Done! {len(saved_media)} files archived to {folder_name}', 'ok')
 
+    except asyncio.CancelledError:
+        stop.set()
+        reason = status.get('stop_reason') or 'cancelled'
+        status['status'] = status['failure'] = reason
+        status['error'] = 'Cancelled' if reason == 'cancelled' else f'Stopped at the {JOB_DEADLINE:g}s job deadline'
+        logs.append({'msg': status['error'], 'type': 'err'})
+        if downloads is not None and not downloads.done():
+            # Record the folder only once every download thread has let go of it
+            await asyncio.wait([downloads])
+        if save_path is not None and not writing_meta:
+            if created and await in_thread(_discard_folder, save_path):
+                logs.append({'msg': f'Nothing saved yet — removed {save_path.name}', 'type': 'info'})
+            elif await in_thread(_write_partial_meta, save_path, meta, reason):
+                logs.append({'msg': f'Partial archive kept in {save_path.name}, marked incomplete', 'type': 'err'})
+            else:
+                logs.append({'msg': f'Previous archive in {save_path.name} left as it was', 'type': 'info'})
     except Exception as e:
         import traceback
         status['status'] = 'error'
         status['error'] = str(e)
+        status['failure'] = failure_type(e)
         logs.append({'msg': f'Fatal error: {e}', 'type': 'err'})
         print(traceback.format_exc())
+    finally:
+        if deadline is not None:
+            deadline.cancel()
+        status['finished_at'] = time.time()
+        timings['total'] = round(status['finished_at'] - status['started_at'], 3)
+        metrics.observe('advault_stage_seconds', timings['total'], stage='total')
+        metrics.inc('advault_jobs_total', outcome=status['status'], failure=status.get('failure', 'none'))
+        await guard.aclose()
+        await in_thread(finish_job, job_id, url)
+
+
+def finish_job(job_id, url):
+    """Hand a job that has reached a final state to the store, listeners and its webhook."""
+    status = job_status[job_id]
+    ad_id = extract_ad_id(url) if url else None  # repairs have no URL
+    # A cancelled job says nothing about whether the ad can still be scraped
+    if ad_id and status['status'] != 'cancelled' and not (status.get('result') or {}).get('cached'):
+        archive_index.record_check(ad_id, status['status'] == 'done')
+    if status.get('batch_id'):
+        batch_job_finished(status['batch_id'], job_id, status)
+    job_status.finish(job_id)
+    notify_job_change()
+    if status.get('webhook'):
+        send_webhook(status['webhook'], {
+            'job_id': job_id, 'status': status['status'], 'url': url,
+            'result': status.get('result'), 'error': status.get('error'),
+        })
+
+
+def cached_result(url):
+    """The archived result for url's ad if it is younger than RESULT_TTL, else None."""
+    ad_id = extract_ad_id(url)
+    if not ad_id or RESULT_TTL <= 0:
+        return None
+    folder = archive_index.latest(ad_id)
+    meta = archive_index.get(folder) if folder else None
+    if not meta or meta.get('incomplete') or not (SAVE_DIR / folder).is_dir():
+        return None
+    try:
+        age = time.time() - datetime.fromisoformat(meta['archived_at']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+    if age > RESULT_TTL:
+        return None
+    return dict(archive_result(folder, meta), cached=True, age_seconds=round(age))
+
+
+def _prepare_folder(ad_id, page_name):
+    """Folder for this scrape, the ad_meta.json it replaces ({} if new) and whether it was just created.
+
+    An ad that is already archived is refreshed in place, reusing whatever
+    creatives have not changed since.
+    """
+    folder_name = archive_index.latest(ad_id)
+    if folder_name and (SAVE_DIR / folder_name / 'ad_meta.json').exists():
+        try:
+            return folder_name, json.loads((SAVE_DIR / folder_name / 'ad_meta.json').read_text()), False
+        except (OSError, ValueError):
+            pass
+    safe_name = re.sub(r'[^\w\s-]', '', page_name or 'Unknown')[:40].strip()
+    today = datetime.now().strftime('%Y-%m-%d')
+    folder_name = f"{safe_name}_{ad_id}_{today}"
+    created = not (SAVE_DIR / folder_name).exists()
+    (SAVE_DIR / folder_name).mkdir(exist_ok=True)
+    return folder_name, {}, created
+
+
+def _discard_folder(save_path):
+    """Delete a folder a stopped job created if no creative made it into it. Returns True if deleted."""
+    if any(f.suffix in MEDIA_SUFFIXES and f.name.split('_')[0] in ('image', 'video') for f in save_path.iterdir()):
+        return False
+    shutil.rmtree(save_path, ignore_errors=True)
+    return True
+
+
+def _write_partial_meta(save_path, meta, reason):
+    """Record what a stopped job got as an archive marked incomplete.
+
+    Media are whichever files made it to disk. A folder that already holds
+    a complete archive keeps it untouched. Returns True if written.
+    """
+    meta_file = save_path / 'ad_meta.json'
+    try:
+        if not json.loads(meta_file.read_text()).get('incomplete'):
+            return False
+    except (OSError, ValueError):
+        pass
+    media = [{'type': f.name.split('_')[0], 'filename': f.name, 'size': f.stat().st_size}
+             for f in sorted(save_path.iterdir())
+             if f.suffix in MEDIA_SUFFIXES and f.name.split('_')[0] in ('image', 'video')]
+    partial = dict(meta, media=media, archived_at=datetime.now().isoformat(), incomplete=reason)
+    with open(meta_file, 'w') as f:
+        json.dump(partial, f, indent=2)
+    archive_index.upsert_folder(save_path)
+    return True
+
+
+def _retire_superseded(save_path, media, keys):
+    """Move creatives a refreshed ad no longer uses into its superseded/ folder.
+
+    media is the new saved_media list and keys the media keys this scrape
+    tried to fetch; files of either (including ones still waiting to be
+    resumed) stay. Their thumbnails and downloads.json entries go too.
+    Returns the names of the files moved.
+    """
+    state = DownloadState(save_path)
+    keep = {m['filename'] for m in media}
+    keep |= {name for name, entry in state.files.items() if entry.get('key') in keys}
+    moved, dropped = [], []
+    for f in sorted(save_path.iterdir()):
+        name = f.name[:-5] if f.name.endswith('.part') else f.name
+        if not f.is_file() or name in keep or name.split('_')[0] not in ('image', 'video'):
+            continue
+        if f.name.endswith('.part'):
+            f.unlink(missing_ok=True)
+        else:
+            (save_path / 'superseded').mkdir(exist_ok=True)
+            os.replace(f, save_path / 'superseded' / f.name)
+            moved.append(f.name)
+        for thumb in _thumb_candidates(save_path, name):
+            thumb.unlink(missing_ok=True)
+        dropped.append(name)
+    dropped += [name for name in state.files if name not in keep and not (save_path / name).exists()]
+    if dropped:
+        state.drop(dropped)
+    return moved
+
+
+def _media_key(url):
+    """Identity of a media URL, ignoring the signed query string."""
+    return url.split('?')[0][:120]
+
+
+async def _capture_bodies(responses, urls, budget):
+    """Read the bodies of already-intercepted media responses.
+
+    responses maps media key -> Playwright Response. Only complete (200)
+    responses are kept, in urls order, until budget bytes are used.
+    Returns {media key: bytes}.
+    """
+    bodies = {}
+    left = budget
+    for url in urls:
+        key = _media_key(url)
+        resp = responses.get(key)
+        if key in bodies or resp is None or resp.status != 200:
+            continue  # 206s are partial video ranges, not the whole file
+        length = resp.headers.get('content-length')
+        if length and length.isdigit() and int(length) > left:
+            continue
+        try:
+            body = await resp.body()
+        except Exception:
+            continue  # evicted from Chromium's cache or never finished
+        if length and length.isdigit() and 'content-encoding' not in resp.headers and len(body) != int(length):
+            continue
+        if len(body) > left:
+            continue
+        left -= len(body)
+        bodies[key] = body
+    return bodies
+
+
+# ── STRUCTURED AD DATA ──
+# The Ad Library page ships the ad's own record as JSON — embedded in the
+# HTML and in /api/graphql responses — with fields like ad_archive_id,
+# page_name, start_date, publisher_platform and a snapshot of the
+# creative. Reading that is cheaper and more reliable than the DOM.
+
+PLATFORM_NAMES = {
+    'FACEBOOK': 'Facebook', 'INSTAGRAM': 'Instagram', 'MESSENGER': 'Messenger',
+    'AUDIENCE_NETWORK': 'Audience Network', 'THREADS': 'Threads', 'WHATSAPP': 'WhatsApp',
+}
+
+MODAL_RECT_JS = """() => {
+    const dialogs = document.querySelectorAll('[role="dialog"], [aria-modal="true"]');
+    return dialogs.length ? JSON.stringify(dialogs[dialogs.length - 1].getBoundingClientRect()) : null;
+}"""
+
+
+def _json_payloads(text, needle):
+    """JSON documents in a GraphQL response or HTML page that mention needle."""
+    text = text.strip()
+    if text.startswith('for (;;);'):
+        text = text[9:]
+    if text.startswith('<'):
+        chunks = re.findall(r'<script type="application/json"[^>]*>(.*?)</script>', text, re.S)
+    else:
+        chunks = text.splitlines()  # GraphQL can stream one JSON object per line
+    for chunk in chunks:
+        if needle in chunk:
+            try:
+                yield json.loads(chunk)
+            except ValueError:
+                pass
+
+
+def _find_ad_node(doc, ad_id):
+    """The dict describing ad_id (one with a snapshot, if there are several)."""
+    found = None
+    stack = [doc]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, dict):
+            if str(obj.get('ad_archive_id', '')) == ad_id:
+                if obj.get('snapshot'):
+                    return obj
+                found = found or obj
+            stack.extend(obj.values())
+        elif isinstance(obj, list):
+            stack.extend(obj)
+    return found
+
+
+def _fmt_date(ts):
+    if not ts:
+        return None
+    d = datetime.fromtimestamp(int(ts), timezone.utc)
+    return f'{d:%b} {d.day}, {d.year}'
+
+
+def _parse_ad_node(node):
+    """Ad Library JSON record -> the same shape _extract_dom returns."""
+    snap = node.get('snapshot') or {}
+
+    def text_of(v):
+        return ((v.get('text') if isinstance(v, dict) else v) or '').strip()
+
+    def creatives(items, images, videos):
+        for it in items or []:
+            if not isinstance(it, dict):
+                continue
+            img = it.get('original_image_url') or it.get('resized_image_url')
+            vid = it.get('video_hd_url') or it.get('video_sd_url')
+            if vid:
+                videos.append(vid)
+                if it.get('video_preview_image_url'):
+                    videos.append('POSTER:' + it['video_preview_image_url'])
+            elif img:
+                images.append(img)
+
+    images, videos, extra_images, extra_videos = [], [], [], []
+    creatives(snap.get('images'), images, videos)
+    creatives(snap.get('videos'), images, videos)
+    creatives(snap.get('cards'), images, videos)
+    creatives(snap.get('extra_images'), extra_images, extra_videos)
+    creatives(snap.get('extra_videos'), extra_images, extra_videos)
+    extra_videos = [v for v in extra_videos if not v.startswith('POSTER:')]
+
+    cards = [c for c in snap.get('cards') or [] if isinstance(c, dict)]
+    ad_text = text_of(snap.get('body')) or '\n\n'.join(filter(None, (text_of(c.get('body')) for c in cards)))
+    extra_lines = [text_of(snap.get(k)) for k in ('title', 'link_description', 'caption', 'cta_text')]
+    extra_lines += [text_of(t) for t in snap.get('extra_texts') or []]
+    links = [snap.get('link_url')] + [c.get('link_url') for c in cards] + list(snap.get('extra_links') or [])
+
+    is_active = node.get('is_active')
+    return {
+        'pageName': snap.get('page_name') or node.get('page_name'),
+        'pageId': str(node.get('page_id') or snap.get('page_id') or ''),
+        'startedRunning': _fmt_date(node.get('start_date')),
+        'endedRunning': _fmt_date(node.get('end_date')) if is_active is False else None,
+        'adStatus': 'Active' if is_active else ('Inactive' if is_active is False else 'Unknown'),
+        'platforms': [PLATFORM_NAMES.get(p, p.title()) for p in node.get('publisher_platform') or []],
+        'images': list(dict.fromkeys(images)),
+        'videos': list(dict.fromkeys(videos)),
+        'extraImages': list(dict.fromkeys(extra_images)),
+        'extraVideos': list(dict.fromkeys(extra_videos)),
+        'adText': ad_text[:3000],
+        'extraText': '\n'.join(dict.fromkeys(l for l in extra_lines if l))[:5000],
+        'links': list(dict.fromkeys(l for l in links if isinstance(l, str) and l.startswith('http'))),
+        'scopeText': '',
+        'usedFallback': False,
+        'source': 'json',
+    }
+
+
+def _ad_from_text(text, ad_id):
+    """ad_id's record from one response body in the _extract_dom shape, or None."""
+    for doc in _json_payloads(text, ad_id):
+        node = _find_ad_node(doc, ad_id)
+        if node and node.get('snapshot'):
+            data = _parse_ad_node(node)
+            if data['images'] or data['videos'] or data['adText']:
+                return data
+    return None
+
+
+async def extract_structured(responses, ad_id):
+    """Look for ad_id's record in intercepted document/GraphQL responses.
+
+    Returns ad data in the _extract_dom shape, or None if no response
+    described the ad with at least one creative or its text.
+    """
+    for resp in responses:
+        try:
+            text = await resp.text()
+        except Exception:
+            continue
+        if ad_id not in text:
+            continue
+        # Search pages run to megabytes of JSON; parse them off the loop
+        data = await in_thread(_ad_from_text, text, ad_id)
+        if data:
+            return data
+    return None
+
+
+def _merge_ad_data(primary, fallback):
+    """Fill fields primary is missing from fallback (either may be None)."""
+    if not fallback:
+        return primary
+    merged = dict(primary)
+    for k, v in fallback.items():
+        if not merged.get(k) or merged.get(k) == 'Unknown':
+            merged[k] = v
+    return merged
+
+
+# Runs in the page with the ad id as its argument. Locating the ad container
+# tries cheap strategies first (dialog lookup, text-node search, hit-testing
+# the viewport centre) so layout is only read for a handful of elements;
+# everything else comes from one walk over the chosen container. The time
+# spent in each step is returned in `timings` (ms).
+DOM_EXTRACT_JS = r"""(adId) => {
+    const timings = {};
+    let t0 = performance.now();
+    const lap = (name) => { const now = performance.now(); timings[name] = +(now - t0).toFixed(1); t0 = now; };
+    const textNodes = (root, needle) => {
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT, {
+            acceptNode: n => n.nodeValue.includes(needle) ? NodeFilter.FILTER_ACCEPT : NodeFilter.FILTER_SKIP
+        });
+        const found = [];
+        while (walker.nextNode()) found.push(walker.currentNode);
+        return found;
+    };
+
+    // ── LOCATE THE AD CONTAINER ──
+    let adContainer = null;
+    let strategy = 'full_page';
+
+    // 1. The modal/dialog overlay — use the last (most specific) one
+    const dialogs = document.querySelectorAll('[role="dialog"], [aria-modal="true"]');
+    if (dialogs.length) { adContainer = dialogs[dialogs.length - 1]; strategy = 'dialog'; }
+    lap('dialog');
+
+    // 2. A compact, wide ancestor of the text node holding the ad id
+    if (!adContainer) {
+        for (const node of textNodes(document.body, adId)) {
+            for (let el = node.parentElement; el && el !== document.body; el = el.parentElement) {
+                if (el.children.length >= 20) break;
+                if (el.getBoundingClientRect().width > 300) { adContainer = el; break; }
+            }
+            if (adContainer) { strategy = 'ad_id'; break; }
+        }
+        lap('ad_id');
+    }
+
+    // 3. A fixed/absolute overlay — only the elements stacked at the viewport centre
+    if (!adContainer) {
+        for (const el of document.elementsFromPoint(innerWidth / 2, innerHeight / 2)) {
+            if (el === document.body || el === document.documentElement) break;
+            const style = getComputedStyle(el);
+            if ((style.position === 'fixed' || style.position === 'absolute') &&
+                style.zIndex > 10 && el.getBoundingClientRect().height > 400) {
+                adContainer = el; strategy = 'overlay'; break;
+            }
+        }
+        lap('overlay');
+    }
+
+    // 4. The card around "Started running on" — nearest ancestor that also holds media
+    if (!adContainer) {
+        const anchor = textNodes(document.body, 'Started running on')[0];
+        for (let el = anchor && anchor.parentElement, depth = 0; el && el !== document.body && depth < 15;
+             el = el.parentElement, depth++) {
+            if (el.querySelector('img, video')) { adContainer = el; strategy = 'started_running'; break; }
+        }
+        lap('started_running');
+    }
+
+    const scope = adContainer || document.body;
+    const scopeText = scope.innerText || '';
+    lap('scope_text');
+
+    // ── ONE PASS OVER THE CONTAINER ──
+    const SKIP_NAMES = ['Ad Library', 'Facebook', 'Search', 'Filter', 'Log in', 'Sign up',
+                        'See ad details', 'Active', 'Inactive', 'About this ad', 'Learn more'];
+    const NAME_SEL = 'a[href*="/"], h1, h2, h3, [role="heading"], strong';
+    const ASSET_HEADINGS = ['Additional assets from this ad', 'Additional content items from this ad'];
+    let pageName = null;
+    const imgs = [], videoEls = [], headings = [], textCandidates = [];
+    const walker = document.createTreeWalker(scope, NodeFilter.SHOW_ELEMENT);
+    for (let el = scope; el; el = walker.nextNode()) {
+        const tag = el.tagName;
+        if (tag === 'IMG') { if (el.src) imgs.push(el); continue; }
+        if (tag === 'VIDEO') { videoEls.push(el); continue; }
+        if (tag === 'SCRIPT' || tag === 'STYLE' || tag === 'svg') continue;
+        const text = el.textContent;
+        if (tag === 'SPAN' && ASSET_HEADINGS.includes(text.trim())) headings.push(el);
+        if (!pageName && el.matches(NAME_SEL)) {
+            const t = text.trim();
+            if (t.length > 1 && t.length < 80 && !SKIP_NAMES.some(s => t.includes(s))) pageName = t;
+        }
+        if ((tag === 'DIV' || tag === 'P' || tag === 'SPAN') && el.children.length < 8 &&
+            text.length > 30 && text.length < 5000) textCandidates.push(el);
+    }
+    lap('traverse');
+
+    // Started running date
+    let startedRunning = null;
+    const dateMatch = scopeText.match(/Started running on ([A-Za-z]+ \d{1,2}, \d{4})/) ||
+                      scopeText.match(/Started running[:\s]+([A-Za-z]+ \d{1,2}, \d{4})/);
+    if (dateMatch) startedRunning = dateMatch[1];
+
+    // Ad status
+    let adStatus = 'Unknown';
+    if (scopeText.match(/\bActive\b/)) adStatus = 'Active';
+    else if (scopeText.match(/\bInactive\b/)) adStatus = 'Inactive';
+
+    // Platforms
+    const platforms = ['Facebook', 'Instagram', 'Messenger', 'Audience Network'].filter(p => scopeText.includes(p));
+
+    // ── MEDIA ──
+    const images = imgs
+        .map(img => ({ src: img.src, w: img.naturalWidth || img.width, h: img.naturalHeight || img.height }))
+        .filter(img =>
+            img.src.startsWith('http') &&
+            img.w > 200 && img.h > 200 &&              // skip small UI icons/avatars
+            !img.src.includes('favicon') &&
+            !img.src.includes('emoji') &&
+            !img.src.includes('static.xx.fbcdn') &&    // FB UI chrome
+            !img.src.includes('rsrc.php') &&           // FB static resources
+            !img.src.includes('safe_image') &&         // FB proxy thumbs
+            !(img.w === img.h && img.w < 300)          // skip square avatars/icons
+        )
+        .map(img => img.src);
+    const videos = videoEls.flatMap(v => {
+        const srcs = [];
+        if (v.src) srcs.push(v.src);
+        if (v.poster) srcs.push('POSTER:' + v.poster);
+        v.querySelectorAll('source').forEach(s => { if (s.src) srcs.push(s.src); });
+        return srcs;
+    });
+
+    // ── ADDITIONAL ASSETS / CONTENT ITEMS ──
+    // Walk up from the heading to a container with siblings, grab its text + media
+    const extraImages = [], extraVideos = [];
+    let extraText = '';
+    for (const span of headings) {
+        let container = span.parentElement;
+        while (container && container.children.length < 2 && container !== document.body)
+            container = container.parentElement;
+        if (!container) continue;
+        const ct = container.innerText.trim();
+        if (ct.length > extraText.length) extraText = ct;
+        container.querySelectorAll('img[src]').forEach(img => {
+            if (img.src.startsWith('http') && !img.src.includes('rsrc.php') && !img.src.includes('emoji'))
+                extraImages.push(img.src);
+        });
+        container.querySelectorAll('video').forEach(v => {
+            if (v.src) extraVideos.push(v.src);
+            if (v.poster) extraImages.push(v.poster);
+            v.querySelectorAll('source').forEach(s => { if (s.src) extraVideos.push(s.src); });
+        });
+    }
+    lap('assets');
+
+    // ── AD COPY ──
+    // The longest visible text block that isn't metadata. Candidates were
+    // chosen on textContent; layout is only read for the ones we try.
+    let adText = '';
+    textCandidates.sort((a, b) => b.textContent.length - a.textContent.length);
+    for (const el of textCandidates) {
+        if (el.offsetWidth <= 100) continue;
+        const t = el.innerText.trim();
+        if (t.length <= 30 || t.includes('Started running') || t.includes('Ad Library')) continue;
+        adText = t;
+        break;
+    }
+    lap('ad_text');
+
+    // Page name = first non-empty line of ad copy
+    const adTextFirstLine = adText.split('\n').map(l => l.trim()).find(l => l.length > 0) || null;
+    pageName = adTextFirstLine || pageName;
+
+    // Screenshot of just the modal
+    const containerRect = adContainer ? JSON.stringify(adContainer.getBoundingClientRect()) : null;
+
+    return {
+        pageName,
+        startedRunning,
+        adStatus,
+        platforms,
+        images: [...new Set(images)],
+        videos: [...new Set(videos)],
+        extraImages: [...new Set(extraImages)],
+        extraVideos: [...new Set(extraVideos)],
+        extraText: extraText.slice(0, 5000),
+        adText: adText.slice(0, 3000),
+        scopeText: scopeText.slice(0, 5000),
+        containerRect,
+        usedFallback: !adContainer,
+        modalFound: !!adContainer,
+        strategy,
+        timings
+    };
+}"""
+
+
+async def _extract_dom(page, ad_id):
+    """DOM heuristics for the ad modal — the fallback when no page JSON describes the ad."""
+    t = time.time()
+    data = await page.evaluate(DOM_EXTRACT_JS, ad_id)
+    data['timings']['total'] = round((time.time() - t) * 1000, 1)
+    return data
 
 
 def _parse_page_name(text, ad_id):
@@ -1230,6 +2784,1933 @@ def _get_ext(url, mtype):
     return '.mp4' if mtype == 'video' else '.jpg'
 
 
+# ─────────────────────────────────────────────
+# MEDIA DOWNLOADS
+# ─────────────────────────────────────────────
+# Creatives are fetched in parallel over keep-alive connections shared by
+# all jobs, with a cap on how many requests hit one CDN host at once.
+
+class HostConnectionPool:
+    def __init__(self, per_host, max_idle=8):
+        self.per_host = max(1, per_host)
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = {}    # (scheme, host) -> [connection]
+        self._limits = {}  # (scheme, host) -> BoundedSemaphore
+
+    def _limit(self, key):
+        with self._lock:
+            if key not in self._limits:
+                self._limits[key] = threading.BoundedSemaphore(self.per_host)
+            return self._limits[key]
+
+    def _checkout(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                conn = idle.pop()
+                conn.timeout = timeout
+                if conn.sock:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+        scheme, host = key
+        cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return cls(host, timeout=timeout), False
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def open(self, url, headers, timeout=DOWNLOAD_TIMEOUT, max_redirects=5):
+        """GET url on a pooled connection and yield the response.
+
+        Redirects are followed and HTTP errors raise urllib.error.HTTPError.
+        The connection is only reused if the body was read to the end
+        inside the with-block.
+        """
+        for _ in range(max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            key = (parts.scheme, parts.netloc)
+            path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+            limit = self._limit(key)
+            if not limit.acquire(timeout=timeout):
+                raise TimeoutError(f'no free connection to {parts.netloc}')
+            conn = None
+            try:
+                for attempt in (0, 1):
+                    conn, reused = self._checkout(key, timeout)
+                    try:
+                        conn.request('GET', path, headers=headers)
+                        resp = conn.getresponse()
+                        break
+                    except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                        # idle keep-alive connection was closed by the server
+                        conn.close()
+                        conn = None
+                        if not reused or attempt:
+                            raise
+
+                location = resp.getheader('Location')
+                if resp.status in (301, 302, 303, 307, 308) and location:
+                    resp.read()
+                    self._checkin(key, conn)
+                    conn = None
+                    url = urllib.parse.urljoin(url, location)
+                    continue
+                if resp.status >= 400:
+                    raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+
+                yield resp
+                if resp.isclosed():
+                    self._checkin(key, conn)
+                    conn = None
+                return
+            finally:
+                if conn is not None:
+                    conn.close()
+                limit.release()
+        raise urllib.error.URLError(f'too many redirects: {url[:80]}')
+
+
+http_pool = HostConnectionPool(DOWNLOAD_PER_HOST)
+
+
+def _media_headers(mtype, cookie_str):
+    return {
+        'User-Agent': USER_AGENT,
+        'Referer': 'https://www.facebook.com/',
+        'Cookie': cookie_str or '',  # whole; a cookie cut mid-value is worse than none
+        'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8' if mtype == 'image' else 'video/mp4,video/*,*/*'
+    }
+
+
+class DownloadTooLarge(Exception):
+    pass
+
+
+class DownloadStopped(Exception):
+    pass
+
+
+class DownloadTruncated(Exception):
+    pass
+
+
+class ByteBudget:
+    """Bytes a job may still write, shared by its download threads."""
+
+    def __init__(self, limit):
+        self.left = limit
+        self._lock = threading.Lock()
+
+    def take(self, n):
+        with self._lock:
+            if n > self.left:
+                return False
+            self.left -= n
+            return True
+
+
+class DownloadState:
+    """Per-file download record of one ad folder, kept in its downloads.json.
+
+    Each entry (by filename) holds the media key and URL, the bytes on disk,
+    the size the server announced and how the last attempt ended: 'done',
+    'partial' (a .part file is waiting to be resumed), 'failed' or 'skipped'.
+    """
+    FILE = 'downloads.json'
+
+    def __init__(self, folder_path):
+        self.path = Path(folder_path) / self.FILE
+        self._lock = threading.Lock()
+        try:
+            self.files = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.files = {}
+
+    def filename_for(self, key):
+        """The file an earlier attempt used for this media key, if any."""
+        with self._lock:
+            for filename, entry in self.files.items():
+                if entry.get('key') == key:
+                    return filename
+        return None
+
+    def update(self, filename, **fields):
+        with self._lock:
+            entry = self.files.setdefault(filename, {})
+            entry.update(fields, updated_at=datetime.now().isoformat())
+            self._save()
+
+    def drop(self, filenames):
+        """Forget these files, so a repair no longer tries to fetch them."""
+        with self._lock:
+            for filename in filenames:
+                self.files.pop(filename, None)
+            self._save()
+
+    def _save(self):
+        tmp = self.path.with_name(self.FILE + '.tmp')
+        tmp.write_text(json.dumps(self.files, indent=2))
+        os.replace(tmp, self.path)
+
+
+def _stream_to_file(resp, filepath, first_chunk, max_bytes, budget, stop=None, offset=0, expected=None,
+                    deadline=None):
+    """Write first_chunk plus the rest of resp to filepath, chunk by chunk.
+
+    The body goes to a .part file that is renamed into place only once it
+    is complete (and, if expected is given, exactly that many bytes long).
+    With an offset the body is appended to the .part an earlier attempt
+    left. The stop event and the deadline are checked before every chunk.
+    An oversized download is deleted; any other failure keeps the .part so
+    it can be resumed. Returns the size of the finished file.
+    """
+    tmp = filepath.with_name(filepath.name + '.part')
+    size = offset
+    try:
+        with open(tmp, 'ab' if offset else 'wb') as f:
+            chunk = first_chunk
+            while chunk:
+                if stop is not None and stop.is_set():
+                    raise DownloadStopped('job stopped')
+                if deadline is not None and time.time() > deadline:
+                    raise DownloadStopped('download deadline reached')
+                size += len(chunk)
+                if size > max_bytes:
+                    raise DownloadTooLarge(f'over {max_bytes // (1024 * 1024)}MB file cap')
+                if not budget.take(len(chunk)):
+                    raise DownloadTooLarge('job size cap reached')
+                f.write(chunk)
+                chunk = resp.read(DOWNLOAD_CHUNK)
+        if expected is not None and size != expected:
+            raise DownloadTruncated(f'got {size} of {expected} bytes')
+        os.replace(tmp, filepath)
+    except DownloadTooLarge:
+        tmp.unlink(missing_ok=True)
+        raise
+    except BaseException:
+        if size == 0:
+            tmp.unlink(missing_ok=True)
+        raise
+    return size
+
+
+def _transient(exc):
+    """True if a failed download is worth retrying."""
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code in (408, 429) or exc.code >= 500  # 403/404 mean an expired or dead link
+    return isinstance(exc, (OSError, http.client.HTTPException, DownloadTruncated))
+
+
+def _fetch_resumable(murl, filepath, mtype, cookie_str, deadline, max_file, budget, stop, on_retry=None):
+    """Download murl to filepath over the shared pool, retrying and resuming.
+
+    A .part file left by an earlier attempt (or scrape) is continued with
+    a Range request. Transient errors are retried up to DOWNLOAD_RETRIES
+    times with jittered exponential backoff, within the deadline. Returns
+    (size, bytes fetched by the last attempt), or None for a tiny placeholder. If every
+    attempt fails the last error is raised and the .part stays behind.
+    """
+    part = filepath.with_name(filepath.name + '.part')
+    attempt = 0
+    while True:
+        offset = part.stat().st_size if part.exists() else 0
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise TimeoutError('download deadline reached')
+        headers = _media_headers(mtype, cookie_str)
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+        try:
+            with http_pool.open(murl, headers, timeout=min(DOWNLOAD_TIMEOUT, remaining)) as resp:
+                length = resp.getheader('Content-Length')
+                length = int(length) if length and length.isdigit() else None
+                if resp.status == 206:
+                    m = re.match(r'bytes (\d+)-\d+/(\d+|\*)', resp.getheader('Content-Range') or '')
+                    if not m or int(m.group(1)) != offset:
+                        part.unlink(missing_ok=True)
+                        raise DownloadTruncated('server resumed at the wrong offset')
+                    total = int(m.group(2)) if m.group(2).isdigit() else (offset + length if length is not None else None)
+                else:
+                    offset, total = 0, length  # Range ignored, the whole body follows
+                if total is not None and total > max_file:
+                    raise DownloadTooLarge(f'{total // (1024 * 1024)}MB is over the file size cap')
+                if offset:
+                    first = resp.read(DOWNLOAD_CHUNK)
+                else:
+                    # Content-Length or, failing that, the first chunk tells us if
+                    # this is a tiny placeholder before anything touches the disk
+                    first = resp.read(DOWNLOAD_CHUNK if total is None or total > TINY_FILE_BYTES else total)
+                    if (total if total is not None else len(first)) <= TINY_FILE_BYTES:
+                        resp.read()
+                        return None
+                size = _stream_to_file(resp, filepath, first, max_file, budget, stop, offset, total, deadline)
+            return size, size - offset
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:
+                part.unlink(missing_ok=True)  # stale .part; start over without counting an attempt
+                continue
+            if not _transient(e):
+                raise
+            error = e
+        except (DownloadTooLarge, DownloadStopped):
+            raise
+        except Exception as e:
+            if not _transient(e):
+                raise
+            error = e
+        attempt += 1
+        if attempt > DOWNLOAD_RETRIES:
+            raise error
+        delay = random.uniform(0, DOWNLOAD_BACKOFF * 2 ** attempt)
+        if time.time() + delay >= deadline:
+            raise error
+        if on_retry:
+            on_retry(attempt, delay, error)
+        if stop.wait(delay):
+            raise DownloadStopped('job stopped')
+
+
+def _download_one(state, save_path, filename, mtype, murl, source, cookie_str, deadline, budget, stop, log,
+                  label):
+    """Fetch one creative into save_path/filename, keeping its downloads.json entry current.
+
+    Returns the saved_media entry, or None if the file was skipped.
+    """
+    key = _media_key(murl)
+    max_file = MEDIA_MAX_FILE_MB * 1024 * 1024
+    part = save_path / (filename + '.part')
+    state.update(filename, key=key, url=murl, type=mtype, source=source, state='downloading', error=None)
+
+    def retrying(attempt, delay, error):
+        state.update(filename, attempts=attempt)
+        log(f'Retrying {label} in {delay:.1f}s ({attempt}/{DOWNLOAD_RETRIES}): {str(error)[:60]}')
+
+    started = time.time()
+    try:
+        fetched = _fetch_resumable(murl, save_path / filename, mtype, cookie_str, deadline, max_file, budget,
+                                   stop, on_retry=retrying)
+    except DownloadTooLarge as e:
+        state.update(filename, state='skipped', error=str(e))
+        log(f'Skip {label}: {e}')
+        return None
+    except BaseException as e:
+        on_disk = part.stat().st_size if part.exists() else 0
+        state.update(filename, state='partial' if on_disk else 'failed', bytes=on_disk, error=str(e)[:200])
+        raise
+    if fetched is None:
+        state.update(filename, state='skipped', error='tiny placeholder')
+        log(f'Skip tiny file {label}')
+        return None
+    size, new_bytes = fetched
+    sha, shared = blob_store.add(save_path / filename)
+    state.update(filename, state='done', bytes=size, expected=size, sha256=sha)
+    metrics.observe('advault_download_bytes', size, via='network')
+    metrics.observe('advault_download_bytes_per_second', new_bytes / max(time.time() - started, 1e-3))
+    resumed = f', resumed at {(size - new_bytes) // 1024}KB' if new_bytes < size else ''
+    shared = ', already in the archive' if shared else ''
+    log(f'Saved {filename} ({size // 1024}KB) [{source}{resumed}{shared}]', 'ok')
+    return {'type': mtype, 'filename': filename, 'size': size, 'source': source, 'via': 'network', 'key': key,
+            'sha256': sha}
+
+
+def download_media(items, save_path, cookie_str, log, on_progress=None, deadline=None, bodies=None,
+                   existing=None, stop=None):
+    """Download (mtype, url, source) items into save_path in parallel.
+
+    Returns the saved_media list in item order, whatever order the fetches
+    finish in. Anything not finished by the deadline is skipped. Bodies are
+    streamed to disk, so memory use does not depend on file size. Every
+    file's progress is recorded in the folder's downloads.json, and a file
+    an earlier scrape left half-done is resumed rather than restarted.
+
+    bodies maps media key -> bytes the browser already downloaded; those
+    items are written straight from memory and never hit the network.
+    existing maps media key -> the saved_media entry of an earlier scrape
+    into the same folder; files still on disk are kept as they are.
+    Setting the stop event abandons whatever is still downloading; so does
+    the deadline, which sets it.
+    """
+    bodies = bodies or {}
+    stop = stop or threading.Event()
+    existing = existing or {}
+    deadline = deadline or time.time() + DOWNLOAD_DEADLINE
+    max_file = MEDIA_MAX_FILE_MB * 1024 * 1024
+    budget = ByteBudget(MEDIA_MAX_JOB_MB * 1024 * 1024)
+    state = DownloadState(save_path)
+
+    def fetch(i, mtype, murl, source):
+        if stop.is_set():
+            return None
+        key = _media_key(murl)
+        # Ad Library CDN paths name the content itself, so an unchanged
+        # key means an unchanged creative
+        old = existing.get(key)
+        if old and (save_path / old['filename']).is_file():
+            log(f"Unchanged {old['filename']} — kept from the last scrape")
+            return dict(old, source=source, via='unchanged')
+        h = hashlib.md5(murl.encode()).hexdigest()[:8]
+        filename = state.filename_for(key) or f"{mtype}_{i+1:02d}_{h}{_get_ext(murl, mtype)}"
+        entry = state.files.get(filename, {})
+        if entry.get('state') == 'done' and (save_path / filename).is_file() \
+                and (save_path / filename).stat().st_size == entry.get('bytes'):
+            log(f'{filename} already downloaded by an earlier attempt')
+            return {'type': mtype, 'filename': filename, 'size': entry['bytes'], 'source': source,
+                    'via': 'unchanged', 'key': key, 'sha256': entry.get('sha256')}
+        body = bodies.get(key)
+        if body is not None:
+            if len(body) <= TINY_FILE_BYTES:
+                log(f'Skip tiny file {mtype} #{i+1} ({len(body)}B)')
+                return None
+            try:
+                size = _stream_to_file(io.BytesIO(), save_path / filename, body, max_file, budget)
+            except DownloadTooLarge as e:
+                log(f'Skip {mtype} #{i+1}: {e}')
+                return None
+            sha, _ = blob_store.add(save_path / filename)
+            state.update(filename, key=key, url=murl, type=mtype, source=source, state='done',
+                         bytes=size, expected=size, error=None, sha256=sha)
+            metrics.observe('advault_download_bytes', size, via='browser')
+            log(f'Saved {filename} ({size // 1024}KB) [{source}, from browser]', 'ok')
+            return {'type': mtype, 'filename': filename, 'size': size, 'source': source, 'via': 'browser', 'key': key,
+                    'sha256': sha}
+
+        if deadline - time.time() <= 0:
+            log(f'Skip {mtype} #{i+1}: download deadline reached')
+            return None
+        return _download_one(state, save_path, filename, mtype, murl, source, cookie_str, deadline, budget, stop,
+                             log, f'{mtype} #{i+1}')
+
+    results = {}
+    if not items:
+        return []
+    pool = ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(items)))
+    futures = {pool.submit(fetch, i, *item): i for i, item in enumerate(items)}
+    pending = set(futures)
+    done = 0
+    try:
+        # Short waits so a stopped job lets go of its downloads promptly
+        while pending:
+            if stop.is_set():
+                log(f'Job stopped — {len(pending)} download(s) abandoned')
+                break
+            left = deadline - time.time()
+            if left <= 0:
+                log(f'Download deadline reached — {len(pending)} file(s) skipped')
+                stop.set()
+                break
+            finished, pending = wait(pending, timeout=min(left, 0.5), return_when=FIRST_COMPLETED)
+            for fut in finished:
+                i = futures[fut]
+                try:
+                    results[i] = fut.result()
+                except Exception as e:
+                    log(f'Skip {items[i][0]} #{i+1}: {str(e)[:60]}')
+                done += 1
+                if on_progress:
+                    on_progress(done)
+    finally:
+        for fut in futures:
+            fut.cancel()
+        # Stopped fetches give up at their next chunk, leaving a resumable
+        # .part; waiting for them keeps a late one from marking its file done
+        pool.shutdown(wait=stop.is_set())
+
+    return [results[i] for i in sorted(results) if results[i]]
+
+
+def repair_archive(folder_path, log=print, deadline=None, stop=None):
+    """Fetch whatever media an archive folder is missing, using its downloads.json.
+
+    Files that failed, were left partial or are shorter than the server
+    said are downloaded again, resuming where they stopped, and added to
+    ad_meta.json. CDN links expire, so media that can no longer be fetched
+    stay listed as failed for the next scrape of the ad to pick up.
+    Setting the stop event ends the pass after the file in progress.
+    Returns {'repaired': [filenames], 'failed': [filenames]}.
+    """
+    folder_path = Path(folder_path)
+    state = DownloadState(folder_path)
+    todo = []
+    for filename, entry in list(state.files.items()):
+        path = folder_path / filename
+        if entry.get('state') == 'skipped' or not entry.get('url'):
+            continue
+        if path.is_file():
+            size = path.stat().st_size
+            if entry.get('state') == 'done' and size == entry.get('expected', size):
+                continue
+            if size < (entry.get('expected') or 0):
+                # Truncated: resume from what is there, on a copy so a shared blob is never appended to
+                shutil.copyfile(path, path.with_name(filename + '.part'))
+                path.unlink()
+        todo.append((filename, entry))
+    if not todo:
+        return {'repaired': [], 'failed': []}
+
+    deadline = deadline or time.time() + DOWNLOAD_DEADLINE
+    budget = ByteBudget(MEDIA_MAX_JOB_MB * 1024 * 1024)
+    stop = stop or threading.Event()
+    repaired, failed = [], []
+    for filename, entry in todo:
+        if stop.is_set():
+            break
+        try:
+            saved = _download_one(state, folder_path, filename, entry.get('type', 'image'), entry['url'],
+                                  entry.get('source', 'repair'), '', deadline, budget, stop, log, filename)
+        except Exception as e:
+            log(f'Could not repair {filename}: {str(e)[:80]}')
+            saved = None
+        (repaired if saved else failed).append(filename)
+        if not saved:
+            continue
+        meta_file = folder_path / 'ad_meta.json'
+        try:
+            meta = json.loads(meta_file.read_text())
+        except (OSError, ValueError):
+            continue
+        meta['media'] = [m for m in meta.get('media', []) if m.get('filename') != filename] + [saved]
+        with open(meta_file, 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    if repaired:
+        make_thumbnails(folder_path)
+        archive_index.upsert_folder(folder_path)
+    return {'repaired': repaired, 'failed': failed}
+
+
+def repair_all(log=print):
+    """Repair pass over the whole archive. Returns (files repaired, files still missing)."""
+    repaired = failed = 0
+    for folder in sorted(SAVE_DIR.iterdir()):
+        if folder.is_dir() and (folder / DownloadState.FILE).exists():
+            result = repair_archive(folder, log)
+            repaired += len(result['repaired'])
+            failed += len(result['failed'])
+    return repaired, failed
+
+
+async def run_repair_job(job_id, folder, ad_id):
+    """Scheduler job: repair_archive on one folder while holding its ad's lock."""
+    status = job_status[job_id]
+
+    def log(msg, t='info'):
+        status['log'].append({'msg': msg, 'type': t})
+        notify_job_change()
+
+    status.update(status='running', started_at=time.time())
+    notify_job_change()
+    stop = threading.Event()
+    try:
+        if status.get('stop_reason'):
+            raise asyncio.CancelledError()  # cancelled on its way out of the queue
+        async with ad_lock(ad_id):
+            work = in_thread(repair_archive, SAVE_DIR / folder, log, stop=stop)
+            try:
+                result = await asyncio.shield(work)
+            except asyncio.CancelledError:
+                # Let the repair thread finish its current chunk before the lock goes
+                stop.set()
+                await asyncio.wait([work])
+                raise
+        status.update(status='done', progress=100, result=dict(result, folder=folder))
+        log(f"Repaired {len(result['repaired'])} file(s), {len(result['failed'])} still missing", 'ok')
+    except asyncio.CancelledError:
+        status.update(status='cancelled', failure='cancelled', error='Cancelled')
+        log('Cancelled', 'err')
+    except Exception as e:
+        status.update(status='error', error=str(e), failure=failure_type(e))
+        log(f'Fatal error: {e}', 'err')
+    finally:
+        status['finished_at'] = time.time()
+        await in_thread(finish_job, job_id, None)
+
+
+# ─────────────────────────────────────────────
+# BLOB STORE
+# ─────────────────────────────────────────────
+# Media are kept once per content hash under SAVE_DIR/.blobs. The files in
+# an ad folder are hardlinks to those blobs, so a creative an advertiser
+# reuses across dozens of ads takes its disk space once, while every
+# folder still holds ordinary files the UI and a file browser can open.
+
+class BlobStore:
+    def __init__(self, root, link=True):
+        self.root = Path(root)
+        self.link = link
+        self._lock = threading.Lock()
+
+    def path(self, sha):
+        return self.root / sha[:2] / sha
+
+    @staticmethod
+    def digest(path):
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def add(self, path, link=None):
+        """Hash the file at path and, if linking, make it a link to the stored copy.
+
+        Returns (sha256, True if an identical blob was already stored and
+        path now shares it). Where hardlinks are not possible (FAT, the
+        store on another device) the file is left as a plain copy.
+        """
+        path = Path(path)
+        sha = self.digest(path)
+        if not (self.link if link is None else link):
+            return sha, False
+        blob = self.path(sha)
+        with self._lock:
+            try:
+                if not blob.exists():
+                    blob.parent.mkdir(parents=True, exist_ok=True)
+                    os.link(path, blob)
+                    return sha, False
+                if blob.stat().st_size != path.stat().st_size:
+                    # The stored copy was damaged on disk; this verified file replaces it
+                    tmp = blob.with_name(sha + '.tmp')
+                    os.link(path, tmp)
+                    os.replace(tmp, blob)
+                    return sha, False
+                if os.path.samefile(blob, path):
+                    return sha, False
+                tmp = path.with_name(path.name + '.link')
+                os.link(blob, tmp)
+                os.replace(tmp, path)
+                return sha, True
+            except OSError:
+                return sha, False
+
+    def gc(self):
+        """Delete blobs that no ad folder links to any more. Returns (blobs, bytes) freed."""
+        removed = freed = 0
+        with self._lock:
+            for blob in self.root.glob('*/*'):
+                st = blob.stat()
+                if st.st_nlink <= 1:
+                    blob.unlink()
+                    removed += 1
+                    freed += st.st_size
+        return removed, freed
+
+
+blob_store = BlobStore(BLOB_DIR, link=BLOB_STORE)
+
+
+def dedupe_archive(log=print):
+    """Move the media of every archive folder into the blob store.
+
+    For archives made before the store existed: each creative is hashed,
+    identical files across folders become links to one blob, and the
+    hashes are written into ad_meta.json. Screenshots are left alone,
+    since re-scrapes overwrite them in place. Returns (files, duplicates,
+    bytes saved).
+    """
+    files = duplicates = saved = 0
+    for folder in sorted(SAVE_DIR.iterdir()):
+        if not folder.is_dir() or folder.name.startswith('.'):
+            continue
+        hashes = {}
+        for f in sorted(folder.iterdir()):
+            if f.is_file() and f.suffix in MEDIA_SUFFIXES and f.name != 'screenshot.png':
+                size = f.stat().st_size
+                try:
+                    hashes[f.name], dup = blob_store.add(f, link=True)
+                except OSError as e:
+                    log(f'{folder.name}/{f.name}: {e}')
+                    continue
+                files += 1
+                if dup:
+                    duplicates += 1
+                    saved += size
+        meta_file = folder / 'ad_meta.json'
+        try:
+            meta = json.loads(meta_file.read_text())
+        except (OSError, ValueError):
+            continue
+        media = [m for m in meta.get('media', []) if m.get('filename') in hashes]
+        if any(m.get('sha256') != hashes[m['filename']] for m in media):
+            for m in media:
+                m['sha256'] = hashes[m['filename']]
+            with open(meta_file, 'w') as f:
+                json.dump(meta, f, indent=2)
+            archive_index.upsert_folder(folder)
+    blob_store.gc()
+    return files, duplicates, saved
+
+
+# ─────────────────────────────────────────────
+# ARCHIVE INDEX
+# ─────────────────────────────────────────────
+# A SQLite catalog of the archive folders so the UI never has to walk
+# SAVE_DIR. Jobs and note saves update it as they write; reconcile() picks
+# up folders that were added, edited or deleted by hand.
+
+class ArchiveIndex:
+    SORTS = {'archived_at': 'archived_at', 'started': "COALESCE(started_on, '')", 'page_name': 'page_name COLLATE NOCASE'}
+    COLUMNS = ('folder', 'ad_id', 'page_name', 'status', 'started', 'started_on', 'platforms', 'archived_at',
+               'media_count', 'thumb', 'media', 'meta', 'meta_mtime', 'notes_mtime', 'seq', 'updated_at')
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS ads (
+                folder       TEXT PRIMARY KEY,
+                ad_id        TEXT,
+                page_name    TEXT,
+                status       TEXT,
+                started      TEXT,
+                platforms    TEXT,
+                archived_at  TEXT,
+                media_count  INTEGER,
+                thumb        TEXT,
+                media        TEXT,
+                meta         TEXT,
+                meta_mtime   REAL,
+                notes_mtime  REAL
+            );
+            CREATE TABLE IF NOT EXISTS removed (
+                folder      TEXT PRIMARY KEY,
+                seq         INTEGER,
+                removed_at  REAL
+            );
+            CREATE TABLE IF NOT EXISTS checks (
+                ad_id       TEXT PRIMARY KEY,
+                checked_at  REAL,
+                failures    INTEGER DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS phashes (
+                folder      TEXT,
+                filename    TEXT,
+                hash        INTEGER,
+                PRIMARY KEY (folder, filename)
+            );
+        """)
+        # Columns added after the first version of the index
+        cols = {r['name'] for r in self._db.execute('PRAGMA table_info(ads)')}
+        for name, decl in [('started_on', 'TEXT'), ('seq', 'INTEGER DEFAULT 0'), ('updated_at', 'REAL')]:
+            if name not in cols:
+                self._db.execute(f'ALTER TABLE ads ADD COLUMN {name} {decl}')
+        self._db.executescript("""
+            CREATE INDEX IF NOT EXISTS ads_archived_at ON ads(archived_at DESC, folder);
+            CREATE INDEX IF NOT EXISTS ads_started_on ON ads(started_on, folder);
+            CREATE INDEX IF NOT EXISTS ads_page_name ON ads(page_name COLLATE NOCASE, folder);
+            CREATE INDEX IF NOT EXISTS ads_ad_id ON ads(ad_id);
+            CREATE INDEX IF NOT EXISTS ads_seq ON ads(seq);
+        """)
+        # Full-text search over ad copy, extra text and notes (needs FTS5,
+        # which ships with the SQLite in current Python builds)
+        try:
+            self._db.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS ads_fts USING fts5(
+                    folder UNINDEXED, page_name, ad_text, extra_text, notes,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )""")
+            # Default ranking: page name counts most, extra text least
+            self._db.execute("INSERT INTO ads_fts(ads_fts, rank) VALUES('rank', 'bm25(0, 4.0, 1.0, 0.5, 1.0)')")
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        if self.fts and not self._db.execute('SELECT 1 FROM ads_fts LIMIT 1').fetchone():
+            self._backfill_fts()  # index created before search existed
+        self._db.commit()
+        # Every write bumps seq; clients use it to ask for changes since a point
+        self._seq = self._db.execute(
+            'SELECT MAX(s) FROM (SELECT MAX(seq) AS s FROM ads UNION ALL SELECT MAX(seq) FROM removed)'
+        ).fetchone()[0] or 0
+
+    def upsert_folder(self, folder_path):
+        """(Re)index one archive folder from what is on disk."""
+        folder_path = Path(folder_path)
+        meta_file = folder_path / 'ad_meta.json'
+        notes_file = folder_path / 'notes.txt'
+        meta = {}
+        if meta_file.exists():
+            try:
+                with open(meta_file) as f:
+                    meta = json.load(f)
+            except Exception:
+                pass
+
+        files = {f.name for f in folder_path.iterdir() if f.is_file()}
+        media = [m for m in meta.get('media', []) if m.get('filename') in files]
+        # Only files ad_meta.json lists count; folders from before it listed
+        # its media go by what is on disk
+        listed = [m['filename'] for m in media] if 'media' in meta else \
+            sorted(n for n in files if Path(n).suffix in MEDIA_SUFFIXES)
+        thumb = None
+        for ext in ['.jpg', '.png', '.webp']:
+            imgs = [n for n in listed if n.endswith(ext)]
+            if imgs:
+                thumb = imgs[0]; break
+        if not thumb and 'screenshot.png' in files:
+            thumb = 'screenshot.png'
+        media_count = len(listed)
+        # Perceptual hashes go in as signed 64-bit, the widest SQLite integer
+        phashes = [(folder_path.name, m['filename'], _signed64(int(m['dhash'], 16)))
+                   for m in media if m.get('dhash')]
+        archived_at = meta.get('archived_at') or datetime.fromtimestamp(folder_path.stat().st_mtime).isoformat()
+
+        row = {
+            'folder': folder_path.name,
+            'ad_id': meta.get('ad_id', ''),
+            'page_name': meta.get('page_name', folder_path.name),
+            'status': meta.get('status', ''),
+            'started': meta.get('started', ''),
+            'started_on': _parse_started(meta.get('started')),
+            'platforms': json.dumps(meta.get('platforms', [])),
+            'archived_at': archived_at,
+            'media_count': media_count,
+            'thumb': thumb,
+            'media': json.dumps(media),
+            'meta': json.dumps(meta),
+            'meta_mtime': meta_file.stat().st_mtime if meta_file.exists() else None,
+            'notes_mtime': notes_file.stat().st_mtime if notes_file.exists() else None,
+            'updated_at': time.time(),
+        }
+        with self._lock:
+            self._seq += 1
+            row['seq'] = self._seq
+            self._db.execute(
+                f'INSERT OR REPLACE INTO ads ({", ".join(self.COLUMNS)}) '
+                f'VALUES ({", ".join(":" + c for c in self.COLUMNS)})', row)
+            self._db.execute('DELETE FROM removed WHERE folder = ?', (row['folder'],))
+            self._db.execute('DELETE FROM phashes WHERE folder = ?', (row['folder'],))
+            self._db.executemany('INSERT INTO phashes VALUES (?, ?, ?)', phashes)
+            if self.fts:
+                self._db.execute('DELETE FROM ads_fts WHERE folder = ?', (row['folder'],))
+                self._db.execute('INSERT INTO ads_fts VALUES (?, ?, ?, ?, ?)', (
+                    row['folder'], row['page_name'], meta.get('ad_text', ''), meta.get('extra_text', ''),
+                    notes_file.read_text(encoding='utf-8') if notes_file.exists() else ''))
+            self._db.commit()
+
+    def remove(self, folder):
+        with self._lock:
+            self._seq += 1
+            self._db.execute('DELETE FROM ads WHERE folder = ?', (folder,))
+            self._db.execute('DELETE FROM phashes WHERE folder = ?', (folder,))
+            self._db.execute('INSERT OR REPLACE INTO removed VALUES (?, ?, ?)', (folder, self._seq, time.time()))
+            if self.fts:
+                self._db.execute('DELETE FROM ads_fts WHERE folder = ?', (folder,))
+            self._db.commit()
+
+    def version(self):
+        """(seq, last change time) — changes whenever anything in the index does."""
+        with self._lock:
+            last = self._db.execute(
+                'SELECT MAX(t) FROM (SELECT MAX(updated_at) AS t FROM ads UNION ALL SELECT MAX(removed_at) FROM removed)'
+            ).fetchone()[0]
+            return self._seq, last
+
+    @staticmethod
+    def _summary(r):
+        return {
+            'folder': r['folder'],
+            'page_name': r['page_name'],
+            'ad_id': r['ad_id'],
+            'status': r['status'],
+            'started': r['started'],
+            'platforms': json.loads(r['platforms'] or '[]'),
+            'saved': (r['archived_at'] or '')[:10],
+            'archived_at': r['archived_at'],
+            'media_count': r['media_count'],
+            'thumb': r['thumb'],
+            'thumb_url': thumb_url(r['folder'], r['thumb']) if r['thumb'] else None,
+        }
+
+    def list(self, limit=None, cursor=None, sort='archived_at', order=None,
+             status=None, platform=None, advertiser=None):
+        """One page of ads, keyset-paginated.
+
+        cursor is the next_cursor of the previous page; limit=None returns
+        every match. Returns {'ads', 'next_cursor', 'total'}.
+        """
+        if limit is not None and limit < 1:
+            raise ValueError('limit must be at least 1')
+        if sort not in self.SORTS:
+            raise ValueError(f'sort must be one of {", ".join(self.SORTS)}')
+        order = order or ('asc' if sort == 'page_name' else 'desc')
+        if order not in ('asc', 'desc'):
+            raise ValueError('order must be asc or desc')
+        key = self.SORTS[sort]
+
+        where, args = [], []
+        if status:
+            where.append('status = ?'); args.append(status)
+        if platform:
+            where.append('platforms LIKE ?'); args.append(f'%"{platform}"%')
+        if advertiser:
+            where.append('page_name LIKE ?'); args.append(f'%{advertiser}%')
+        filters = list(where), list(args)
+
+        if cursor:
+            try:
+                last_key, last_folder = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            except (ValueError, TypeError):
+                raise ValueError('bad cursor')
+            where.append(f'({key}, folder) {"<" if order == "desc" else ">"} (?, ?)')
+            args += [last_key, last_folder]
+
+        sql = f'SELECT *, {key} AS sort_key FROM ads'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += f' ORDER BY {key} {order}, folder {order}'
+        if limit is not None:
+            sql += f' LIMIT {int(limit) + 1}'
+
+        count_sql = 'SELECT COUNT(*) FROM ads' + (' WHERE ' + ' AND '.join(filters[0]) if filters[0] else '')
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+            total = self._db.execute(count_sql, filters[1]).fetchone()[0]
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = base64.urlsafe_b64encode(json.dumps([rows[-1]['sort_key'], rows[-1]['folder']]).encode()).decode()
+        return {'ads': [self._summary(r) for r in rows], 'next_cursor': next_cursor, 'total': total}
+
+    def changes(self, since, limit=500):
+        """Ads changed and folders removed after seq `since`.
+
+        Returns None if there are more than `limit` changes — the client
+        should reload the list instead of applying deltas.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT * FROM ads WHERE seq > ? ORDER BY seq LIMIT ?',
+                                    (since, limit + 1)).fetchall()
+            removed = [r['folder'] for r in
+                       self._db.execute('SELECT folder FROM removed WHERE seq > ?', (since,))]
+            total = self._db.execute('SELECT COUNT(*) FROM ads').fetchone()[0]
+        if len(rows) > limit:
+            return None
+        return {'changed': [self._summary(r) for r in rows], 'removed': removed, 'total': total}
+
+    def _backfill_fts(self):
+        for r in self._db.execute('SELECT folder, page_name, meta FROM ads').fetchall():
+            meta = json.loads(r['meta'] or '{}')
+            notes_file = SAVE_DIR / r['folder'] / 'notes.txt'
+            self._db.execute('INSERT INTO ads_fts VALUES (?, ?, ?, ?, ?)', (
+                r['folder'], r['page_name'], meta.get('ad_text', ''), meta.get('extra_text', ''),
+                notes_file.read_text(encoding='utf-8') if notes_file.exists() else ''))
+
+    def search(self, query, limit=20, offset=0):
+        """Ranked full-text search. Returns {'results', 'total'}.
+
+        Supports FTS5 query syntax: "exact phrase", prefix*, AND/OR/NOT and
+        column filters like notes:hook. Input that isn't valid syntax is
+        searched as plain words. Snippets are HTML-escaped with the matches
+        wrapped in <mark>.
+        """
+        if not self.fts:
+            return self._search_like(query, limit, offset)
+
+        # Rank and cut to one page inside FTS first, then join just that page
+        sql = """
+            SELECT a.folder, a.page_name, a.ad_id, a.status, a.archived_at, a.thumb, f.snip, f.rank
+            FROM (
+                SELECT folder, snippet(ads_fts, -1, char(2), char(3), '…', 16) AS snip, rank
+                FROM ads_fts WHERE ads_fts MATCH ?
+                ORDER BY rank LIMIT ? OFFSET ?
+            ) f JOIN ads a ON a.folder = f.folder
+            ORDER BY f.rank"""
+        count_sql = 'SELECT COUNT(*) FROM ads_fts WHERE ads_fts MATCH ?'
+        with self._lock:
+            try:
+                rows = self._db.execute(sql, (query, limit, offset)).fetchall()
+                total = self._db.execute(count_sql, (query,)).fetchone()[0]
+            except sqlite3.OperationalError:
+                # Not valid FTS5 syntax — search for the words as typed
+                words = re.findall(r'\w+', query)
+                if not words:
+                    return {'results': [], 'total': 0}
+                query = ' '.join(f'"{w}"' for w in words)
+                rows = self._db.execute(sql, (query, limit, offset)).fetchall()
+                total = self._db.execute(count_sql, (query,)).fetchone()[0]
+
+        results = []
+        for r in rows:
+            snippet = html.escape(r['snip'] or '').replace('\x02', '<mark>').replace('\x03', '</mark>')
+            results.append({
+                'folder': r['folder'], 'page_name': r['page_name'], 'ad_id': r['ad_id'],
+                'status': r['status'], 'saved': (r['archived_at'] or '')[:10], 'thumb': r['thumb'],
+                'thumb_url': thumb_url(r['folder'], r['thumb']) if r['thumb'] else None, 'snippet': snippet, 'score': round(-r['rank'], 3),
+            })
+        return {'results': results, 'total': total}
+
+    def _search_like(self, query, limit, offset):
+        """Substring search for SQLite builds without FTS5 — slow, unranked."""
+        like = f'%{query}%'
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT folder, page_name, ad_id, status, archived_at, thumb FROM ads '
+                'WHERE page_name LIKE ? OR meta LIKE ? ORDER BY archived_at DESC LIMIT ? OFFSET ?',
+                (like, like, limit, offset)).fetchall()
+        return {'results': [{
+            'folder': r['folder'], 'page_name': r['page_name'], 'ad_id': r['ad_id'], 'status': r['status'],
+            'saved': (r['archived_at'] or '')[:10], 'thumb': r['thumb'],
+            'thumb_url': thumb_url(r['folder'], r['thumb']) if r['thumb'] else None, 'snippet': '', 'score': 0,
+        } for r in rows], 'total': None}
+
+    def has_ad(self, ad_id):
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM ads WHERE ad_id = ? LIMIT 1', (ad_id,)).fetchone() is not None
+
+    def record_check(self, ad_id, ok):
+        """Note that ad_id was just scraped; failures count up until a success."""
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO checks (ad_id, checked_at, failures) VALUES (?, ?, ?) '
+                'ON CONFLICT(ad_id) DO UPDATE SET checked_at = excluded.checked_at, '
+                'failures = CASE WHEN ? THEN 0 ELSE failures + 1 END',
+                (ad_id, time.time(), 0 if ok else 1, ok))
+            self._db.commit()
+
+    def check_candidates(self):
+        """(ad_id, status, archived_at, checked_at, failures) for the newest folder of every ad."""
+        with self._lock:
+            return [tuple(r) for r in self._db.execute('''
+                SELECT a.ad_id, a.status, MAX(a.archived_at), c.checked_at, COALESCE(c.failures, 0)
+                FROM ads a LEFT JOIN checks c ON c.ad_id = a.ad_id
+                WHERE a.ad_id != '' AND a.meta_mtime IS NOT NULL
+                GROUP BY a.ad_id''')]
+
+    def phashes(self, folders=None):
+        """(folder, filename, hash) for every hashed creative, or only those in folders."""
+        with self._lock:
+            if folders is None:
+                rows = self._db.execute('SELECT folder, filename, hash FROM phashes').fetchall()
+            else:
+                rows = []
+                folders = list(folders)
+                for i in range(0, len(folders), 500):
+                    chunk = folders[i:i + 500]
+                    rows += self._db.execute(
+                        f'SELECT folder, filename, hash FROM phashes WHERE folder IN ({", ".join("?" * len(chunk))})',
+                        chunk).fetchall()
+        return [(r[0], r[1], r[2] & 0xFFFFFFFFFFFFFFFF) for r in rows]
+
+    def summaries(self, folders):
+        """List-view summaries of the given folders, by folder."""
+        folders = list(folders)
+        out = {}
+        with self._lock:
+            for i in range(0, len(folders), 500):
+                chunk = folders[i:i + 500]
+                for r in self._db.execute(
+                        f'SELECT * FROM ads WHERE folder IN ({", ".join("?" * len(chunk))})', chunk):
+                    out[r['folder']] = self._summary(r)
+        return out
+
+    def latest(self, ad_id):
+        """Folder name of the most recent archive of ad_id, or None."""
+        with self._lock:
+            r = self._db.execute('SELECT folder FROM ads WHERE ad_id = ? AND meta_mtime IS NOT NULL '
+                                 'ORDER BY archived_at DESC LIMIT 1', (ad_id,)).fetchone()
+        return r['folder'] if r else None
+
+    def get(self, folder):
+        with self._lock:
+            r = self._db.execute('SELECT * FROM ads WHERE folder = ?', (folder,)).fetchone()
+        if r is None or r['meta_mtime'] is None:
+            return None
+        meta = json.loads(r['meta'])
+        meta['media'] = json.loads(r['media'])
+        return meta
+
+    def reconcile(self, rebuild=False):
+        """Bring the index in line with SAVE_DIR. Returns (updated, removed)."""
+        if rebuild:
+            with self._lock:
+                self._db.execute('DELETE FROM ads')
+                self._db.execute('DELETE FROM phashes')
+                if self.fts:
+                    self._db.execute('DELETE FROM ads_fts')
+                self._db.commit()
+        with self._lock:
+            known = {r['folder']: (r['meta_mtime'], r['notes_mtime'])
+                     for r in self._db.execute('SELECT folder, meta_mtime, notes_mtime FROM ads')}
+
+        updated = 0
+        on_disk = set()
+        for folder in SAVE_DIR.iterdir():
+            if not folder.is_dir() or folder.name.startswith('.'):
+                continue  # .blobs is the media store, not an ad
+            on_disk.add(folder.name)
+            meta_file, notes_file = folder / 'ad_meta.json', folder / 'notes.txt'
+            current = (meta_file.stat().st_mtime if meta_file.exists() else None,
+                       notes_file.stat().st_mtime if notes_file.exists() else None)
+            if known.get(folder.name) != current:
+                try:
+                    self.upsert_folder(folder)
+                    updated += 1
+                except OSError:
+                    pass
+
+        removed = set(known) - on_disk
+        for folder in removed:
+            self.remove(folder)
+        return updated, len(removed)
+
+
+def _signed64(n):
+    return n - (1 << 64) if n >= 1 << 63 else n
+
+
+def _parse_started(started):
+    """'Jan 5, 2024' / 'January 5, 2024' -> '2024-01-05', for sorting."""
+    for fmt in ('%b %d, %Y', '%B %d, %Y'):
+        try:
+            return datetime.strptime(started or '', fmt).date().isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+archive_index = ArchiveIndex(INDEX_DB)
+
+
+# ─────────────────────────────────────────────
+# THUMBNAILS
+# ─────────────────────────────────────────────
+# The UI shows small copies of images and video poster frames instead of
+# the full-size files. They live in <ad folder>/thumbs/ and are made with
+# Pillow if it is installed, otherwise ffmpeg, otherwise not at all (the
+# /thumb route then falls back to the original).
+
+def _thumb_candidates(folder_path, filename):
+    stem = Path(filename).stem
+    return [folder_path / 'thumbs' / f'{stem}.webp', folder_path / 'thumbs' / f'{stem}.jpg']
+
+
+def thumb_url(folder, filename):
+    """The /thumb URL of a media file, versioned by the file's mtime so it can be cached for good."""
+    try:
+        version = int((SAVE_DIR / folder / filename).stat().st_mtime * 1000)
+    except OSError:
+        version = 0
+    return f'/thumb/{urllib.parse.quote(folder)}/{urllib.parse.quote(filename)}?v={version}'
+
+
+def find_thumbnail(folder_path, filename):
+    """The thumbnail of a media file, or None if it has none or the file has changed since."""
+    try:
+        changed = (folder_path / filename).stat().st_mtime
+    except OSError:
+        changed = 0
+    for p in _thumb_candidates(folder_path, filename):
+        try:
+            if p.stat().st_mtime >= changed:
+                return p
+        except OSError:
+            pass
+    return None
+
+
+def _thumb_with_pillow(src, dest_dir, stem):
+    from PIL import Image
+    with Image.open(src) as im:
+        im.thumbnail((THUMB_SIZE, THUMB_SIZE))
+        if im.mode not in ('RGB', 'L'):
+            im = im.convert('RGB')
+        for fmt, ext in (('WEBP', '.webp'), ('JPEG', '.jpg')):
+            dest = dest_dir / f'{stem}{ext}'
+            tmp = dest.with_name(dest.name + '.part')
+            try:
+                im.save(tmp, fmt, quality=80)
+            except (KeyError, OSError):
+                tmp.unlink(missing_ok=True)
+                continue  # this Pillow build has no WebP support
+            os.replace(tmp, dest)
+            return dest
+    return None
+
+
+def _thumb_with_ffmpeg(src, dest_dir, stem, video):
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+    import subprocess
+    dest = dest_dir / f'{stem}.jpg'
+    tmp = dest_dir / f'{stem}.part.jpg'
+    scale = f"scale='min({THUMB_SIZE},iw)':-2" if video else \
+        f"scale='if(gt(iw,ih),min({THUMB_SIZE},iw),-2)':'if(gt(iw,ih),-2,min({THUMB_SIZE},ih))'"
+    # Poster frame 1s in; very short clips don't have one, so try frame 0 too
+    for seek in ([['-ss', '1'], []] if video else [[]]):
+        cmd = [ffmpeg, '-y', '-loglevel', 'error', *seek, '-i', str(src), '-frames:v', '1', '-vf', scale, str(tmp)]
+        try:
+            subprocess.run(cmd, timeout=30, check=True, capture_output=True)
+        except (subprocess.SubprocessError, OSError):
+            continue
+        if tmp.exists() and tmp.stat().st_size:
+            os.replace(tmp, dest)
+            return dest
+    tmp.unlink(missing_ok=True)
+    return None
+
+
+def make_thumbnail(folder_path, filename):
+    """Create the thumbnail for one media file. Returns its path or None."""
+    src = folder_path / filename
+    if not src.exists():
+        return None
+    existing = find_thumbnail(folder_path, filename)
+    if existing:
+        return existing
+    for stale in _thumb_candidates(folder_path, filename):
+        stale.unlink(missing_ok=True)  # the file was rewritten (a new screenshot, a repair)
+    dest_dir = folder_path / 'thumbs'
+    dest_dir.mkdir(exist_ok=True)
+    stem = Path(filename).stem
+    video = src.suffix in ('.mp4', '.webm')
+    if not video:
+        try:
+            return _thumb_with_pillow(src, dest_dir, stem)
+        except ImportError:
+            pass
+        except Exception:
+            return None  # not an image Pillow can read
+    return _thumb_with_ffmpeg(src, dest_dir, stem, video)
+
+
+def make_thumbnails(folder_path):
+    """Create any missing or out-of-date thumbnails in an archive folder. Returns how many were made."""
+    made = 0
+    for f in sorted(folder_path.iterdir()):
+        if f.is_file() and f.suffix in MEDIA_SUFFIXES and not find_thumbnail(folder_path, f.name):
+            if make_thumbnail(folder_path, f.name):
+                made += 1
+    return made
+
+
+def backfill_thumbnails():
+    """Background pass over folders archived before thumbnails existed."""
+    total = 0
+    for folder in sorted(SAVE_DIR.iterdir()):
+        if folder.is_dir() and not folder.name.startswith('.'):
+            try:
+                total += make_thumbnails(folder)
+            except OSError:
+                pass
+    return total
+
+
+# ─────────────────────────────────────────────
+# SIMILAR CREATIVES
+# ─────────────────────────────────────────────
+# Every saved image and video poster gets a 64-bit difference hash (dHash)
+# that survives resizing and recompression, stored as `dhash` on its
+# ad_meta.json media entry and in the index's phashes table. A multi-index
+# hash table over them answers "which archived ads use a creative within N
+# bits of this one" without comparing against every image in the archive.
+
+def _gray_pixels(path, width, height):
+    """width*height grayscale bytes of an image, via Pillow or else ffmpeg; None if unreadable."""
+    try:
+        from PIL import Image
+        with Image.open(path) as im:
+            return im.convert('L').resize((width, height), Image.LANCZOS).tobytes()
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+    import subprocess
+    cmd = [ffmpeg, '-loglevel', 'error', '-i', str(path), '-frames:v', '1',
+           '-vf', f'scale={width}:{height},format=gray', '-f', 'rawvideo', '-']
+    try:
+        out = subprocess.run(cmd, timeout=30, check=True, capture_output=True).stdout
+    except (subprocess.SubprocessError, OSError):
+        return None
+    return out if len(out) == width * height else None
+
+
+def dhash(path):
+    """64-bit difference hash of an image: is each pixel brighter than its right neighbour, on a 9x8 grid."""
+    px = _gray_pixels(path, 9, 8)
+    if px is None:
+        return None
+    h = 0
+    for row in range(8):
+        for col in range(8):
+            h = h << 1 | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return h
+
+
+def hash_media(folder_path, media):
+    """Add a `dhash` to each image and video entry of media that lacks one. Returns how many were added.
+
+    Videos are hashed from their poster-frame thumbnail, images from their
+    thumbnail if there is one (quicker to decode) or else the file itself.
+    Flat frames hash to 0 and are left out, since they match each other.
+    """
+    added = 0
+    for m in media:
+        if m.get('dhash') or m.get('type') not in ('image', 'video') or m.get('filename') == 'screenshot.png':
+            continue
+        src = find_thumbnail(folder_path, m['filename'])
+        if src is None and m['type'] == 'image':
+            src = folder_path / m['filename']
+        h = dhash(src) if src is not None and src.exists() else None
+        if h:
+            m['dhash'] = f'{h:016x}'
+            added += 1
+    return added
+
+
+def backfill_phashes():
+    """Background pass over folders archived before perceptual hashes existed."""
+    total = 0
+    for folder in sorted(SAVE_DIR.iterdir()):
+        meta_file = folder / 'ad_meta.json'
+        if folder.name.startswith('.') or not meta_file.exists():
+            continue
+        try:
+            meta = json.loads(meta_file.read_text())
+            added = hash_media(folder, meta.get('media', []))
+            if added:
+                with open(meta_file, 'w') as f:
+                    json.dump(meta, f, indent=2)
+                archive_index.upsert_folder(folder)
+                total += added
+        except (OSError, ValueError):
+            pass
+    return total
+
+
+class HammingIndex:
+    """Multi-index hashing over 64-bit hashes, for Hamming-radius searches.
+
+    Each hash is split into `chunks` bit ranges and filed under every
+    chunk's value. Two hashes within radius r < chunks share at least one
+    chunk exactly (pigeonhole), so a search only compares the few hashes in
+    the query's own buckets; up to 2 * chunks - 1 it also probes every
+    one-bit variant of each chunk. Larger radii fall back to a full scan.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = max(1, min(chunks, 32))
+        step = 64 / self.chunks
+        self._spans = [(round(i * step), round((i + 1) * step)) for i in range(self.chunks)]
+        self._buckets = [{} for _ in self._spans]  # chunk value -> set of hashes
+        self._refs = {}                             # hash -> set of (folder, filename)
+
+    def _parts(self, h):
+        return [(h >> lo) & ((1 << (hi - lo)) - 1) for lo, hi in self._spans]
+
+    def add(self, h, ref):
+        refs = self._refs.get(h)
+        if refs is None:
+            refs = self._refs[h] = set()
+            for bucket, part in zip(self._buckets, self._parts(h)):
+                bucket.setdefault(part, set()).add(h)
+        refs.add(ref)
+
+    def discard(self, h, ref):
+        refs = self._refs.get(h)
+        if refs is None:
+            return
+        refs.discard(ref)
+        if not refs:
+            del self._refs[h]
+            for bucket, part in zip(self._buckets, self._parts(h)):
+                bucket[part].discard(h)
+                if not bucket[part]:
+                    del bucket[part]
+
+    def search(self, h, radius):
+        """[(distance, ref)] for every ref within radius of h."""
+        flips = radius // self.chunks
+        if flips > 1:
+            candidates = self._refs.keys()
+        else:
+            candidates = set()
+            for (lo, hi), bucket, part in zip(self._spans, self._buckets, self._parts(h)):
+                probes = [part] + ([part ^ (1 << b) for b in range(hi - lo)] if flips else [])
+                for probe in probes:
+                    candidates.update(bucket.get(probe, ()))
+        found = []
+        for c in candidates:
+            d = bin(c ^ h).count('1')
+            if d <= radius:
+                found += [(d, ref) for ref in self._refs[c]]
+        return found
+
+
+class SimilarIndex:
+    """In-memory HammingIndex of the archive's perceptual hashes, kept in step with the archive index.
+
+    It is built on first use and then applies the index's changes since
+    the seq it last saw, the same deltas the UI's archive list uses.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._lock = threading.Lock()
+        self._tree = None
+        self._folders = {}  # folder -> {filename: hash}
+        self._seq = 0
+
+    def _load(self):
+        # One more chunk than the default distance keeps default searches to exact bucket hits
+        self._tree, self._folders = HammingIndex(SIMILAR_DISTANCE + 1), {}
+        self._add(self.index.phashes())
+
+    def _add(self, rows):
+        for folder, filename, h in rows:
+            self._folders.setdefault(folder, {})[filename] = h
+            self._tree.add(h, (folder, filename))
+
+    def sync(self):
+        with self._lock:
+            seq = self.index.version()[0]
+            if self._tree is not None and seq == self._seq:
+                return
+            changes = self.index.changes(self._seq, limit=5000) if self._tree is not None else None
+            if changes is None:
+                self._load()
+            else:
+                touched = {c['folder'] for c in changes['changed']} | set(changes['removed'])
+                for folder in touched:
+                    for filename, h in self._folders.pop(folder, {}).items():
+                        self._tree.discard(h, (folder, filename))
+                self._add(self.index.phashes(touched))
+            self._seq = seq
+
+    def similar(self, folder, distance=None):
+        """Other archived ads with a creative within `distance` bits of one of folder's, closest first.
+
+        Returns [{'folder', 'distance', 'matches': [{'filename', 'match', 'distance'}]}].
+        """
+        distance = SIMILAR_DISTANCE if distance is None else distance
+        self.sync()
+        with self._lock:
+            hits = {}
+            for filename, h in self._folders.get(folder, {}).items():
+                for d, (other, match) in self._tree.search(h, distance):
+                    if other != folder:
+                        hits.setdefault(other, []).append({'filename': filename, 'match': match, 'distance': d})
+        results = [{'folder': other, 'distance': min(m['distance'] for m in matches),
+                    'matches': sorted(matches, key=lambda m: m['distance'])}
+                   for other, matches in hits.items()]
+        return sorted(results, key=lambda r: (r['distance'], r['folder']))
+
+    def size(self):
+        with self._lock:
+            return sum(len(files) for files in self._folders.values())
+
+
+similar_index = SimilarIndex(archive_index)
+
+
+# ─────────────────────────────────────────────
+# BATCHES & CRAWLS
+# ─────────────────────────────────────────────
+# A batch is a tracked group of ordinary scrape jobs. Its ads are fed into
+# the scheduler a few at a time (at lower priority than single ads pasted
+# into the UI), so a batch of hundreds never fills the queue. A crawl is a
+# batch whose ads are discovered by scrolling an Ad Library search or
+# advertiser page; ads start archiving while the crawl is still scrolling.
+
+batches = {}  # batch_id -> batch dict
+BATCH_RATE_MIN_SECONDS = 60  # ads_per_hour and the ETA are only reported after this long
+batch_cond = threading.Condition()
+_job_seq = itertools.count()
+
+CRAWL_IDS_JS = """() => {
+    const ids = new Set();
+    for (const m of (document.body.innerText || '').matchAll(/Library ID:?\\s*(\\d{8,})/g)) ids.add(m[1]);
+    document.querySelectorAll('a[href*="id="]').forEach(a => {
+        const m = a.href.match(/[?&]id=(\\d{8,})/);
+        if (m && a.href.includes('/ads/library')) ids.add(m[1]);
+    });
+    return Array.from(ids);
+}"""
+
+
+def normalize_ad_input(entry):
+    """Ad Library URL or bare ad ID -> (ad_id, url), or (None, None)."""
+    entry = str(entry).strip()
+    if entry.isdigit():
+        return entry, f'https://www.facebook.com/ads/library/?id={entry}'
+    ad_id = extract_ad_id(entry)
+    return (ad_id, entry) if ad_id else (None, None)
+
+
+def new_job(url, priority=0, batch_id=None, webhook=None, force=False):
+    """Create a job and queue it. Returns the job_id, or None if the queue is full.
+
+    Unless force is set, an ad archived within RESULT_TTL is not queued:
+    the job finishes at once with the archived result.
+    """
+    job_id = hashlib.md5(f"{url}{time.time()}{next(_job_seq)}".encode()).hexdigest()[:12]
+    job_status[job_id] = {'status': 'queued', 'progress': 0, 'log': [], 'result': None, 'url': url,
+                          'queued_at': time.time(), 'batch_id': batch_id, 'webhook': webhook}
+    cached = None if force else cached_result(url)
+    if cached:
+        status = job_status[job_id]
+        status.update(status='done', progress=100, result=cached,
+                      started_at=status['queued_at'], finished_at=time.time())
+        status['log'] += [
+            {'msg': f"Already archived {cached['age_seconds'] // 60} min ago in {cached['folder']}", 'type': 'ok'},
+            {'msg': 'Returned from the archive — shift-click Archive (or send "force": true) to scrape again',
+             'type': 'info'},
+        ]
+        metrics.inc('advault_jobs_total', outcome='cached', failure='none')
+        finish_job(job_id, url)
+        return job_id
+    if not scheduler.submit(job_id, run_scrape_job, url, priority=priority):
+        del job_status[job_id]
+        return None
+    return job_id
+
+
+def new_repair_job(folder):
+    """Queue a repair of one archive folder. Returns the job_id, or None if the queue is full."""
+    meta = archive_index.get(folder) or {}
+    job_id = hashlib.md5(f"repair{folder}{time.time()}{next(_job_seq)}".encode()).hexdigest()[:12]
+    job_status[job_id] = {'status': 'queued', 'progress': 0, 'log': [], 'result': None, 'url': None,
+                          'kind': 'repair', 'folder': folder, 'queued_at': time.time()}
+    if not scheduler.submit(job_id, run_repair_job, folder, meta.get('ad_id') or folder):
+        del job_status[job_id]
+        return None
+    return job_id
+
+
+def new_crawl_job(batch_id, url, max_ads):
+    """Queue the crawl that fills a crawl batch. Returns the job_id, or None if the queue is full."""
+    job_id = hashlib.md5(f"crawl{url}{time.time()}{next(_job_seq)}".encode()).hexdigest()[:12]
+    job_status[job_id] = {'status': 'queued', 'progress': 0, 'log': [], 'result': None, 'url': None,
+                          'kind': 'crawl', 'crawl_of': batch_id, 'queued_at': time.time()}
+    if not scheduler.submit(job_id, run_crawl_job, batch_id, url, max_ads):
+        del job_status[job_id]
+        return None
+    with batch_cond:
+        batches[batch_id]['crawl_job'] = job_id
+    return job_id
+
+
+def cancel_job(job_id):
+    """Stop a queued or running job. Returns its status afterwards, or None if unknown.
+
+    A queued job is finished on the spot. A running one is interrupted
+    wherever it is waiting and reports 'cancelled' once it has closed its
+    page and kept what it had; until then its status stays 'running'.
+    """
+    status = job_status.get(job_id)
+    if status is None:
+        return None
+    if status['status'] in FINAL_STATES or status.get('stop_reason'):
+        return status['status']
+    status['stop_reason'] = 'cancelled'
+    if scheduler.cancel(job_id) == 'queued':
+        status.update(status='cancelled', error='Cancelled', failure='cancelled', finished_at=time.time())
+        status['log'].append({'msg': 'Cancelled before it started', 'type': 'err'})
+        metrics.inc('advault_jobs_total', outcome='cancelled', failure='cancelled')
+        if status.get('crawl_of'):
+            _set_crawl(status['crawl_of'], 'cancelled', 'Cancelled before it started')
+        finish_job(job_id, status['url'])
+    # Otherwise the job is running, or about to start and will see stop_reason
+    notify_job_change()
+    return status['status']
+
+
+def new_batch(kind, source=None, skip_existing=False, webhook=None):
+    batch_id = 'b' + hashlib.md5(f"{kind}{source}{time.time()}{next(_job_seq)}".encode()).hexdigest()[:11]
+    with batch_cond:
+        batches[batch_id] = {
+            'batch_id': batch_id, 'kind': kind, 'source': source,
+            'created_at': time.time(), 'finished_at': None,
+            'crawl': 'queued' if kind == 'crawl' else None, 'crawl_error': None, 'crawl_job': None,
+            'skip_existing': skip_existing, 'webhook': webhook,
+            'pending': [], 'starting': 0, 'seen': set(), 'jobs': {}, 'finished': {}, 'skipped': [], 'invalid': [],
+        }
+    _start_batch_feeder()
+    return batch_id
+
+
+def add_to_batch(batch_id, entries):
+    """Queue ads (URLs or IDs) on a batch, dropping duplicates. Returns how many were added."""
+    added = 0
+    with batch_cond:
+        batch = batches[batch_id]
+        for entry in entries:
+            ad_id, url = normalize_ad_input(entry)
+            if not ad_id:
+                batch['invalid'].append(str(entry)[:200])
+                continue
+            if ad_id in batch['seen']:
+                continue
+            batch['seen'].add(ad_id)
+            if batch['skip_existing'] and archive_index.has_ad(ad_id):
+                batch['skipped'].append(ad_id)
+                continue
+            batch['pending'].append((ad_id, url))
+            added += 1
+        batch_cond.notify_all()
+    return added
+
+
+_feeder_started = [False]
+
+
+def _start_batch_feeder():
+    with batch_cond:
+        if _feeder_started[0]:
+            return
+        _feeder_started[0] = True
+    threading.Thread(target=_batch_feeder, name='batch-feeder', daemon=True).start()
+
+
+def _batch_feeder():
+    # Keep at most BATCH_QUEUE_SHARE batch jobs waiting in the scheduler;
+    # the rest of the queue stays free for ads pasted into the UI
+    while True:
+        with batch_cond:
+            batch_cond.wait(0.5)
+        _settle_batches()
+        waiting = sum(1 for s in job_status.values() if s.get('batch_id') and s['status'] == 'queued')
+        taken = _take_pending(BATCH_QUEUE_SHARE - waiting)
+        # new_job finishes an already-archived ad on the spot, which reports
+        # back to its batch, so it is never called holding batch_cond
+        full = False
+        put_back = {}
+        for batch, ad_id, url in taken:
+            job_id = None if full else new_job(url, priority=-1, batch_id=batch['batch_id'])
+            full = job_id is None
+            with batch_cond:
+                batch['starting'] -= 1
+                if full:
+                    # queue full: back to the front, in order, for next time
+                    n = put_back.get(batch['batch_id'], 0)
+                    batch['pending'].insert(n, (ad_id, url))
+                    put_back[batch['batch_id']] = n + 1
+                else:
+                    batch['jobs'][job_id] = ad_id
+
+
+def _take_pending(room):
+    """Take up to room ads off the batches' pending lists.
+
+    Round-robin, so one huge batch doesn't starve the others.
+    """
+    taken = []
+    with batch_cond:
+        active = [b for b in batches.values() if b['pending']]
+        while room > 0 and active:
+            for batch in list(active):
+                if room <= 0:
+                    break
+                ad_id, url = batch['pending'].pop(0)
+                batch['starting'] += 1
+                taken.append((batch, ad_id, url))
+                room -= 1
+                if not batch['pending']:
+                    active.remove(batch)
+    return taken
+
+
+def _settle_batches():
+    """Send the webhooks of finished batches and forget batches finished over JOB_TTL ago."""
+    with batch_cond:
+        current = list(batches.values())
+    for batch in current:
+        if batch['finished_at'] is None or (batch['webhook'] and not batch.get('webhook_sent')):
+            summary = batch_summary(batch['batch_id'], include_jobs=bool(batch['webhook']))
+            if summary['status'] == 'done' and batch['webhook'] and not batch.get('webhook_sent'):
+                batch['webhook_sent'] = True
+                send_webhook(batch['webhook'], summary)
+        elif time.time() - batch['finished_at'] > job_status.ttl:
+            with batch_cond:
+                batches.pop(batch['batch_id'], None)
+
+
+def batch_job_finished(batch_id, job_id, status):
+    """Note how one of a batch's jobs ended, so its summary never has to load the job back from the store."""
+    with batch_cond:
+        batch = batches.get(batch_id)
+        if batch is not None:
+            batch['finished'][job_id] = {
+                'status': status['status'], 'error': status.get('error'), 'finished_at': status.get('finished_at'),
+                'result': {'folder': (status.get('result') or {}).get('folder')},
+            }
+
+
+def batch_summary(batch_id, include_jobs=False):
+    with batch_cond:
+        batch = batches.get(batch_id)
+        if batch is None:
+            return None
+        counts = {'pending': len(batch['pending']) + batch['starting'], 'queued': 0, 'running': 0, 'done': 0, 'error': 0,
+                  'cancelled': 0, 'timed_out': 0}
+        jobs = []
+        last_finish = None
+        for job_id, ad_id in batch['jobs'].items():
+            s = batch['finished'].get(job_id) or job_status.peek(job_id, {})
+            st = s.get('status', 'error')
+            counts[st] = counts.get(st, 0) + 1
+            if s.get('finished_at'):
+                last_finish = max(last_finish or 0, s['finished_at'])
+            if include_jobs:
+                result = s.get('result') or {}
+                jobs.append({'job_id': job_id, 'ad_id': ad_id, 'status': st,
+                             'folder': result.get('folder'), 'error': s.get('error')})
+
+        total = len(batch['jobs']) + counts['pending']
+        finished = sum(counts[st] for st in FINAL_STATES)
+        crawling = batch['crawl'] in ('queued', 'running')
+        if not crawling and finished == total and batch['finished_at'] is None:
+            batch['finished_at'] = last_finish or time.time()
+        elapsed = (batch['finished_at'] or time.time()) - batch['created_at']
+        # A rate from the first few seconds is noise (one fast ad reads as
+        # hundreds of thousands an hour), so there is none until a minute in
+        per_hour = finished / elapsed * 3600 if elapsed >= BATCH_RATE_MIN_SECONDS else None
+        remaining = total - finished
+        summary = {
+            'batch_id': batch_id, 'kind': batch['kind'], 'source': batch['source'],
+            'status': 'crawling' if crawling else ('done' if batch['finished_at'] else 'running'),
+            'crawl': batch['crawl'], 'crawl_error': batch['crawl_error'], 'crawl_job': batch['crawl_job'],
+            'total': total, 'counts': counts,
+            'skipped_existing': len(batch['skipped']), 'invalid': batch['invalid'][:50],
+            'progress': int(100 * finished / total) if total else (0 if crawling else 100),
+            'elapsed_seconds': round(elapsed, 1),
+            'ads_per_hour': round(per_hour, 1) if per_hour is not None else None,
+            'eta_seconds': round(remaining / per_hour * 3600) if per_hour and remaining else None,
+        }
+        if include_jobs:
+            summary['jobs'] = jobs
+        return summary
+
+
+def active_crawls():
+    """Crawls queued or running."""
+    with batch_cond:
+        return sum(1 for b in batches.values() if b['crawl'] in ('queued', 'running'))
+
+
+def _set_crawl(batch_id, state, error=None):
+    with batch_cond:
+        batches[batch_id]['crawl'] = state
+        batches[batch_id]['crawl_error'] = error
+        batch_cond.notify_all()
+
+
+async def run_crawl_job(job_id, batch_id, url, max_ads=CRAWL_MAX_ADS):
+    """Scroll an Ad Library search / advertiser page and feed every ad ID found into the batch.
+
+    A scheduler job like a scrape: it counts against the workers, stops at
+    the job deadline and can be cancelled. Ads found by then stay in the batch.
+    """
+    status = job_status[job_id]
+    status.update(status='running', started_at=time.time())
+    _set_crawl(batch_id, 'running')
+    notify_job_change()
+    found = set()
+    task = asyncio.current_task()
+
+    def expire():
+        if not status.get('stop_reason'):
+            status['stop_reason'] = 'timed_out'
+            task.cancel()
+
+    deadline = asyncio.get_running_loop().call_later(JOB_DEADLINE, expire) if JOB_DEADLINE > 0 else None
+
+    async def crawl(context):
+        page = await context.new_page()
+        # Ad IDs come from the page text and links; none of its images are needed
+        await RequestBlocker(extra_types=('image', 'media')).attach(page)
+        try:
+            await page.goto(url, wait_until='networkidle', timeout=35000)
+        except Exception:
+            await page.goto(url, wait_until='domcontentloaded', timeout=35000)
+
+        idle_rounds = 0
+        while len(found) < max_ads and idle_rounds < 4:
+            ids = set(await page.evaluate(CRAWL_IDS_JS)) - found
+            if ids:
+                found.update(ids)
+                await in_thread(add_to_batch, batch_id, sorted(ids)[:max(0, max_ads - (len(found) - len(ids)))])
+                status['log'].append({'msg': f'{len(found)} ad(s) found', 'type': 'info'})
+                notify_job_change()
+                idle_rounds = 0
+            else:
+                idle_rounds += 1
+            await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
+            await asyncio.sleep(1.5)
+
+    state, error = 'error', None
+    try:
+        if status.get('stop_reason'):
+            raise asyncio.CancelledError()  # cancelled on its way out of the queue
+        await browser_pool.run(crawl)
+        state, error = 'done', None if found else 'No ads found on that page'
+        status.update(status='done', progress=100, result={'batch_id': batch_id, 'found': len(found)})
+    except asyncio.CancelledError:
+        state = reason = status.get('stop_reason') or 'cancelled'
+        stopped = 'Cancelled' if reason == 'cancelled' else f'Stopped at the {JOB_DEADLINE:g}s job deadline'
+        error = f'{stopped} after finding {len(found)} ad(s)'
+        status.update(status=reason, failure=reason, error=error)
+    except Exception as e:
+        error = str(e)
+        status.update(status='error', error=error, failure=failure_type(e))
+    finally:
+        if deadline is not None:
+            deadline.cancel()
+        status['finished_at'] = time.time()
+        _set_crawl(batch_id, state, error)
+        await in_thread(finish_job, job_id, None)
+
+
+# ─────────────────────────────────────────────
+# RE-CHECKS
+# ─────────────────────────────────────────────
+# Archived ads are scraped again on a cadence so we can see how long they
+# run and when they stop. A re-check refreshes the ad's folder in place
+# (unchanged creatives are not downloaded again) and appends what changed
+# to history.json in the folder; runs of unchanged checks share one entry.
+
+def snapshot_diff(old, new):
+    """What changed between two ad_meta.json snapshots of the same ad."""
+    changes = {}
+    for field in ('status', 'started', 'ended', 'page_name', 'platforms'):
+        if new.get(field) not in (None, '', [], 'Unknown') and old.get(field) != new.get(field):
+            changes[field] = [old.get(field), new.get(field)]
+    for field in ('ad_text', 'extra_text'):
+        a, b = old.get(field) or '', new.get(field) or ''
+        if b and a != b:
+            diff = difflib.unified_diff(a.splitlines(), b.splitlines(), lineterm='', n=0)
+            changes[field] = '\n'.join(list(diff)[2:])[:2000]
+
+    # Creatives are compared by media key; snapshots saved before keys were
+    # recorded, or scrapes that found no media, can't be compared this way
+    old_media = [m for m in old.get('media', []) if m.get('filename') != 'screenshot.png']
+    new_media = [m for m in new.get('media', []) if m.get('filename') != 'screenshot.png']
+    if new_media and old_media and all(m.get('key') for m in old_media):
+        old_keys = {m['key']: m['filename'] for m in old_media}
+        new_keys = {m['key']: m['filename'] for m in new_media}
+        added = [f for k, f in new_keys.items() if k not in old_keys]
+        removed = [f for k, f in old_keys.items() if k not in new_keys]
+        if added:
+            changes['media_added'] = added
+        if removed:
+            changes['media_removed'] = removed
+    return changes
+
+
+def record_history(folder_path, changes, checked_at=None):
+    """Append a check to the folder's history.json."""
+    checked_at = checked_at or datetime.now().isoformat(timespec='seconds')
+    path = folder_path / 'history.json'
+    try:
+        history = json.loads(path.read_text()) if path.exists() else []
+    except (OSError, ValueError):
+        history = []
+    if not changes and history and history[-1].get('unchanged'):
+        history[-1].update(until=checked_at, checks=history[-1].get('checks', 1) + 1)
+    elif not changes:
+        history.append({'at': checked_at, 'until': checked_at, 'checks': 1, 'unchanged': True})
+    else:
+        history.append({'at': checked_at, 'changes': changes})
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(history, indent=1))
+    os.replace(tmp, path)
+    return history
+
+
+def _iso_timestamp(value):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return 0
+
+
+class RecheckScheduler:
+    """Queues archived ads whose re-check is due, a few at a time."""
+
+    POLL_SECONDS = 300
+
+    def __init__(self, hours, inactive_hours, per_pass):
+        self.hours = hours
+        self.inactive_hours = inactive_hours
+        self.per_pass = per_pass
+        self._inflight = {}   # ad_id -> job_id
+        self._started = False
+
+    def enabled(self):
+        return self.hours > 0 or self.inactive_hours > 0
+
+    def start(self):
+        if self._started or not self.enabled():
+            return
+        self._started = True
+        threading.Thread(target=self._loop, name='rechecks', daemon=True).start()
+
+    def due(self, now=None):
+        """Ad ids due for a re-check: Active/unknown before Inactive, most overdue first.
+
+        Each failed check in a row doubles the ad's interval (up to 16x).
+        """
+        now = now or time.time()
+        due = []
+        for ad_id, status, archived_at, checked_at, failures in archive_index.check_candidates():
+            hours = self.inactive_hours if status == 'Inactive' else self.hours
+            if hours <= 0:
+                continue
+            last = checked_at or _iso_timestamp(archived_at)
+            overdue = now - last - hours * 3600 * 2 ** min(failures, 4)
+            if overdue >= 0:
+                due.append((status == 'Inactive', -overdue, ad_id))
+        due.sort()
+        return [ad_id for _, _, ad_id in due]
+
+    def run_once(self):
+        """Queue the next due ads behind everything else. Returns how many were queued."""
+        self._inflight = {a: j for a, j in self._inflight.items()
+                          if (job_status.get(j) or {}).get('status') in ('queued', 'running')}
+        # Like batches, re-checks never take more than their share of the queue
+        room = min(self.per_pass, BATCH_QUEUE_SHARE - len(self._inflight), scheduler.max_queued - scheduler.depth())
+        queued = 0
+        for ad_id in self.due():
+            if queued >= room:
+                break
+            if ad_id in self._inflight:
+                continue
+            job_id = new_job(f'https://www.facebook.com/ads/library/?id={ad_id}', priority=-1, force=True)
+            if job_id is None:
+                break
+            self._inflight[ad_id] = job_id
+            queued += 1
+        return queued
+
+    def _loop(self):
+        while True:
+            try:
+                queued = self.run_once()
+                if queued:
+                    print(f'[rechecks] queued {queued} ad(s)')
+            except Exception:
+                import traceback
+                print(traceback.format_exc())
+            time.sleep(self.POLL_SECONDS)
+
+
+rechecks = RecheckScheduler(RECHECK_HOURS, RECHECK_INACTIVE_HOURS, RECHECK_BATCH)
+
+
 # ─────────────────────────────────────────────
 # ROUTES
 # ─────────────────────────────────────────────
@@ -1245,81 +4726,301 @@ def scrape():
     url = data.get('url', '').strip()
     if not url:
         return jsonify({'error': 'No URL provided'})
-    job_id = hashlib.md5(f"{url}{time.time()}".encode()).hexdigest()[:12]
-    job_status[job_id] = {'status': 'running', 'progress': 0, 'log': [], 'result': None}
-    t = threading.Thread(target=run_scrape_job, args=(job_id, url), daemon=True)
-    t.start()
-    return jsonify({'job_id': job_id})
+    try:
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'priority must be an integer'}), 400
+    if not valid_webhook(data.get('webhook')):
+        return jsonify({'error': 'webhook must be an http:// or https:// URL'}), 400
+    job_id = new_job(url, priority, webhook=data.get('webhook'), force=bool(data.get('force')))
+    if job_id is None:
+        metrics.inc('advault_jobs_rejected_total')
+        return jsonify({'error': 'Too many ads queued — try again in a minute',
+                        'queue_depth': scheduler.depth()}), 429
+    return jsonify({'job_id': job_id, 'queue_position': scheduler.position(job_id)})
+
+
+@app.route('/api/batch', methods=['POST'])
+def create_batch():
+    data = request.json or {}
+    items = data.get('items') or data.get('urls') or []
+    if isinstance(items, str):
+        items = re.split(r'[\s,]+', items)
+    items = [i for i in items if str(i).strip()]
+    if not items:
+        return jsonify({'error': 'No ad URLs or IDs provided'}), 400
+    if not valid_webhook(data.get('webhook')):
+        return jsonify({'error': 'webhook must be an http:// or https:// URL'}), 400
+    batch_id = new_batch('batch', skip_existing=bool(data.get('skip_existing', False)), webhook=data.get('webhook'))
+    added = add_to_batch(batch_id, items)
+    return jsonify({'batch_id': batch_id, 'added': added, 'invalid': batches[batch_id]['invalid'][:50]})
+
+
+@app.route('/api/crawl', methods=['POST'])
+def create_crawl():
+    data = request.json or {}
+    url = data.get('url', '').strip()
+    if 'facebook.com/ads/library' not in url:
+        return jsonify({'error': 'Please use a Facebook Ad Library search or advertiser URL'}), 400
+    try:
+        max_ads = min(int(data.get('max_ads', CRAWL_MAX_ADS)), CRAWL_MAX_ADS)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_ads must be an integer'}), 400
+    if not valid_webhook(data.get('webhook')):
+        return jsonify({'error': 'webhook must be an http:// or https:// URL'}), 400
+    if active_crawls() >= CRAWL_MAX_ACTIVE:
+        return jsonify({'error': f'{CRAWL_MAX_ACTIVE} crawl(s) already running — try again when one finishes'}), 429
+    batch_id = new_batch('crawl', source=url, skip_existing=bool(data.get('skip_existing', True)),
+                         webhook=data.get('webhook'))
+    job_id = new_crawl_job(batch_id, url, max_ads)
+    if job_id is None:
+        with batch_cond:
+            batches.pop(batch_id, None)
+        metrics.inc('advault_jobs_rejected_total')
+        return jsonify({'error': 'Too many ads queued — try again in a minute',
+                        'queue_depth': scheduler.depth()}), 429
+    return jsonify({'batch_id': batch_id, 'job_id': job_id})
+
+
+@app.route('/api/batch/<batch_id>')
+def batch_status(batch_id):
+    summary = batch_summary(batch_id, include_jobs=request.args.get('jobs') == '1')
+    if summary is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify(summary)
+
+
+def _public_status(job_id, s, log_offset=0):
+    s = dict(s)
+    s.pop('webhook', None)
+    s['log_total'] = len(s['log'])
+    s['log_offset'] = log_offset
+    s['log'] = s['log'][log_offset:]
+    s['queue_depth'] = scheduler.depth()
+    if s['status'] == 'queued':
+        s['queue_position'] = scheduler.position(job_id)
+        s['wait_seconds'] = round(time.time() - s['queued_at'], 2)
+    return s
 
 
 @app.route('/api/status/<job_id>')
 def status(job_id):
+    """Job status. ?log_offset=N returns only log entries after the first N."""
     s = job_status.get(job_id)
     if not s:
         return jsonify({'error': 'Job not found'}), 404
-    return jsonify(s)
+    try:
+        offset = max(int(request.args.get('log_offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'log_offset must be an integer'}), 400
+    return jsonify(_public_status(job_id, s, offset))
+
+
+@app.route('/api/cancel/<job_id>', methods=['POST'])
+def cancel(job_id):
+    """Cancel a queued or running job. A running job reports 'cancelled' shortly after."""
+    state = cancel_job(job_id)
+    if state is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if state in FINAL_STATES and job_status[job_id].get('stop_reason') != 'cancelled':
+        return jsonify({'error': f'Job already {state}', 'status': state}), 409
+    return jsonify({'job_id': job_id, 'status': state})
+
+
+@app.route('/api/events/<job_id>')
+def job_events(job_id):
+    """Server-Sent Events stream of one job.
+
+    Emits 'log' events (one per new log line, id = line number),
+    'progress' events when status/progress/queue position change, then a
+    final 'done' event with the result or an 'error' event (also sent for
+    cancelled and timed-out jobs, with their status). Reconnecting clients
+    resume after the Last-Event-ID they sent.
+    """
+    if job_id not in job_status:
+        return jsonify({'error': 'Job not found'}), 404
+    try:
+        start = int(request.headers.get('Last-Event-ID') or request.args.get('log_offset', 0))
+    except ValueError:
+        start = 0
+
+    def sse(event, data, event_id=None):
+        head = f'id: {event_id}\n' if event_id is not None else ''
+        return f'{head}event: {event}\ndata: {json.dumps(data)}\n\n'
+
+    def stream():
+        sent = start
+        last = None
+        yield 'retry: 2000\n\n'
+        while True:
+            with job_changed:
+                seen = job_generation[0]
+            s = job_status.get(job_id)
+            if s is None:
+                yield sse('error', {'error': 'Job expired'})
+                return
+            logs = s['log']
+            while sent < len(logs):
+                yield sse('log', logs[sent], sent + 1)
+                sent += 1
+            state = {'status': s['status'], 'progress': s['progress'], 'queue_depth': scheduler.depth(),
+                     'queue_position': scheduler.position(job_id) if s['status'] == 'queued' else None}
+            if state != last:
+                yield sse('progress', state)
+                last = state
+            if s.get('finished_at'):
+                if s['status'] == 'done':
+                    yield sse('done', s['result'])
+                else:
+                    yield sse('error', {'error': s.get('error') or 'Unknown error', 'status': s['status']})
+                return
+            with job_changed:
+                if not job_changed.wait_for(lambda: job_generation[0] != seen, timeout=15):
+                    yield ': keep-alive\n\n'
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/api/archive')
 def archive():
-    ads = []
-    if SAVE_DIR.exists():
-        for folder in sorted(SAVE_DIR.iterdir(), key=lambda x: x.stat().st_mtime, reverse=True):
-            if not folder.is_dir(): continue
-            meta_file = folder / 'ad_meta.json'
-            meta = {}
-            if meta_file.exists():
-                try:
-                    with open(meta_file) as f:
-                        meta = json.load(f)
-                except Exception:
-                    pass
-            # find thumb
-            thumb = None
-            for ext in ['*.jpg', '*.png', '*.webp']:
-                imgs = list(folder.glob(ext))
-                if imgs:
-                    thumb = imgs[0].name; break
-            media_count = len([f for f in folder.iterdir() if f.suffix in {'.jpg','.png','.webp','.mp4','.webm'}])
-            ads.append({
-                'folder': folder.name,
-                'page_name': meta.get('page_name', folder.name),
-                'ad_id': meta.get('ad_id', ''),
-                'saved': meta.get('archived_at', '')[:10] if meta.get('archived_at') else '',
-                'media_count': media_count,
-                'thumb': thumb,
-            })
-    return jsonify({'ads': ads})
+    """Archive listing.
+
+    ?limit=&cursor=      page through results (cursor = previous next_cursor)
+    ?sort=&order=        archived_at (default), started or page_name; asc/desc
+    ?status=&platform=&advertiser=   filters
+    ?since=<seq>         only what changed after seq (deltas for the UI)
+    """
+    args = request.args
+    seq, last_change = archive_index.version()
+
+    if 'since' in args:
+        try:
+            since = int(args['since'])
+        except ValueError:
+            return jsonify({'error': 'since must be an integer'}), 400
+        changes = archive_index.changes(since)
+        body = {'reset': True} if changes is None else changes
+        body['seq'] = seq
+        return jsonify(body)
+
+    try:
+        try:
+            limit = min(int(args.get('limit', 100)), 500)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        page = archive_index.list(
+            limit=limit, cursor=args.get('cursor'), sort=args.get('sort', 'archived_at'),
+            order=args.get('order'), status=args.get('status'),
+            platform=args.get('platform'), advertiser=args.get('advertiser'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    page['seq'] = seq
+
+    resp = jsonify(page)
+    resp.set_etag(hashlib.md5(f'{seq}:{request.query_string.decode()}'.encode()).hexdigest())
+    if last_change:
+        resp.last_modified = datetime.fromtimestamp(last_change, timezone.utc)
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+@app.route('/api/search')
+def search():
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'No query provided'}), 400
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    t0 = time.perf_counter()
+    found = archive_index.search(q, limit, offset)
+    found['took_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+    return jsonify(found)
 
 
 @app.route('/api/archive/<folder>')
 def archive_detail(folder):
     safe = re.sub(r'[^\w\s._-]', '', folder)
-    meta_file = SAVE_DIR / safe / 'ad_meta.json'
-    if not meta_file.exists():
+    meta = archive_index.get(safe)
+    if meta is None:
         return jsonify({'error': 'Not found'}), 404
-    with open(meta_file) as f:
-        meta = json.load(f)
-    # Build media list from saved files
-    folder_path = SAVE_DIR / safe
-    media = []
-    for m in meta.get('media', []):
-        if (folder_path / m['filename']).exists():
-            media.append(m)
-    return jsonify({
+    return jsonify(archive_result(safe, meta))
+
+
+@app.route('/api/archive/<folder>/history')
+def archive_history(folder):
+    """What re-checks of this ad found, oldest first."""
+    safe = re.sub(r'[^\w\s._-]', '', folder)
+    path = SAVE_DIR / safe / 'history.json'
+    if not (SAVE_DIR / safe).is_dir():
+        return jsonify({'error': 'Not found'}), 404
+    try:
+        history = json.loads(path.read_text()) if path.exists() else []
+    except (OSError, ValueError):
+        history = []
+    return jsonify({'folder': safe, 'history': history})
+
+
+@app.route('/api/archive/<folder>/repair', methods=['POST'])
+def archive_repair(folder):
+    """Queue a job that downloads this ad's missing or truncated media again, from its downloads.json."""
+    safe = re.sub(r'[^\w\s._-]', '', folder)
+    if not (SAVE_DIR / safe).is_dir():
+        return jsonify({'error': 'Not found'}), 404
+    # Runs as a job, so it waits its turn behind any scrape of the same ad
+    job_id = new_repair_job(safe)
+    if job_id is None:
+        metrics.inc('advault_jobs_rejected_total')
+        return jsonify({'error': 'Too many ads queued — try again in a minute',
+                        'queue_depth': scheduler.depth()}), 429
+    return jsonify({'job_id': job_id, 'folder': safe, 'queue_position': scheduler.position(job_id)})
+
+
+@app.route('/api/archive/<folder>/similar')
+def archive_similar(folder):
+    """Ads using visually similar creatives, closest first.
+
+    ?distance=N  most differing bits (of 64) still counted as similar
+    ?limit=N     most ads returned (default 50)
+    """
+    safe = re.sub(r'[^\w\s._-]', '', folder)
+    if not (SAVE_DIR / safe).is_dir():
+        return jsonify({'error': 'Not found'}), 404
+    try:
+        distance = min(max(int(request.args.get('distance', SIMILAR_DISTANCE)), 0), 24)
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+    except ValueError:
+        return jsonify({'error': 'distance and limit must be integers'}), 400
+    found = similar_index.similar(safe, distance)[:limit]
+    summaries = archive_index.summaries(r['folder'] for r in found)
+    results = [dict(summaries[r['folder']], distance=r['distance'], matches=r['matches'])
+               for r in found if r['folder'] in summaries]
+    return jsonify({'folder': safe, 'distance': distance, 'results': results})
+
+
+def archive_result(folder, meta):
+    """An archived ad in the same shape as a finished job's result."""
+    media = meta.get('media', [])
+    return {
         'ad_id': meta.get('ad_id', ''),
-        'page_name': meta.get('page_name', safe),
-        'page_id': '',
+        'page_name': meta.get('page_name', folder),
+        'page_id': meta.get('page_id', ''),
         'status': meta.get('status', ''),
         'started': meta.get('started', ''),
         'platforms': meta.get('platforms', []),
         'ad_text': meta.get('ad_text', ''),
         'extra_text': meta.get('extra_text', ''),
-        'media': media,
-        'folder': safe,
-        'save_path': str(folder_path),
+        'media': [dict(m, thumb_url=thumb_url(folder, m['filename'])) for m in media],
+        'folder': folder,
+        'save_path': str(SAVE_DIR / folder),
         'thumb': media[0]['filename'] if media else None,
-    })
+        'thumb_url': thumb_url(folder, media[0]['filename']) if media else None,
+        'archived_at': meta.get('archived_at'),
+        'incomplete': meta.get('incomplete'),
+    }
 
 
 @app.route('/archive/<folder>/<filename>')
@@ -1328,6 +5029,29 @@ def serve_archive(folder, filename):
     return send_from_directory(str(SAVE_DIR / safe_folder), filename)
 
 
+@app.route('/thumb/<folder>/<filename>')
+def serve_thumb(folder, filename):
+    safe_folder = re.sub(r'[^\w\s._-]', '', folder)
+    safe_file = re.sub(r'[^\w\s._-]', '', filename)
+    folder_path = SAVE_DIR / safe_folder
+    if not (folder_path / safe_file).is_file():
+        return jsonify({'error': 'Not found'}), 404
+    thumb = find_thumbnail(folder_path, safe_file) or make_thumbnail(folder_path, safe_file)
+    if not thumb and Path(safe_file).suffix in ('.mp4', '.webm'):
+        return jsonify({'error': 'No poster frame'}), 404
+    if not thumb:
+        return redirect(f'/archive/{urllib.parse.quote(safe_folder)}/{urllib.parse.quote(safe_file)}')
+    # thumb_url puts the source's mtime in ?v=, so a versioned URL never
+    # changes content; an unversioned one is revalidated (a 304 if unchanged)
+    if 'v' not in request.args:
+        resp = send_from_directory(str(folder_path / 'thumbs'), thumb.name, max_age=0)
+        resp.cache_control.no_cache = True
+        return resp
+    resp = send_from_directory(str(folder_path / 'thumbs'), thumb.name, max_age=31536000)
+    resp.cache_control.immutable = True
+    return resp
+
+
 @app.route('/api/notes/<folder>', methods=['GET'])
 def get_notes(folder):
     safe = re.sub(r'[^\w\s._-]', '', folder)
@@ -1345,6 +5069,7 @@ def save_notes(folder):
         return jsonify({'error': 'Folder not found'}), 404
     notes = request.json.get('notes', '')
     (folder_path / 'notes.txt').write_text(notes, encoding='utf-8')
+    archive_index.upsert_folder(folder_path)
     return jsonify({'ok': True})
 
 
@@ -1364,8 +5089,52 @@ def open_folder():
     return jsonify({'ok': True})
 
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target."""
+    browsers = browser_pool.stats()
+    gauges = [
+        ('advault_queue_depth', 'Archive jobs waiting for a worker.', [((), scheduler.depth())]),
+        ('advault_jobs_running', 'Archive jobs being worked on.', [((), scheduler.running())]),
+        ('advault_browser_queue_depth', 'Jobs waiting for a free browser page.', [((), browser_pool.queued())]),
+        ('advault_browsers', 'Browser slots by state.', [
+            ((('state', 'connected'),), sum(1 for b in browsers if b['connected'])),
+            ((('state', 'busy'),), sum(1 for b in browsers if b['busy'])),
+        ]),
+        ('advault_browser_pages', 'Ads open in the browsers right now.', [((), sum(b['pages'] for b in browsers))]),
+    ]
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     import sys
+    if '--reindex' in sys.argv:
+        updated, removed = archive_index.reconcile(rebuild='--full' in sys.argv)
+        print(f"Archive index: {updated} folder(s) indexed, {removed} removed")
+        sys.exit(0)
+    if '--thumbnails' in sys.argv:
+        print(f"Thumbnails: {backfill_thumbnails()} created")
+        sys.exit(0)
+    if '--phash' in sys.argv:
+        backfill_thumbnails()
+        print(f"Perceptual hashes: {backfill_phashes()} added")
+        sys.exit(0)
+    if '--dedupe' in sys.argv:
+        files, duplicates, saved = dedupe_archive()
+        print(f"Blob store: {files} media file(s) stored, {duplicates} duplicate(s) linked, "
+              f"{saved / (1024 * 1024):.1f}MB freed")
+        sys.exit(0)
+    if '--repair' in sys.argv:
+        repaired, failed = repair_all(log=lambda msg, t='info': print(f'  {msg}'))
+        print(f"Repair: {repaired} file(s) downloaded, {failed} still missing")
+        sys.exit(0)
+
+    # Catch up with folders changed on disk while the server was down
+    threading.Thread(target=archive_index.reconcile, daemon=True).start()
+    threading.Thread(target=lambda: (backfill_thumbnails(), backfill_phashes()), daemon=True).start()
+    threading.Thread(target=blob_store.gc, daemon=True).start()  # blobs of folders deleted by hand
+    rechecks.start()
+
     print("\n" + "="*50)
     print("  Ad Vault — Meta Ad Archiver")
     print("="*50)
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Offline scrape benchmark.
+
+Serves a stand-in Ad Library from bench/fixtures on a local port and runs
+app.run_scrape_job against it at several concurrency levels, so scrape
+speed and memory can be measured without touching facebook.com.
+
+    python bench/bench.py                          # 12 ads at concurrency 1, 2 and 4
+    python bench/bench.py --ads 30 --concurrency 1,4,8 --save before.json
+    python bench/bench.py --baseline before.json   # show the change against an earlier run
+
+The archive, job store and index go to a throwaway directory unless
+--archive is given. ADVAULT_* settings apply as usual.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import struct
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from string import Template
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+ROOT = Path(__file__).resolve().parent
+FIXTURES = ROOT / 'fixtures'
+
+# ─────────────────────────────────────────────
+# FIXTURES
+# ─────────────────────────────────────────────
+# Every ad id maps to one variant; each variant exercises a different part
+# of the scraper. Media sizes are (width, height) of a PNG that is stored
+# uncompressed, so its size in bytes is roughly width * height * 3.
+
+SMALL, MEDIUM, LARGE = (360, 240), (800, 600), (1600, 1200)
+VIDEO_BYTES = 4 * 1024 * 1024
+
+VARIANTS = {
+    # one creative image in the modal
+    'image': {'images': [MEDIUM]},
+    # a carousel of mixed sizes
+    'carousel': {'images': [SMALL, MEDIUM, LARGE]},
+    # a video with a poster frame
+    'video': {'videos': 1},
+    # the "Additional content items" section as Facebook renders it (issue.txt)
+    'content_items': {'images': [MEDIUM], 'content_items': True, 'extra_images': [SMALL, SMALL]},
+    # the ad record embedded as JSON, so the structured path is taken
+    'json': {'images': [MEDIUM, SMALL], 'structured': True},
+    # media that answers slowly
+    'slow': {'images': [MEDIUM], 'videos': 1, 'delay_ms': 1500},
+}
+BACKGROUND_CARDS = 16
+
+
+def variant_of(ad_id):
+    names = list(VARIANTS)
+    return names[int(ad_id) % len(names)]
+
+
+def expected_media(ad_id):
+    """How many files a correct scrape of this ad saves (screenshot aside)."""
+    v = VARIANTS[variant_of(ad_id)]
+    return len(v.get('images', [])) + 2 * v.get('videos', 0) + len(v.get('extra_images', []))
+
+
+_png_cache = {}
+
+
+def png_bytes(width, height):
+    """An uncompressed noise PNG — it decodes like a photo and has a predictable size."""
+    key = (width, height)
+    if key not in _png_cache:
+        rnd = random.Random(width * 7919 + height)
+        row = bytes(rnd.getrandbits(8) for _ in range(width * 3))
+        raw = b''.join(b'\x00' + row[(y * 7) % len(row):] + row[:(y * 7) % len(row)] for y in range(height))
+
+        def chunk(tag, data):
+            return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+        _png_cache[key] = (b'\x89PNG\r\n\x1a\n'
+                           + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+                           + chunk(b'IDAT', zlib.compress(raw, 0))
+                           + chunk(b'IEND', b''))
+    return _png_cache[key]
+
+
+def media_url(base, ad_id, name, size=None, delay=0):
+    # Long, signed-looking query strings like the real CDN's
+    q = f'?_nc_cat=1&ccb=1-7&_nc_sid=bench&oh=00_{ad_id}{name}&oe=67000000'
+    if size:
+        q += f'&w={size[0]}&h={size[1]}'
+    if delay:
+        q += f'&delay={delay}'
+    return f'{base}/media/{ad_id}/{name}{q}'
+
+
+def render_page(base, ad_id):
+    v = VARIANTS[variant_of(ad_id)]
+    delay = v.get('delay_ms', 0)
+    page_name = f'Bench Advertiser {int(ad_id) % 97}'
+
+    background = '\n'.join(
+        f'<div class="card"><img src="{media_url(base, "bg", f"card{i}.png", (256, 256))}">'
+        f'<div>Started running on Jan {i + 1}, 2025</div><div>Sponsored result {i}</div></div>'
+        for i in range(BACKGROUND_CARDS))
+
+    images = [media_url(base, ad_id, f'image{i}.png', size, delay) for i, size in enumerate(v.get('images', []))]
+    videos = [(media_url(base, ad_id, f'video{i}.mp4', delay=delay),
+               media_url(base, ad_id, f'poster{i}.png', MEDIUM, delay)) for i in range(v.get('videos', 0))]
+    creatives = ''.join(f'<div><img src="{u}"></div>' for u in images)
+    creatives += ''.join(f'<div><video src="{src}" poster="{poster}" preload="auto" muted></video></div>'
+                         for src, poster in videos)
+
+    content_items = ''
+    if v.get('content_items'):
+        extras = ''.join(f'<div><img src="{media_url(base, ad_id, f"extra{i}.png", size, delay)}"></div>'
+                         for i, size in enumerate(v.get('extra_images', [])))
+        # Served locally, so the benchmark never reaches Facebook's CDN
+        markup = (FIXTURES / 'content_items.html').read_text().replace('https://static.xx.fbcdn.net', f'{base}/static')
+        # Put the extra creatives inside the section, next to its links and text
+        content_items = markup.replace('</span>', '</span>' + extras, 1)
+
+    ad_text = (f'{page_name}\nTransform your bathroom in as little as 5 days. '
+               f'Book a free design consultation and get a fixed-price quote today. Ref {ad_id}.')
+    structured = ''
+    if v.get('structured'):
+        record = {'ad_archive_id': ad_id, 'page_id': 1000 + int(ad_id) % 97, 'is_active': True,
+                  'start_date': 1740960000, 'publisher_platform': ['FACEBOOK', 'INSTAGRAM'],
+                  'snapshot': {'page_name': page_name, 'body': {'text': ad_text},
+                               'images': [{'original_image_url': u} for u in images],
+                               'link_url': 'https://example.com/bench'}}
+        payload = json.dumps({'require': [['AdLibrary', 'ads', [{'results': [record]}]]]})
+        structured = f'<script type="application/json" data-sjs>{payload}</script>'
+
+    return Template((FIXTURES / 'ad_library.html').read_text()).substitute(
+        background=background, structured=structured, page_id=1000 + int(ad_id) % 97,
+        page_name=page_name, status='Active', ad_id=ad_id, started='Mar 3, 2025',
+        platforms='Facebook Instagram', ad_text=ad_text.replace('\n', '<br>'),
+        creatives=creatives, content_items=content_items, modal_delay=1200)
+
+
+# ─────────────────────────────────────────────
+# STAND-IN SERVER
+# ─────────────────────────────────────────────
+
+class Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_sent = 0
+
+    def add(self, n):
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += n
+
+
+counters = Counters()
+
+
+class AdLibraryHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        u = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        if u.path.rstrip('/') == '/ads/library' and q.get('id', '').isdigit():
+            base = f'http://{self.headers["Host"]}'
+            return self._send(render_page(base, q['id']).encode(), 'text/html; charset=utf-8')
+        if u.path.startswith('/media/'):
+            time.sleep(int(q.get('delay', 0)) / 1000)
+            if u.path.endswith('.mp4'):
+                rnd = random.Random(u.path)
+                body = bytes(rnd.getrandbits(8) for _ in range(4096)) * (VIDEO_BYTES // 4096)
+                return self._send(body, 'video/mp4')
+            return self._send(png_bytes(int(q.get('w', 400)), int(q.get('h', 300))), 'image/png')
+        if u.path.startswith('/static/') and u.path.endswith('.png'):
+            return self._send(png_bytes(32, 32), 'image/png')
+        if u.path.startswith('/static/'):
+            return self._send(b'\0' * 20000, 'font/woff2')
+        self._send(b'not found', 'text/plain', 404)
+
+    def _send(self, body, ctype, code=200):
+        # Honour simple Range requests; Chromium uses them for <video>
+        start, end = 0, len(body) - 1
+        rng = self.headers.get('Range', '')
+        if code == 200 and rng.startswith('bytes='):
+            a, _, b = rng[6:].partition('-')
+            start = int(a or 0)
+            end = min(int(b), end) if b else end
+            code = 206
+        part = body[start:end + 1]
+        self.send_response(code)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(part)))
+        self.send_header('Accept-Ranges', 'bytes')
+        if code == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+        self.end_headers()
+        try:
+            self.wfile.write(part)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        counters.add(len(part))
+
+
+def start_server(port=0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), AdLibraryHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ─────────────────────────────────────────────
+# RUNNER
+# ─────────────────────────────────────────────
+
+def rss_mb():
+    """This process's resident set size in MB (Linux), or None."""
+    try:
+        for line in Path('/proc/self/status').read_text().splitlines():
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler(threading.Thread):
+    """Tracks peak RSS of the server process and of its Chromiums."""
+
+    def __init__(self, app, interval=0.25):
+        super().__init__(daemon=True)
+        self.app = app
+        self.interval = interval
+        self.peak_python = self.peak_chromium = 0
+        self._finished = threading.Event()
+
+    def sample(self):
+        self.peak_python = max(self.peak_python, rss_mb() or 0)
+        self.peak_chromium = max(self.peak_chromium, self.app._chromium_rss_mb() or 0)
+
+    def run(self):
+        self.sample()
+        while not self._finished.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._finished.set()
+        self.join()
+        self.sample()
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values) + 0.5) - 1))]
+
+
+def run_job(app, base, ad_id):
+    job_id = f'bench{ad_id}'
+    app.job_status[job_id] = {'status': 'queued', 'progress': 0, 'log': [], 'result': None,
+                              'queued_at': time.time(), 'batch_id': None, 'webhook': None}
+    url = f'{base}/ads/library/?active_status=all&id={ad_id}'
+    app.browser_pool.submit(app.run_scrape_job(job_id, url)).result()
+    return dict(app.job_status[job_id])
+
+
+def run_level(app, base, concurrency, ad_ids):
+    counters.reset()
+    sampler = RssSampler(app)
+    sampler.start()
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: run_job(app, base, i), ad_ids))
+    wall = time.time() - started
+    sampler.stop()
+
+    done = [r for r in results if r['status'] == 'done']
+    stages = {}
+    for r in done:
+        for stage, seconds in (r.get('timings') or {}).items():
+            stages.setdefault(stage, []).append(seconds)
+    dom_ms = [r['timings'].get('dom_extract', 0) * 1000 for r in done if 'dom_extract' in r.get('timings', {})]
+    mismatched = [r['result']['ad_id'] for r in done
+                  if sum(1 for m in r['result']['media'] if m['filename'] != 'screenshot.png')
+                  != expected_media(r['result']['ad_id'])]
+    failures = {}
+    for r in results:
+        if r['status'] != 'done':
+            failures[r.get('failure', 'unknown')] = failures.get(r.get('failure', 'unknown'), 0) + 1
+
+    return {
+        'concurrency': concurrency,
+        'ads': len(ad_ids),
+        'done': len(done),
+        'failures': failures,
+        'media_mismatches': mismatched,
+        'wall_seconds': round(wall, 2),
+        'ads_per_minute': round(len(done) / wall * 60, 1) if wall else 0,
+        'latency_p50': percentile(stages.get('total', []), 50),
+        'latency_p95': percentile(stages.get('total', []), 95),
+        'extract_ms_p50': percentile(dom_ms, 50),
+        'stages_p50': {k: percentile(v, 50) for k, v in sorted(stages.items())},
+        'stages_p95': {k: percentile(v, 95) for k, v in sorted(stages.items())},
+        'peak_rss_mb': {'python': round(sampler.peak_python), 'chromium': round(sampler.peak_chromium)},
+        'server_requests': counters.requests,
+        'bytes_served_mb': round(counters.bytes_sent / 1024 / 1024, 1),
+        'bytes_saved_mb': round(sum(m.get('size', 0) for r in done for m in r['result']['media']) / 1024 / 1024, 1),
+        'blocked_requests': sum((r.get('requests') or {}).get('blocked_requests', 0) for r in results),
+    }
+
+
+def fmt(v, unit=''):
+    if v is None:
+        return '-'
+    return f'{v:.2f}{unit}' if isinstance(v, float) else f'{v}{unit}'
+
+
+def report(levels, baseline=None):
+    base_by_c = {lvl['concurrency']: lvl for lvl in (baseline or {}).get('levels', [])}
+
+    def delta(lvl, key, sub=None):
+        old = base_by_c.get(lvl['concurrency'])
+        if not old:
+            return ''
+        a, b = old[key], lvl[key]
+        if sub:
+            a, b = a[sub], b[sub]
+        if not a or b is None:
+            return ''
+        return f' ({(b - a) / a * 100:+.0f}%)'
+
+    for lvl in levels:
+        print(f"\n── concurrency {lvl['concurrency']} — {lvl['done']}/{lvl['ads']} done in {lvl['wall_seconds']}s")
+        print(f"  throughput     {lvl['ads_per_minute']} ads/min{delta(lvl, 'ads_per_minute')}")
+        print(f"  latency        p50 {fmt(lvl['latency_p50'], 's')}{delta(lvl, 'latency_p50')}   "
+              f"p95 {fmt(lvl['latency_p95'], 's')}{delta(lvl, 'latency_p95')}")
+        print(f"  DOM extract    p50 {fmt(lvl['extract_ms_p50'], 'ms')}{delta(lvl, 'extract_ms_p50')}")
+        print(f"  peak RSS       python {lvl['peak_rss_mb']['python']}MB{delta(lvl, 'peak_rss_mb', 'python')}   "
+              f"chromium {lvl['peak_rss_mb']['chromium']}MB{delta(lvl, 'peak_rss_mb', 'chromium')}")
+        print(f"  bytes          served {lvl['bytes_served_mb']}MB{delta(lvl, 'bytes_served_mb')}   "
+              f"saved {lvl['bytes_saved_mb']}MB   {lvl['server_requests']} requests, "
+              f"{lvl['blocked_requests']} blocked in browser")
+        print('  stages p50/p95 ' + ', '.join(
+            f"{k} {fmt(v)}/{fmt(lvl['stages_p95'][k])}" for k, v in lvl['stages_p50'].items()
+            if k not in ('total',)))
+        if lvl['failures']:
+            print(f"  FAILURES       {lvl['failures']}")
+        if lvl['media_mismatches']:
+            print(f"  WRONG MEDIA    {len(lvl['media_mismatches'])} ad(s): {', '.join(lvl['media_mismatches'][:5])}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark run_scrape_job against a local Ad Library stand-in.')
+    ap.add_argument('--ads', type=int, default=12, help='ads per concurrency level (default 12)')
+    ap.add_argument('--concurrency', default='1,2,4', help='comma-separated levels (default 1,2,4)')
+    ap.add_argument('--warmup', type=int, default=1, help='ads run first and left out of the numbers')
+    ap.add_argument('--port', type=int, default=0, help='port for the stand-in server (default: any free one)')
+    ap.add_argument('--archive', help='archive directory (default: a temporary one)')
+    ap.add_argument('--save', help='write the results to this JSON file')
+    ap.add_argument('--baseline', help='an earlier --save file to compare against')
+    args = ap.parse_args()
+    levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+
+    # app reads its settings and archive location at import time; HOME is
+    # left alone so Playwright still finds its installed browsers
+    os.environ['ADVAULT_HOME'] = args.archive or tempfile.mkdtemp(prefix='advault-bench-')
+    os.environ.setdefault('ADVAULT_PERSIST_JOBS', '0')
+    sys.path.insert(0, str(ROOT.parent))
+    import app
+
+    server = start_server(args.port)
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    print(f'Stand-in Ad Library at {base}, archive in {app.SAVE_DIR}')
+    print(f'{app.BROWSER_POOL_SIZE} browser(s), block profile {app.BLOCK_PROFILE!r}, '
+          f'variants: {", ".join(VARIANTS)}')
+
+    next_id = 100000
+    for _ in range(args.warmup):
+        run_job(app, base, str(next_id))
+        next_id += 1
+
+    results = []
+    for c in levels:
+        ids = [str(i) for i in range(next_id, next_id + args.ads)]
+        next_id += args.ads
+        results.append(run_level(app, base, c, ids))
+        print(f'  concurrency {c}: {results[-1]["done"]}/{args.ads} done in {results[-1]["wall_seconds"]}s')
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    report(results, baseline)
+    if args.save:
+        Path(args.save).write_text(json.dumps({'created_at': time.time(), 'levels': results}, indent=2))
+        print(f'\nSaved to {args.save}')
+
+    app.browser_pool.shutdown()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,7 @@ fi
 echo "Checking dependencies..."
 python3 -c "import flask" 2>/dev/null || pip install flask --quiet
 python3 -c "import playwright" 2>/dev/null || pip install playwright --quiet
+python3 -c "import PIL" 2>/dev/null || pip install pillow --quiet
 python3 -c "from playwright.sync_api import sync_playwright" 2>/dev/null || playwright install chromium --quiet
 
 echo "Starting server..."